@@ -7,14 +7,27 @@ import warnings
 warnings.filterwarnings("ignore")
 
 # --- STANDARD IMPORTS ------------------------------------------
+# pandas / numpy / joblib / sklearn / xgboost are imported by
+# load_models() on first use, so static pages never pay for them
 import os
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
-import numpy as np
-import joblib
+import json
+import threading
+import time
+from flask import Flask, Response, abort, g, render_template, request, jsonify, send_from_directory, url_for
 
 # --- TREATMENT ENGINE ------------------------------------------
-from utils.treatment_engine import generate_treatment_recommendations
+from utils.treatment_engine import TreatmentPlanTable
+from utils.reference_data import get_reference_store
+from utils.crop_production import get_production_index
+from utils.cache import build_cache
+from utils.capture import build_recorder
+from utils.model_registry import ModelRegistry
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, stage_timer
+from utils.profiling import PROFILE_HEADER, SamplingProfiler, profile_requested
+from utils.static_assets import ENCODINGS as ASSET_ENCODINGS, load_manifest as load_asset_manifest
+from utils.request_schema import FeatureColumns, Field, RequestDecoder, SchemaError
+from utils.load_shedding import TierController, TierError, parse_tier
+from utils.history import BUCKETS as HISTORY_BUCKETS, DEFAULT_LIMIT as HISTORY_LIMIT, build_history_store, parse_time
 
 
 # ================================================================
@@ -26,13 +39,372 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 # ================================================================
-# LOAD MODELS
+# METRICS
+# ================================================================
+# Stage timings go to cropsense_stage_seconds (utils/metrics.py); with
+# CROPSENSE_METRICS_DIR set, /metrics sums every gunicorn worker.
+REQUESTS = REGISTRY.counter(
+    "cropsense_requests_total", "HTTP requests handled, by endpoint and status code.", ("endpoint", "status")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "cropsense_request_seconds", "Wall time per request, by endpoint.", ("endpoint",)
+)
+MODEL_FAILURES = REGISTRY.counter(
+    "cropsense_model_failures_total", "Model calls that raised and were answered with null.", ("model", "stage")
+)
+MODEL_PREDICTIONS = REGISTRY.counter(
+    "cropsense_model_predictions_total", "Rows scored, by model version.", ("version",)
+)
+MODEL_SWAPS = REGISTRY.counter(
+    "cropsense_model_swaps_total", "Background model version changes, by outcome (swapped, failed).", ("outcome",)
+)
+MODEL_TIER_ROWS = REGISTRY.counter(
+    "cropsense_model_tier_rows_total", "Rows scored, by model tier (full, lite, small, linear).", ("tier",)
+)
+
+
+def model_failed(model, stage, exc):
+    MODEL_FAILURES.labels(model, stage).inc()
+    app.logger.warning("%s %s failed: %s: %s", model, stage, type(exc).__name__, exc)
+
+
+# ================================================================
+# LOAD MODELS (lazily)
 # ================================================================
 SQI_MODEL_PATH = os.path.join(BASE_DIR, "models", "SQI_full_pipeline.pkl")
 PHI_MODEL_PATH = os.path.join(BASE_DIR, "models", "PHI_full_pipeline.pkl")
 
-SQI_PIPELINE = joblib.load(SQI_MODEL_PATH)
-PHI_PIPELINE = joblib.load(PHI_MODEL_PATH)
+# portable bundle (XGBoost UBJSON boosters + JSON manifest, see
+# utils/model_bundle.py); the pickles above are only read without it.
+# Setting CROPSENSE_MODEL_BUNDLE pins that bundle and ignores the registry.
+MODEL_BUNDLE_PINNED = os.environ.get("CROPSENSE_MODEL_BUNDLE") or None
+MODEL_BUNDLE_DIR = MODEL_BUNDLE_PINNED or os.path.join(BASE_DIR, "models", "bundle")
+
+# versioned bundles + CURRENT pointer (utils/model_registry.py); when
+# CURRENT exists it wins over models/bundle and is followed without a restart
+MODEL_REGISTRY = ModelRegistry(os.environ.get("CROPSENSE_MODEL_REGISTRY") or os.path.join(BASE_DIR, "models"))
+
+# seconds between CURRENT checks; 0 = never swap models after the first load
+MODEL_CHECK_INTERVAL = float(os.environ.get("CROPSENSE_MODEL_CHECK_SECONDS", "10"))
+
+# 1 = load everything at import instead of on the first prediction
+# (gunicorn gets the same effect from warm_up() in when_ready)
+EAGER_LOAD = os.environ.get("CROPSENSE_EAGER_LOAD", "").lower() in ("1", "true", "on", "yes")
+
+
+class LoadedModels:
+    """
+    Everything load_models() produces; pipelines are None when the bundle
+    was used. `version` is the bundle version (a hash of the pickle files
+    without one); `source` is the registry version it was loaded for, None
+    outside the registry. `tiers` maps each cheaper tier the bundle carries
+    to a JointPredictor over its variants; `tier_names` is "full" plus
+    those, most accurate first. `explainer` is the JointExplainer for
+    explain mode, None when the models aren't compiled with one encoding.
+    """
+
+    def __init__(self, sqi_pipeline, phi_pipeline, sqi_compiled, phi_compiled, joint, bundle,
+                 version=None, source=None, tiers=None, explainer=None):
+        self.sqi_pipeline = sqi_pipeline
+        self.phi_pipeline = phi_pipeline
+        self.sqi_compiled = sqi_compiled
+        self.phi_compiled = phi_compiled
+        self.joint = joint
+        self.bundle = bundle
+        self.version = version
+        self.source = source
+        self.tiers = tiers or {}
+        self.tier_names = ["full", *self.tiers]
+        self.explainer = explainer
+        self.predictions = MODEL_PREDICTIONS.labels(version)
+
+
+def model_source():
+    """(registry version or None, bundle directory) to serve right now."""
+    if MODEL_BUNDLE_PINNED is None:
+        version = MODEL_REGISTRY.current()
+        if version is not None:
+            return version, MODEL_REGISTRY.path(version)
+    return None, MODEL_BUNDLE_DIR
+
+
+def _pickle_version():
+    import hashlib
+
+    stats = [(os.path.getsize(p), os.path.getmtime(p)) for p in (SQI_MODEL_PATH, PHI_MODEL_PATH)]
+    return "pickle-" + hashlib.sha256(repr(stats).encode()).hexdigest()[:12]
+
+
+def load_models(source=None, bundle_dir=None, fallback=True):
+    """
+    Loads the bundle in `bundle_dir` (default: model_source()). With
+    fallback=False a missing or broken bundle raises instead of falling
+    back to the pickles, which is what a background swap wants.
+    """
+    from utils.inference import JointPredictor, build_joint_predictor, compile_pipeline, set_booster_threads
+    from utils.model_bundle import BundleError, has_bundle, load_bundle
+
+    if bundle_dir is None:
+        source, bundle_dir = model_source()
+
+    bundle = None
+    if has_bundle(bundle_dir):
+        try:
+            with stage_timer("model_load"):
+                bundle = load_bundle(bundle_dir)
+        except (OSError, ValueError, KeyError) as e:     # BundleError / XGBoostError are ValueErrors
+            if not fallback:
+                raise
+            app.logger.warning("model bundle %s not usable, loading pickles: %s", bundle_dir, e)
+    elif not fallback:
+        raise BundleError(f"no model bundle in {bundle_dir}")
+
+    if bundle is not None:
+        sqi_pipeline = phi_pipeline = None
+        sqi_compiled, phi_compiled = bundle["SQI"], bundle["PHI"]
+    else:
+        import joblib
+
+        with stage_timer("model_load"):
+            sqi_pipeline = joblib.load(SQI_MODEL_PATH)
+            phi_pipeline = joblib.load(PHI_MODEL_PATH)
+
+    # per-predict XGBoost threads; gunicorn_config.py sizes this so that
+    # workers * threads * nthread doesn't oversubscribe the cores
+    nthread = int(os.environ.get("CROPSENSE_XGB_NTHREAD", "0"))
+    if nthread > 0:
+        for model in (sqi_pipeline, phi_pipeline) if bundle is None else (sqi_compiled, phi_compiled):
+            set_booster_threads(model, nthread)
+
+    if bundle is None:
+        # pandas-free predictors, parity-checked against the pipelines at load
+        # time; None means that model falls back to the sklearn path
+        sqi_compiled = compile_pipeline(sqi_pipeline)
+        phi_compiled = compile_pipeline(phi_pipeline)
+
+    # both models share one preprocessor when trained by create_pipeline();
+    # encode once and feed both boosters (None if the encodings differ)
+    joint = build_joint_predictor(
+        sqi_compiled, phi_compiled, names=("sqi", "phi"), timer=stage_timer, on_error=model_failed
+    )
+
+    # the bundle's cheaper variants (utils/model_variants.py), fed by the
+    # full models' encoder; the load shedder picks between them
+    tiers = {}
+    if bundle is not None and joint is not None:
+        for tier, variants in bundle.variants.items():
+            tiers[tier] = JointPredictor(
+                (variants["SQI"], variants["PHI"]), names=("sqi", "phi"),
+                timer=stage_timer, on_error=model_failed, encoder=joint.encoder,
+            )
+
+    # explain mode: native XGBoost contributions (utils/explain.py)
+    explainer = None
+    if joint is not None:
+        from utils.explain import build_joint_explainer
+
+        explainer = build_joint_explainer(sqi_compiled, phi_compiled, names=("sqi", "phi"))
+
+    # reference CSVs are parsed once here, not per request, and the
+    # default-soil treatment plans are enumerated from them
+    get_reference_store()
+    TREATMENT_PLANS.build()
+
+    version = bundle.version if bundle is not None else _pickle_version()
+    return LoadedModels(sqi_pipeline, phi_pipeline, sqi_compiled, phi_compiled, joint, bundle,
+                        version=version, source=source if bundle is not None else None, tiers=tiers,
+                        explainer=explainer)
+
+
+_MODELS = None
+_MODELS_LOCK = threading.Lock()
+
+# background swaps: one at a time, each registry version tried once
+_SWAP_LOCK = threading.Lock()
+_SWAP = {"checked": 0.0, "thread": None, "failed": None}
+
+
+def models():
+    """
+    The loaded models, loading them on the first call. Afterwards, every
+    MODEL_CHECK_INTERVAL seconds a call also looks at the registry's
+    CURRENT pointer and, if it moved, starts loading that version in the
+    background; callers keep getting the old models until it is ready.
+    """
+    global _MODELS
+    if _MODELS is None:
+        with _MODELS_LOCK:
+            if _MODELS is None:
+                _MODELS = load_models()
+    elif MODEL_CHECK_INTERVAL and time.monotonic() - _SWAP["checked"] >= MODEL_CHECK_INTERVAL:
+        _check_model_source()
+    return _MODELS
+
+
+def _check_model_source():
+    if not _SWAP_LOCK.acquire(blocking=False):
+        return
+    try:
+        _SWAP["checked"] = time.monotonic()
+        if MODEL_BUNDLE_PINNED is not None or (_SWAP["thread"] is not None and _SWAP["thread"].is_alive()):
+            return
+        version = MODEL_REGISTRY.current()
+        if version is None or version == _MODELS.source or version == _SWAP["failed"]:
+            return
+        _SWAP["thread"] = threading.Thread(target=swap_models, args=(version,), name="model-swap", daemon=True)
+        _SWAP["thread"].start()
+    finally:
+        _SWAP_LOCK.release()
+
+
+def swap_models(version):
+    """
+    Loads registry `version`, warms it up with one prediction and only then
+    makes it the models every new request gets. Requests already holding
+    the old LoadedModels finish with it. Returns True if it swapped.
+    """
+    global _MODELS
+    try:
+        loaded = load_models(version, MODEL_REGISTRY.path(version), fallback=False)
+        _warm(loaded)
+    except Exception as e:
+        MODEL_SWAPS.labels("failed").inc()
+        _SWAP["failed"] = version
+        app.logger.error("model version %s not loaded, still serving %s: %s", version, _MODELS.version, e)
+        return False
+    previous, _MODELS = _MODELS, loaded
+    _SWAP["failed"] = None
+    MODEL_SWAPS.labels("swapped").inc()
+    app.logger.info("now serving model version %s (was %s)", loaded.version, previous and previous.version)
+    return True
+
+
+# app.SQI_PIPELINE, app.JOINT_PREDICTOR, ... keep working for scripts;
+# reading one loads the models
+_MODEL_ATTRIBUTES = {
+    "SQI_PIPELINE": "sqi_pipeline",
+    "PHI_PIPELINE": "phi_pipeline",
+    "SQI_COMPILED": "sqi_compiled",
+    "PHI_COMPILED": "phi_compiled",
+    "JOINT_PREDICTOR": "joint",
+    "MODEL_BUNDLE": "bundle",
+}
+
+
+def __getattr__(name):
+    if name in _MODEL_ATTRIBUTES:
+        return getattr(models(), _MODEL_ATTRIBUTES[name])
+    if name == "REFERENCE_STORE":
+        return get_reference_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ================================================================
+# RECOMMENDATION CACHE
+# ================================================================
+def cache_generation():
+    """Changes whenever the served model version or a loaded reference CSV changes."""
+    store = get_reference_store()
+    return models().version, sorted(store.mtimes.items())
+
+
+# configured through CROPSENSE_CACHE_* (see utils/cache.py); None when off
+RECOMMENDATION_CACHE = build_cache(generation=cache_generation)
+
+
+def cache_lookup(model_input):
+    """(key, cached response or None); key is None when caching is off."""
+    if RECOMMENDATION_CACHE is None:
+        return None, None
+    with stage_timer("cache_lookup"):
+        key = RECOMMENDATION_CACHE.key(model_input)
+        return key, RECOMMENDATION_CACHE.get(key)
+
+
+def cached_response(cached, explain):
+    """
+    The cached result to answer with, or None to compute one: a result is
+    cached once, with its explanation if it was ever explained, and
+    requests without ?explain=1 get it without.
+    """
+    if cached is None or (explain and "explanation" not in cached):
+        return None
+    if not explain and "explanation" in cached:
+        return {k: v for k, v in cached.items() if k != "explanation"}
+    return cached
+
+
+def cache_store(key, result):
+    # failed predictions are not cached so a transient error doesn't stick
+    if key is not None and result["sqi"] is not None and result["phi"] is not None:
+        with stage_timer("cache_store"):
+            RECOMMENDATION_CACHE.set(key, result)
+
+
+def _cache_events():
+    c = RECOMMENDATION_CACHE
+    if c is None:
+        return {}
+    return {("hit",): c.hits, ("miss",): c.misses, ("eviction",): c.evictions, ("invalidation",): c.invalidations}
+
+
+REGISTRY.counter_func(
+    "cropsense_cache_events_total",
+    "Recommendation cache hits, misses, evictions and generation invalidations.",
+    ("event",),
+    _cache_events,
+)
+
+
+# ================================================================
+# MODEL TIERS AND LOAD SHEDDING (utils/load_shedding.py)
+# ================================================================
+# the tier a client asks for, and (in the response) the tier that answered,
+# also in the JSON body as "model_tier"; ?tier= works too
+MODEL_TIER_HEADER = "X-CropSense-Model-Tier"
+
+# moves requests to cheaper tiers while /get_recommendation is over
+# CROPSENSE_LATENCY_SLO_MS; per worker process
+TIER_CONTROL = TierController()
+
+SHED_ENDPOINTS = ("get_recommendation",)
+
+
+def requested_tier(req):
+    """The tier `req` asks for, else CROPSENSE_MODEL_TIER; TierError for an unknown name."""
+    return parse_tier(req.headers.get(MODEL_TIER_HEADER) or req.args.get("tier"))
+
+
+def serving_tier(m, requested):
+    """The tier of `m` to answer with: the requested one, or cheaper while shedding load."""
+    return TIER_CONTROL.choose(m.tier_names, requested)
+
+
+def explain_requested(req):
+    """?explain=1: add the top contributing input features to each prediction."""
+    return (req.args.get("explain") or "").lower() in ("1", "true", "on", "yes")
+
+
+REGISTRY.counter_func(
+    "cropsense_load_shed_steps_total",
+    "Load shedding level changes, by direction (down = cheaper tier, up = recovered).",
+    ("direction",),
+    lambda: {(direction,): n for direction, n in TIER_CONTROL.steps.items()},
+)
+
+
+# ================================================================
+# PAYLOAD CAPTURE (CROPSENSE_CAPTURE_DIR; replayed by benchmarks/replay.py)
+# ================================================================
+RECORDER = build_recorder()
+
+
+# ================================================================
+# FIELD HISTORY (CROPSENSE_HISTORY_PATH; utils/history.py)
+# ================================================================
+# requests that carry a "fieldId" are appended off the request thread;
+# read back through /api/fields/... and /api/crops/... below
+HISTORY = build_history_store()
 
 
 # ================================================================
@@ -53,6 +425,10 @@ DEFAULT_SOIL_DATA = {
     "Organic_Carbon_Percent": 0.7,
 }
 
+# every request runs the treatment engine on these values, so its
+# results are precomputed per (crop, stage, PHI class)
+TREATMENT_PLANS = TreatmentPlanTable(DEFAULT_SOIL_DATA)
+
 
 # ================================================================
 # UTILITY HELPERS
@@ -68,152 +444,274 @@ def convert_stage_to_days(stage):
     return mapping.get(stage, 40)
 
 
-def get_payload_value(payload, *keys, default=None, cast=None):
-    for k in keys:
-        if k in payload and payload[k] not in (None, "", "undefined"):
-            v = payload[k]
-            return cast(v) if cast else v
-    return default
-
-
 # ================================================================
 # FRONTEND → MODEL MAPPING
 # ================================================================
-def map_frontend_to_model(payload):
-
-    model = {}
+YES_NO = ("Yes", "No")
 
+REQUEST_FIELDS = [
     # CROP INFO
-    model["Crop_Name"] = get_payload_value(payload, "crop")
-    model["Previous_Crop"] = get_payload_value(payload, "previousCrop")
+    Field("crop", "Crop_Name"),
+    Field("previousCrop", "Previous_Crop"),
 
     # SOIL
-    model["Soil_Type"] = get_payload_value(payload, "soilType", default="Unknown")
-    model["Soil_Texture_Class"] = get_payload_value(payload, "soilTexture", default="Unknown")
+    Field("soilType", "Soil_Type", default="Unknown"),
+    Field("soilTexture", "Soil_Texture_Class", default="Unknown"),
 
     # GROWTH STAGE
-    stage = get_payload_value(payload, "growthStage", default="Vegetative")
-    model["Growth_Stage"] = stage
-    model["Days_After_Sowing"] = convert_stage_to_days(stage)
+    Field("growthStage", "Growth_Stage", default="Vegetative"),
+    Field(None, "Days_After_Sowing", int, derive=("Growth_Stage", convert_stage_to_days)),
 
     # IRRIGATION
-    model["Irrigation_Type"] = get_payload_value(payload, "irrigationType", default="Unknown")
-    model["Current_Soil_State"] = get_payload_value(payload, "irrigationStatus", default="Normal")
-    model["No_Of_Irrigations_Since_Sowing"] = get_payload_value(payload, "irrigationCount", default=0, cast=int)
-    model["Irrigation_Last_7_Days"] = get_payload_value(payload, "irrigationLast7", default=0, cast=int)
+    Field("irrigationType", "Irrigation_Type", default="Unknown"),
+    Field("irrigationStatus", "Current_Soil_State", default="Normal"),
+    Field("irrigationCount", "No_Of_Irrigations_Since_Sowing", int, 0),
+    Field("irrigationLast7", "Irrigation_Last_7_Days", int, 0),
 
     # LEAF CONDITIONS
-    model["Leaf_Colour"] = get_payload_value(payload, "leafColor", default="Normal Green")
-    model["Leaf_Spots"] = get_payload_value(payload, "spots", default="None")
-    model["Leaf_Yellowing_Percent"] = get_payload_value(payload, "leafYellowPercent", default=0, cast=int)
+    Field("leafColor", "Leaf_Colour", default="Normal Green"),
+    Field("spots", "Leaf_Spots", default="None"),
+    Field("leafYellowPercent", "Leaf_Yellowing_Percent", int, 0),
 
     # PESTS
-    model["Pest_Incidence"] = get_payload_value(payload, "pests", default="NoDamage")
+    Field("pests", "Pest_Incidence", default="NoDamage"),
 
     # WEATHER
-    model["Rainfall_Last_7Days"] = get_payload_value(payload, "rainfall", default=0, cast=int)
-    model["Temperature_Avg"] = get_payload_value(payload, "temperature", default=28, cast=int)
-    model["Humidity_Percent"] = get_payload_value(payload, "humidity", default=60, cast=int)
-    model["Sunlight_Hours_Per_Day"] = get_payload_value(payload, "sunlight_hours", default=7, cast=int)
+    Field("rainfall", "Rainfall_Last_7Days", int, 0),
+    Field("temperature", "Temperature_Avg", int, 28),
+    Field("humidity", "Humidity_Percent", int, 60),
+    Field("sunlight_hours", "Sunlight_Hours_Per_Day", int, 7),
 
     # FERTILIZER
-    model["Fertilizer_Used"] = get_payload_value(payload, "usedFertilizer", default="No")
-    model["Fertilizer_Type"] = get_payload_value(payload, "fertilizerType", default="")
-    model["Last_Fertilizer_Dosage"] = get_payload_value(payload, "fertQty", default=0, cast=int)
+    Field("usedFertilizer", "Fertilizer_Used", default="No", choices=YES_NO),
+    Field("fertilizerType", "Fertilizer_Type", default=""),
+    Field("fertQty", "Last_Fertilizer_Dosage", int, 0),
 
     # PESTICIDE
-    model["Pesticide_Used"] = get_payload_value(payload, "usedPesticide", default="No")
-    model["Pesticide_Type"] = get_payload_value(payload, "pesticideType", default="")
-    model["Pesticide_Dosage_Ml_Per_Acre"] = get_payload_value(payload, "pestQty", default=0, cast=int)
+    Field("usedPesticide", "Pesticide_Used", default="No", choices=YES_NO),
+    Field("pesticideType", "Pesticide_Type", default=""),
+    Field("pestQty", "Pesticide_Dosage_Ml_Per_Acre", int, 0),
 
     # FUNGICIDE
-    model["Fungicide_Used"] = get_payload_value(payload, "usedFungicide", default="No")
-    model["Fungicide_Sprays_Last_30_Days"] = get_payload_value(payload, "fungSprays", default=0, cast=int)
+    Field("usedFungicide", "Fungicide_Used", default="No", choices=YES_NO),
+    Field("fungSprays", "Fungicide_Sprays_Last_30_Days", int, 0),
 
     # PLANT HEIGHT
-    model["Plant_Height_Cm"] = get_payload_value(payload, "plantHeight", default=60, cast=int)
+    Field("plantHeight", "Plant_Height_Cm", int, 60),
+
+    # SOIL DEFAULTS (never sent by the form)
+    *(Field(None, column, float, value) for column, value in DEFAULT_SOIL_DATA.items()),
+]
 
-    # ADD SOIL DEFAULTS
-    for k, v in DEFAULT_SOIL_DATA.items():
-        model.setdefault(k, v)
+REQUEST_SCHEMA = RequestDecoder(REQUEST_FIELDS)
 
-    return model
+
+def map_frontend_to_model(payload):
+    """payload dict -> FeatureRecord; raises SchemaError listing every bad field."""
+    return REQUEST_SCHEMA.decode(payload)
 
 
 # ================================================================
 # PREDICTION ENGINE
 # ================================================================
-def run_predictions(req):
-
-    model_input = map_frontend_to_model(req)
-    df = pd.DataFrame([model_input])
-
-    # ALIGN SQI COLUMNS
-    for col in SQI_PIPELINE.feature_names_in_:
+def align_model_frame(df, feature_names):
+    for col in feature_names:
         if col not in df.columns:
             df[col] = 0
-    df_sqi = df[SQI_PIPELINE.feature_names_in_]
+    return df[feature_names]
 
-    # ALIGN PHI COLUMNS
-    for col in PHI_PIPELINE.feature_names_in_:
-        if col not in df.columns:
-            df[col] = 0
-    df_phi = df[PHI_PIPELINE.feature_names_in_]
 
-    # SQI
+def _predict_one(name, pipeline, compiled, model_input):
     try:
-        sqi = float(SQI_PIPELINE.predict(df_sqi)[0])
-    except:
-        sqi = None
+        if compiled is not None:
+            with stage_timer(f"{name}_predict"):
+                return compiled.predict(model_input)
+        import pandas as pd
 
-    # PHI
-    try:
-        phi = float(PHI_PIPELINE.predict(df_phi)[0])
-    except:
-        phi = None
+        with stage_timer("dataframe"):
+            df = align_model_frame(pd.DataFrame([model_input]), pipeline.feature_names_in_)
+        with stage_timer(f"{name}_predict"):
+            return float(pipeline.predict(df)[0])
+    except Exception as e:
+        model_failed(name, "predict", e)
+        return None
+
+
+def run_predictions(req):
+    return predict_model_input(map_frontend_to_model(req))
+
+
+def predict_model_input(model_input, m=None, tier="full"):
+    # callers that report the model version pass the LoadedModels they read it from
+    m = m or models()
+    m.predictions.inc()
+    MODEL_TIER_ROWS.labels(tier).inc()
+
+    if tier != "full":
+        sqi, phi = m.tiers[tier].predict(model_input)
+        return sqi, phi
+
+    if m.joint is not None:
+        sqi, phi = m.joint.predict(model_input)
+        return sqi, phi
+
+    sqi = _predict_one("sqi", m.sqi_pipeline, m.sqi_compiled, model_input)
+    phi = _predict_one("phi", m.phi_pipeline, m.phi_compiled, model_input)
 
     return sqi, phi
 
 
-# ================================================================
-# ROUTES
-# ================================================================
-@app.route("/", endpoint="index")
-def index():
-    return render_template("index.html")
+def _predict_batch(name, pipeline, compiled, rows):
+    """
+    One vectorized predict; falls back to row-by-row so a bad row only fails
+    itself. `rows` is a list of model inputs or a decoded FeatureColumns.
+    """
+    columnar = isinstance(rows, FeatureColumns)
+    try:
+        with stage_timer(f"{name}_predict_batch"):
+            if compiled is not None:
+                if columnar:
+                    return [float(v) for v in compiled.predict_columns(rows.columns, len(rows))]
+                return [float(v) for v in compiled.predict_many(rows)]
+            import pandas as pd
 
-@app.route("/about", endpoint="about_us")
-def about_page():
-    return render_template("aboutus.html")
+            frame = align_model_frame(pd.DataFrame(rows.columns if columnar else rows), pipeline.feature_names_in_)
+            return [float(v) for v in pipeline.predict(frame)]
+    except Exception as e:
+        model_failed(name, "batch", e)
+        return [_predict_one(name, pipeline, compiled, row) for row in rows]
 
-@app.route("/contact", endpoint="contact_us")
-def contact_page():
-    return render_template("contactus.html")
 
-@app.route("/recommendations", endpoint="recommendations")
-def recommendations_page():
-    return render_template("recommendations.html")
+def predict_model_inputs(rows, m=None, tier="full"):
+    m = m or models()
+    m.predictions.inc(len(rows))
+    MODEL_TIER_ROWS.labels(tier).inc(len(rows))
+
+    # a cheaper tier that fails falls back to the full models below
+    joint = m.tiers[tier] if tier != "full" else m.joint
+    if joint is not None:
+        try:
+            if isinstance(rows, FeatureColumns):
+                sqi, phi = joint.predict_columns(rows.columns, len(rows))
+            else:
+                sqi, phi = joint.predict_many(rows)
+        except Exception as e:
+            model_failed("joint", "encode", e)
+            sqi = phi = None
+        return (
+            [float(v) for v in sqi] if sqi is not None else _predict_batch("sqi", m.sqi_pipeline, m.sqi_compiled, rows),
+            [float(v) for v in phi] if phi is not None else _predict_batch("phi", m.phi_pipeline, m.phi_compiled, rows),
+        )
+    return (
+        _predict_batch("sqi", m.sqi_pipeline, m.sqi_compiled, rows),
+        _predict_batch("phi", m.phi_pipeline, m.phi_compiled, rows),
+    )
+
+
+def explain_model_inputs(rows, m=None):
+    """
+    predict_model_inputs (full tier) plus why: (sqi values, phi values,
+    [{"sqi": explanation, "phi": explanation} per row]). The predictions
+    are the contribution sums, so there is no separate predict call. Falls
+    back to plain predictions with null explanations when the models can't
+    be explained.
+    """
+    m = m or models()
+    if m.explainer is not None:
+        try:
+            with stage_timer("explain"):
+                encoder = m.explainer.encoder
+                if isinstance(rows, FeatureColumns):
+                    X = encoder.encode_columns(rows.columns, len(rows))
+                else:
+                    X = encoder.encode_many(rows)
+                (sqi, phi), explanations = m.explainer.explain(X, rows)
+        except Exception as e:
+            model_failed("explain", "explain", e)
+        else:
+            m.predictions.inc(len(rows))
+            MODEL_TIER_ROWS.labels("full").inc(len(rows))
+            return sqi.tolist(), phi.tolist(), explanations
+
+    sqi, phi = predict_model_inputs(rows, m)
+    return sqi, phi, [None] * len(rows)
+
 
+def explain_model_input(model_input, m=None):
+    """predict_model_input plus why: (sqi, phi, explanation)."""
+    sqi, phi, explanations = explain_model_inputs([model_input], m)
+    return sqi[0], phi[0], explanations[0]
+
+
+def score_batch(payloads, m=None, tier="full", explain=False):
+    """
+    Decodes every payload into one column buffer, then scores all decoded
+    rows with a single SQI and a single PHI predict call (of `tier`; with
+    `explain`, the full models' contributions). Returns (model_input, sqi,
+    phi, explanation, error) tuples in input order; rows that failed to
+    decode carry the error and no prediction.
+    """
+    results = [(None, None, None, None, None)] * len(payloads)
+    with stage_timer("map"):
+        batch, errors = REQUEST_SCHEMA.decode_many(payloads)
+    for i, e in errors.items():
+        results[i] = (None, None, None, None, str(e))
+
+    if len(batch):
+        if explain:
+            sqi_values, phi_values, explanations = explain_model_inputs(batch, m)
+        else:
+            sqi_values, phi_values = predict_model_inputs(batch, m, tier)
+            explanations = [None] * len(batch)
+        for pos, row, sqi, phi, why in zip(batch.positions, batch, sqi_values, phi_values, explanations):
+            results[pos] = (row, sqi, phi, why, None)
+
+    return results
+
+
+def run_batch_predictions(payloads):
+    """Batch counterpart of run_predictions: (sqi, phi, error) per payload, in input order."""
+    return [(sqi, phi, error) for _, sqi, phi, _, error in score_batch(payloads)]
 
 
 # ================================================================
-# MAIN API ENDPOINT
+# RESPONSE BUILDING
 # ================================================================
-@app.route("/get_recommendation", methods=["POST"])
-def get_recommendation():
-    req = request.json or {}
+def label_sqi(v):
+    if v is None: return "N/A"
+    if v >= 4: return "Excellent"
+    if v >= 3: return "Good"
+    if v >= 2: return "Moderate"
+    return "Poor"
+
+
+def label_phi(v):
+    if v is None: return "N/A"
+    if v >= 7: return "Healthy"
+    if v >= 4: return "Mild Stress"
+    return "Critical"
+
+
+def final_message(sqi, phi):
+    if sqi and phi and sqi >= 3.5 and phi >= 7:
+        return "Conditions Optimal"
+    return "Some improvements recommended"
+
+
+def build_recommendation(model_input, sqi, phi):
 
-    # ---- RUN ML MODELS ----
-    sqi, phi = run_predictions(req)
-    
     # ---- BUILD ROW FOR TREATMENT ENGINE ----
     treatment_row = {
         "SQI": sqi,
         "PHI": phi,
 
         # crop & stage
-        "Crop_Name": req.get("crop", "generic"),
-        "Growth_Stage": req.get("growthStage", "vegetative"),
+        "Crop_Name": model_input.get("Crop_Name") or "generic",
+        "Growth_Stage": model_input.get("Growth_Stage") or "vegetative",
+
+        # SYMPTOMS (pest / disease control actions)
+        "Pest_Incidence": model_input.get("Pest_Incidence"),
+        "Leaf_Spots": model_input.get("Leaf_Spots"),
 
         # SOIL DATA (static defaults)
         "Soil_Ph": DEFAULT_SOIL_DATA["Soil_Ph"],
@@ -233,30 +731,11 @@ def get_recommendation():
     }
 
     # ---- CALL TREATMENT ENGINE ----
-    treatment_plan = generate_treatment_recommendations(treatment_row)
-
-    # ---- LABELS ----
-    def label_sqi(v):
-        if v is None: return "N/A"
-        if v >= 4: return "Excellent"
-        if v >= 3: return "Good"
-        if v >= 2: return "Moderate"
-        return "Poor"
-
-    def label_phi(v):
-        if v is None: return "N/A"
-        if v >= 7: return "Healthy"
-        if v >= 4: return "Mild Stress"
-        return "Critical"
-
-    final_message = (
-        "Conditions Optimal"
-        if sqi and phi and sqi >= 3.5 and phi >= 7
-        else "Some improvements recommended"
-    )
+    with stage_timer("treatment"):
+        treatment_plan = TREATMENT_PLANS.plan(treatment_row)
 
     # ---- FINAL OUTPUT ----
-    return jsonify({
+    return {
         "status": "success",
 
         "sqi": sqi,
@@ -269,14 +748,412 @@ def get_recommendation():
         "P": DEFAULT_SOIL_DATA["Available_P_Kg_Ha"],
         "K": DEFAULT_SOIL_DATA["Available_K_Kg_Ha"],
 
-        "final_message": final_message,
+        "final_message": final_message(sqi, phi),
 
         # Treatment engine additions
         "deficiencies": treatment_plan.get("deficiencies", []),
         "treatments": treatment_plan.get("treatments", [])
+    }
+
+
+class _BadRecord(str):
+    """Marks an NDJSON line that failed to parse."""
+
+
+def parse_batch_body(req):
+    """
+    Accepts a JSON array, {"records": [...]} or an NDJSON body.
+    Returns a list where unparseable NDJSON lines are kept as error strings.
+    """
+    if "ndjson" in (req.content_type or ""):
+        records = []
+        for line in req.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                records.append(_BadRecord(f"invalid JSON: {e}"))
+        return records
+
+    body = req.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get("records")
+    if not isinstance(body, list):
+        raise ValueError("expected a JSON array, {\"records\": [...]} or NDJSON")
+    return body
+
+
+# ================================================================
+# REQUEST INSTRUMENTATION
+# ================================================================
+# the model version that answered, also in the JSON body as "model_version"
+MODEL_VERSION_HEADER = "X-CropSense-Model-Version"
+
+@app.before_request
+def _start_request():
+    g.request_start = time.perf_counter()
+    # sampling profiler, only with CROPSENSE_PROFILING=1 and
+    # "X-CropSense-Profile: 1" / ?profile=1 on the request
+    g.profiler = SamplingProfiler().start() if profile_requested(request.headers, request.args) else None
+
+
+@app.after_request
+def _finish_request(response):
+    endpoint = request.endpoint or "unmatched"
+    start = g.pop("request_start", None)
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        REQUEST_SECONDS.labels(endpoint).observe(elapsed)
+        # the request that loaded the models says nothing about load
+        if endpoint in SHED_ENDPOINTS and not g.pop("cold_start", False):
+            TIER_CONTROL.observe(elapsed)
+    REQUESTS.labels(endpoint, response.status_code).inc()
+
+    version = g.pop("model_version", None)
+    if version is not None:
+        response.headers[MODEL_VERSION_HEADER] = version
+    tier = g.pop("model_tier", None)
+    if tier is not None:
+        response.headers[MODEL_TIER_HEADER] = tier
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        path = profiler.stop().save(endpoint)
+        response.headers[PROFILE_HEADER] = f"{path}; samples={profiler.samples}"
+
+    REGISTRY.ensure_flusher()
+    return response
+
+
+@app.teardown_request
+def _teardown_request(exc):
+    # after_request is skipped when the view raised: still stop the
+    # sampler thread and give the switch interval back
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop().save(request.endpoint or "unmatched")
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+# ================================================================
+# ROUTES
+# ================================================================
+@app.route("/", endpoint="index")
+def index():
+    return render_template("index.html")
+
+@app.route("/about", endpoint="about_us")
+def about_page():
+    return render_template("aboutus.html")
+
+@app.route("/contact", endpoint="contact_us")
+def contact_page():
+    return render_template("contactus.html")
+
+@app.route("/recommendations", endpoint="recommendations")
+def recommendations_page():
+    return render_template("recommendations.html")
+
+
+# ================================================================
+# FIELD HISTORY API
+# ================================================================
+# ?since= / ?until= take unix seconds or ISO dates; trends read the
+# rollups (?bucket=day|week|stage), /history the raw records (?limit=)
+def _history_args():
+    """(since, until, bucket) from the query string; ValueError when malformed."""
+    if HISTORY is None:
+        abort(404)
+    bucket = request.args.get("bucket") or "day"
+    if bucket not in HISTORY_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(HISTORY_BUCKETS)}")
+    return parse_time(request.args.get("since")), parse_time(request.args.get("until")), bucket
+
+
+@app.route("/api/fields/<field>/history")
+def field_history(field):
+    try:
+        since, until, _ = _history_args()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    limit = request.args.get("limit", HISTORY_LIMIT, type=int)
+    records = HISTORY.records(field, since, until, max(1, min(limit, 10 * HISTORY_LIMIT)))
+    return jsonify({"status": "success", "field": field, "count": len(records), "records": records})
+
+
+@app.route("/api/fields/<field>/trend")
+def field_trend(field):
+    try:
+        since, until, bucket = _history_args()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "field": field, "bucket": bucket,
+                    "trend": HISTORY.field_trend(field, since, until, bucket)})
+
+
+@app.route("/api/crops/<crop>/trend")
+def crop_trend(crop):
+    try:
+        since, until, bucket = _history_args()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "crop": crop, "bucket": bucket,
+                    "trend": HISTORY.crop_trend(crop, since, until, bucket)})
+
+
+# ================================================================
+# CROP PRODUCTION API (home page map)
+# ================================================================
+# per-crop state totals from the index in utils/crop_production.py, so the
+# map fetches one crop (~3 KB) instead of every crop x state x year record;
+# clients revalidate with If-None-Match and get 304 while the data is unchanged
+PRODUCTION_CACHE_CONTROL = "public, no-cache"
+
+
+def _production_response(body, etag):
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = PRODUCTION_CACHE_CONTROL
+    return response.make_conditional(request)
+
+
+@app.route("/api/crop-production")
+def crop_production_index():
+    return _production_response(*get_production_index().crop_list())
+
+
+@app.route("/api/crop-production/<crop>")
+def crop_production(crop):
+    index = get_production_index()
+    found = index.crop_summary(crop, request.args.get("year") or None)
+    if found is None:
+        return jsonify({"status": "error", "message": f"no production data for {crop!r}"}), 404
+    return _production_response(*found)
+
+
+# ================================================================
+# STATIC ASSETS (fingerprinted build in static/dist)
+# ================================================================
+# `python cropsense.py build-assets` writes static/dist + manifest.json
+# (utils/static_assets.py). Templates call asset_url() / picture() and get
+# hashed, cache-forever URLs; with no build they get plain /static URLs.
+# CROPSENSE_ASSET_DIR="" turns the build off (e.g. while editing CSS).
+ASSET_DIR = os.environ.get("CROPSENSE_ASSET_DIR", os.path.join(BASE_DIR, "static", "dist"))
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_ASSETS = []          # [AssetManifest or None] once loaded
+
+# (script root, filename) -> asset_url / asset_image result; the manifest
+# never changes in a running process, and /recommendations has ~800 URLs
+_ASSET_URLS = {}
+
+
+def assets():
+    """The static/dist manifest (read once per process), or None without a build."""
+    if not _ASSETS:
+        _ASSETS.append(load_asset_manifest(ASSET_DIR) if ASSET_DIR else None)
+    return _ASSETS[0]
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL for a file under static/: its fingerprinted copy when built."""
+    key = (request.script_root, filename)
+    url = _ASSET_URLS.get(key)
+    if url is None:
+        manifest = assets()
+        path = manifest.path(filename) if manifest is not None else None
+        url = url_for("static", filename=filename) if path is None else url_for("asset", filename=path)
+        _ASSET_URLS[key] = url
+    return url
+
+
+@app.template_global()
+def asset_image(filename):
+    """src/srcset per image type for templates/_assets.html, or None without a build."""
+    key = (request.script_root, filename, "image")
+    if key in _ASSET_URLS:
+        return _ASSET_URLS[key]
+    manifest = assets()
+    entry = manifest.image(filename) if manifest is not None else None
+    image = None
+    if entry is not None:
+        srcsets = [
+            (content_type, ", ".join(f"{url_for('asset', filename=path)} {width}w" for width, path in candidates))
+            for content_type, candidates in entry["srcset"]
+        ]
+        image = {
+            "src": url_for("asset", filename=entry["path"]),
+            "srcset": srcsets[-1][1],          # the jpeg/png fallback, on the <img> itself
+            "sources": srcsets[:-1],           # avif, webp: <source> elements, best first
+        }
+    _ASSET_URLS[key] = image
+    return image
+
+
+@app.route(app.static_url_path + "/dist/<path:filename>", endpoint="asset")
+def asset(filename):
+    manifest = assets()
+    info = manifest.file(filename) if manifest is not None else None
+    if info is None:
+        abort(404)
+
+    encoding = request.accept_encodings.best_match(list(info["encodings"])) if info["encodings"] else None
+    suffix = dict(ASSET_ENCODINGS).get(encoding, "")
+    response = send_from_directory(
+        ASSET_DIR, filename + suffix,
+        mimetype=info["type"],
+        etag=f"{info['etag']}-{encoding}" if encoding else info["etag"],
+        max_age=ASSET_MAX_AGE,
+        conditional=True,
+    )
+    response.headers.pop("Content-Disposition", None)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.content_encoding = encoding
+    if info["encodings"]:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+
+# ================================================================
+# MAIN API ENDPOINT
+# ================================================================
+@app.route("/get_recommendation", methods=["POST"])
+def get_recommendation():
+    with stage_timer("map"):
+        req = request.json or {}
+        try:
+            model_input = map_frontend_to_model(req)
+            requested = requested_tier(request)
+            explain = explain_requested(request)
+        except SchemaError as e:
+            return jsonify({"status": "error", "message": str(e), "errors": e.errors}), 400
+        except TierError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+    if RECORDER is not None:
+        RECORDER.record(req)
+
+    # one LoadedModels for the whole request, even if a swap lands meanwhile
+    g.cold_start = _MODELS is None
+    m = models()
+    g.model_version = m.version
+
+    # ---- CACHE LOOKUP ----
+    # only full-tier answers are cached, and they serve every tier
+    key, cached = cache_lookup(model_input)
+    cached = cached_response(cached, explain)
+    if cached is not None:
+        g.model_tier = cached.get("model_tier", "full")
+        if HISTORY is not None:
+            HISTORY.record_request(req, model_input, cached)
+        with stage_timer("serialize"):
+            return jsonify(cached)
+
+    # ---- RUN ML MODELS ----
+    # explanations come from the full models, never shed
+    tier = g.model_tier = "full" if explain else serving_tier(m, requested)
+    with stage_timer("predict"):
+        if explain:
+            sqi, phi, explanation = explain_model_input(model_input, m)
+        else:
+            sqi, phi = predict_model_input(model_input, m, tier)
+    result = build_recommendation(model_input, sqi, phi)
+    result["model_version"] = m.version
+    result["model_tier"] = tier
+    if explain:
+        result["explanation"] = explanation
+
+    if tier == "full":
+        cache_store(key, result)
+    if HISTORY is not None:
+        HISTORY.record_request(req, model_input, result)
+    with stage_timer("serialize"):
+        return jsonify(result)
+
+
+# ================================================================
+# BATCH API ENDPOINT
+# ================================================================
+@app.route("/get_recommendations/batch", methods=["POST"])
+def get_recommendations_batch():
+    try:
+        records = parse_batch_body(request)
+        requested = requested_tier(request)
+    except ValueError as e:                 # TierError is a ValueError
+        return jsonify({"status": "error", "message": str(e)}), 400
+    explain = explain_requested(request)
+
+    m = models()
+    g.model_version = m.version
+    tier = g.model_tier = "full" if explain else serving_tier(m, requested)
+    results = []
+    scored = score_batch(records, m, tier, explain)
+    for i, (record, (model_input, sqi, phi, explanation, error)) in enumerate(zip(records, scored)):
+        if isinstance(record, _BadRecord):
+            error = str(record)
+        if error is not None:
+            results.append({"index": i, "status": "error", "message": error})
+            continue
+        out = build_recommendation(model_input, sqi, phi)
+        out["index"] = i
+        if explain:
+            out["explanation"] = explanation
+        if HISTORY is not None:
+            HISTORY.record_request(record, model_input, out, m.version)
+        results.append(out)
+
+    return jsonify({
+        "status": "success",
+        "model_version": m.version,
+        "model_tier": tier,
+        "count": len(results),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
     })
 
 
+# ================================================================
+# WARM-UP
+# ================================================================
+def _warm(m):
+    model_input = map_frontend_to_model({"crop": "rice", "growthStage": "Vegetative"})
+    for tier in m.tier_names:
+        sqi, phi = predict_model_input(model_input, m, tier)
+    build_recommendation(model_input, sqi, phi)
+
+
+def warm_up():
+    """
+    Eager start-up hook: loads the models (if not loaded yet) and runs one
+    uncached end-to-end prediction. Returns the elapsed seconds.
+    """
+    start = time.perf_counter()
+    m = models()
+    # a worker forked after CURRENT moved switches before it takes traffic
+    version = MODEL_REGISTRY.current() if MODEL_BUNDLE_PINNED is None else None
+    if version is not None and version != m.source and version != _SWAP["failed"]:
+        swap_models(version)
+    else:
+        _warm(m)
+    return time.perf_counter() - start
+
+
+if EAGER_LOAD:
+    models()
+
+# with CROPSENSE_METRICS_DIR set, this process's numbers (model and CSV
+# loads) are written out too; forked workers start their own writer
+REGISTRY.ensure_flusher()
+
+
 # ================================================================
 # RUN SERVER
 # ================================================================
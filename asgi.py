@@ -0,0 +1,210 @@
+# ================================================================
+# CropSense ASGI server (optional async mode)
+#
+#   pip install uvicorn asgiref
+#   uvicorn asgi:app --host 0.0.0.0 --port 8080
+#
+# /get_recommendation is handled natively: each request maps its payload,
+# puts the row on a MicroBatcher queue and awaits its result, so concurrent
+# requests share one vectorized SQI+PHI predict. Every other route is
+# passed through to the Flask app (needs asgiref).
+#
+# Tuning: CROPSENSE_BATCH_MAX_ROWS (default 64) and
+# CROPSENSE_BATCH_MAX_WAIT_MS (default 2).
+#
+# GET /metrics is served here too, with the same metrics as the Flask
+# app plus the micro-batcher's batch/row counts.
+#
+# Model tiers and ?explain=1 work as in the Flask app (X-CropSense-Model-Tier
+# or ?tier=, load shedding on /get_recommendation latency); a micro-batch
+# is split into one predict call per tier plus one explain call.
+# ================================================================
+import json
+import time
+from urllib.parse import parse_qs
+
+import app as cropsense
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, stage_timer
+from utils.microbatch import MicroBatcher
+from utils.load_shedding import parse_tier
+from utils.request_schema import SchemaError
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    FLASK_FALLBACK = WsgiToAsgi(cropsense.app)
+except ImportError:
+    FLASK_FALLBACK = None
+
+
+def _predict_rows(rows):
+    """
+    `rows` are (model input, requested tier, explain); one predict call per
+    serving tier, one explain call (full tier) for the rows that asked.
+    """
+    # one LoadedModels per batch, so every row reports the version that scored it
+    m = cropsense.models()
+    groups = {}
+    for i, (_, requested, explain) in enumerate(rows):
+        groups.setdefault(None if explain else cropsense.serving_tier(m, requested), []).append(i)
+
+    n = len(rows)
+    sqi, phi, tiers, explanations = [None] * n, [None] * n, [None] * n, [None] * n
+    for tier, positions in groups.items():
+        inputs = [rows[i][0] for i in positions]
+        if tier is None:
+            tier, values = "full", cropsense.explain_model_inputs(inputs, m)
+        else:
+            values = (*cropsense.predict_model_inputs(inputs, m, tier), [None] * len(inputs))
+        for i, s, p, e in zip(positions, *values):
+            sqi[i], phi[i], tiers[i], explanations[i] = s, p, tier, e
+    return sqi, phi, [m.version] * n, tiers, explanations
+
+
+BATCHER = MicroBatcher(_predict_rows)
+
+REGISTRY.counter_func(
+    "cropsense_microbatch_total",
+    "Micro-batches scored and rows scored in them.",
+    ("unit",),
+    lambda: {("batches",): BATCHER.batches, ("rows",): BATCHER.rows},
+)
+
+
+# ================================================================
+# HTTP HELPERS
+# ================================================================
+async def _read_body(receive):
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+async def _send(send, body, content_type, status=200, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type.encode("ascii")),
+            (b"content-length", str(len(body)).encode("ascii")),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+async def _send_json(send, payload, status=200):
+    with stage_timer("serialize"):
+        body = json.dumps(payload, sort_keys=True).encode("utf-8")
+    headers = []
+    for name, field in ((cropsense.MODEL_VERSION_HEADER, "model_version"), (cropsense.MODEL_TIER_HEADER, "model_tier")):
+        if payload.get(field):
+            headers.append((name.lower().encode("ascii"), payload[field].encode("ascii")))
+    return await _send(send, body, "application/json", status, headers)
+
+
+def _query(scope):
+    return parse_qs(scope.get("query_string", b"").decode("latin-1"))
+
+
+def _requested_tier(scope, query):
+    """Same as app.requested_tier, from the ASGI scope."""
+    header = cropsense.MODEL_TIER_HEADER.lower().encode("ascii")
+    for name, value in scope.get("headers", ()):
+        if name == header:
+            return parse_tier(value.decode("latin-1"))
+    return parse_tier(query.get("tier", [None])[0])
+
+
+def _explain_requested(query):
+    return query.get("explain", [""])[0].lower() in ("1", "true", "on", "yes")
+
+
+# ================================================================
+# ROUTES
+# ================================================================
+async def get_recommendation(scope, receive, send):
+    body = await _read_body(receive)
+    try:
+        with stage_timer("map"):
+            req = json.loads(body or b"{}") or {}
+            model_input = cropsense.map_frontend_to_model(req)
+            query = _query(scope)
+            requested = _requested_tier(scope, query)
+            explain = _explain_requested(query)
+    except SchemaError as e:
+        return await _send_json(send, {"status": "error", "message": str(e), "errors": e.errors}, status=400)
+    except ValueError as e:             # bad JSON, TierError
+        return await _send_json(send, {"status": "error", "message": str(e)}, status=400)
+    if cropsense.RECORDER is not None:
+        cropsense.RECORDER.record(req)
+
+    key, cached = cropsense.cache_lookup(model_input)
+    cached = cropsense.cached_response(cached, explain)
+    if cached is not None:
+        if cropsense.HISTORY is not None:
+            cropsense.HISTORY.record_request(req, model_input, cached)
+        return await _send_json(send, cached)
+
+    # queue wait + the shared batch predict
+    with stage_timer("predict"):
+        sqi, phi, version, tier, explanation = await BATCHER.submit((model_input, requested, explain))
+    result = cropsense.build_recommendation(model_input, sqi, phi)
+    result["model_version"] = version
+    result["model_tier"] = tier
+    if explain:
+        result["explanation"] = explanation
+    if cropsense.HISTORY is not None:
+        cropsense.HISTORY.record_request(req, model_input, result)
+    if tier == "full":
+        cropsense.cache_store(key, result)
+    return await _send_json(send, result)
+
+
+async def metrics(send):
+    return await _send(send, REGISTRY.render().encode("utf-8"), METRICS_CONTENT_TYPE)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # eager start-up: load the models before the first request
+            cropsense.warm_up()
+            BATCHER.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await BATCHER.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["path"] == "/get_recommendation" and scope["method"] == "POST":
+        start = time.perf_counter()
+        status = await get_recommendation(scope, receive, send)
+        elapsed = time.perf_counter() - start
+        cropsense.REQUEST_SECONDS.labels("get_recommendation").observe(elapsed)
+        cropsense.TIER_CONTROL.observe(elapsed)
+        cropsense.REQUESTS.labels("get_recommendation", status).inc()
+        REGISTRY.ensure_flusher()
+        return
+
+    if scope["type"] == "http" and scope["path"] == "/metrics" and scope["method"] == "GET":
+        await metrics(send)
+        cropsense.REQUESTS.labels("metrics", 200).inc()
+        return
+
+    if FLASK_FALLBACK is not None:
+        await FLASK_FALLBACK(scope, receive, send)
+        return
+
+    await _send_json(send, {"status": "error", "message": "not found"}, status=404)
@@ -0,0 +1,48 @@
+"""
+Compares the per-request prediction loop against the vectorized batch path.
+
+    python benchmarks/batch_throughput.py --rows 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+from payloads import synthetic_payload  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [synthetic_payload(rng) for _ in range(args.rows)]
+
+    start = time.perf_counter()
+    loop = [app.run_predictions(p) for p in payloads]
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = app.run_batch_predictions(payloads)
+    batch_s = time.perf_counter() - start
+
+    max_diff = max(
+        abs(a[0] - b[0]) + abs(a[1] - b[1]) for a, b in zip(loop, batch)
+    )
+
+    print(f"rows:            {args.rows}")
+    print(f"per-request loop {loop_s:8.3f}s  {args.rows / loop_s:10.0f} rows/s")
+    print(f"batch            {batch_s:8.3f}s  {args.rows / batch_s:10.0f} rows/s")
+    print(f"speedup          {loop_s / batch_s:8.1f}x")
+    print(f"max |diff|       {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Single-row latency and output parity: sklearn pipeline vs compiled predictor.
+
+    python benchmarks/compiled_latency.py --rows 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import joblib  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import app  # noqa: E402
+from payloads import synthetic_payload  # noqa: E402
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+
+def sklearn_predict(pipeline, record):
+    df = app.align_model_frame(pd.DataFrame([record]), pipeline.feature_names_in_)
+    return float(pipeline.predict(df)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [app.map_frontend_to_model(synthetic_payload(rng)) for _ in range(args.rows)]
+
+    # with a model bundle the app never loads the pickles; the sklearn side
+    # of the comparison still needs them
+    for name, pipeline, compiled in (
+        ("SQI", app.SQI_PIPELINE or joblib.load(app.SQI_MODEL_PATH), app.SQI_COMPILED),
+        ("PHI", app.PHI_PIPELINE or joblib.load(app.PHI_MODEL_PATH), app.PHI_COMPILED),
+    ):
+        if compiled is None:
+            print(f"{name}: pipeline could not be compiled")
+            continue
+
+        slow, fast = [], []
+        for r in records:
+            t = time.perf_counter()
+            sklearn_predict(pipeline, r)
+            slow.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            compiled.predict(r)
+            fast.append(time.perf_counter() - t)
+
+        s50, s99 = _percentiles(slow)
+        f50, f99 = _percentiles(fast)
+        print(f"{name} sklearn   p50 {s50 * 1e6:8.0f}us  p99 {s99 * 1e6:8.0f}us")
+        print(f"{name} compiled  p50 {f50 * 1e6:8.0f}us  p99 {f99 * 1e6:8.0f}us  ({s50 / f50:.0f}x)")
+        print(f"{name} max |diff| {compiled.max_abs_diff(pipeline, records):.2e}  "
+              f"(mean latency ratio {statistics.mean(slow) / statistics.mean(fast):.0f}x)")
+
+    joint = app.JOINT_PREDICTOR
+    if joint is None:
+        print("joint: SQI/PHI encodings differ, no shared pass")
+        return
+
+    separate, shared = [], []
+    for r in records:
+        t = time.perf_counter()
+        app.SQI_COMPILED.encode(r)
+        app.PHI_COMPILED.encode(r)
+        separate.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        joint.encoder.encode(r)
+        shared.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for r in records:
+        app.SQI_COMPILED.predict(r)
+        app.PHI_COMPILED.predict(r)
+    sep_total = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for r in records:
+        joint.predict(r)
+    joint_total = time.perf_counter() - t
+
+    print(f"encode  separate p50 {_percentiles(separate)[0] * 1e6:6.0f}us  shared p50 {_percentiles(shared)[0] * 1e6:6.0f}us")
+    print(f"SQI+PHI separate {sep_total / len(records) * 1e6:6.0f}us/row  joint {joint_total / len(records) * 1e6:6.0f}us/row")
+
+
+if __name__ == "__main__":
+    main()
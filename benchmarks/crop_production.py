@@ -0,0 +1,83 @@
+"""
+What the home page map downloads per crop: the whole static/data.json
+(before) vs /api/crop-production/<crop> (now), as the data grows by years.
+
+    python benchmarks/crop_production.py
+    python benchmarks/crop_production.py --years 2 10 50 --requests 2000
+
+For each size a copy of static/data.json is extended with synthetic years
+(the real records with scaled values). Reported per size: full file bytes
+(raw / gzip), per-crop response bytes (largest crop, raw / gzip), the
+index build time, the first (serializing) and cached per-crop response
+time, and how many records the browser used to parse and filter per
+dropdown change.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.crop_production import PRODUCTION_FILE, ProductionIndex, VALUE_FIELD, YEAR_FIELD  # noqa: E402
+
+
+def grow(records, years, seed=0):
+    """The real records plus synthetic earlier years, `years` in total."""
+    rng = random.Random(seed)
+    real = sorted({r[YEAR_FIELD] for r in records})
+    start = int(real[0][:4])
+    out = list(records)
+    for i in range(years - len(real)):
+        first = start - 1 - i
+        label = f"{first}-{(first + 1) % 100:02d}"
+        for r in records:
+            if r[YEAR_FIELD] == real[-1]:
+                value = float(r[VALUE_FIELD]) * rng.uniform(0.7, 1.1)
+                out.append({**r, YEAR_FIELD: label, VALUE_FIELD: f"{value:.2f}"})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=[2, 10, 25, 50])
+    parser.add_argument("--requests", type=int, default=1000, help="cached responses timed per size")
+    args = parser.parse_args()
+
+    with open(PRODUCTION_FILE, encoding="utf-8") as f:
+        records = json.load(f)
+
+    print(f"{'years':>5s} {'records':>8s} {'data.json KB':>14s} {'per crop KB':>13s} "
+          f"{'index ms':>9s} {'first ms':>9s} {'cached us':>10s}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in args.years:
+            data = grow(records, years)
+            path = os.path.join(tmp, f"data-{years}.json")
+            body = json.dumps(data).encode()
+            with open(path, "wb") as f:
+                f.write(body)
+
+            t = time.perf_counter()
+            index = ProductionIndex(path)
+            index_ms = (time.perf_counter() - t) * 1000
+
+            crop = max(index.crops, key=lambda c: sum(len(v) for v in index.crops[c].values()))
+            t = time.perf_counter()
+            summary, _ = index.crop_summary(crop)
+            first_ms = (time.perf_counter() - t) * 1000
+            t = time.perf_counter()
+            for _ in range(args.requests):
+                index.crop_summary(crop)
+            cached_us = (time.perf_counter() - t) / args.requests * 1e6
+
+            print(f"{years:5d} {len(data):8d} {len(body) / 1024:6.1f} / {len(gzip.compress(body)) / 1024:5.1f} "
+                  f"{len(summary) / 1024:5.1f} / {len(gzip.compress(summary)) / 1024:4.1f} "
+                  f"{index_ms:9.2f} {first_ms:9.3f} {cached_us:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
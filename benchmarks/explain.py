@@ -0,0 +1,77 @@
+"""
+What ?explain=1 costs on top of a plain prediction, per row.
+
+    python benchmarks/explain.py
+    python benchmarks/explain.py --rows 2048 --repeat 5
+
+For one payload and for a batch of `rows` payloads (SQI + PHI, from the
+decoded model inputs): predict_model_inputs, then explain_model_inputs
+with XGBoost's path attribution ("approx", the default) and with exact
+TreeSHAP ("exact"). The explain calls return the predictions too, so
+"extra" is what a caller pays over not explaining. "cached" is a repeated
+/get_recommendation?explain=1 for the same payload.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+from payloads import Vocabulary  # noqa: E402
+from utils.explain import build_joint_explainer  # noqa: E402
+
+
+def per_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1024, help="payloads per batch")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs, best kept")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    m = app.models()
+    if m.explainer is None:
+        sys.exit("the models could not be compiled, explain mode is off")
+    rng = random.Random(args.seed)
+    vocab = Vocabulary.from_app(app)
+    payloads = [vocab.payload(rng) for _ in range(args.rows)]
+    batch, _ = app.REQUEST_SCHEMA.decode_many(payloads)
+    single = [batch.record(0)]
+    approx = m.explainer
+    exact = build_joint_explainer(m.sqi_compiled, m.phi_compiled, names=("sqi", "phi"), method="exact")
+
+    # exact TreeSHAP is ~100x slower; time it on a slice of the batch
+    exact_rows, _ = app.REQUEST_SCHEMA.decode_many(payloads[:64])
+
+    print(f"{'us/row':18s} {'predict':>9s} {'approx':>9s} {'extra':>8s} {'exact':>9s} {'extra':>8s}")
+    for label, rows, slice_rows in (("single", single, single), (f"batch[{args.rows}]", batch, exact_rows)):
+        predict = per_call(lambda: app.predict_model_inputs(rows, m), args.repeat) / len(rows)
+        m.explainer = approx
+        fast = per_call(lambda: app.explain_model_inputs(rows, m), args.repeat) / len(rows)
+        m.explainer = exact
+        slow = per_call(lambda: app.explain_model_inputs(slice_rows, m), 1) / len(slice_rows)
+        m.explainer = approx
+        print(f"{label:18s} {predict * 1e6:9.1f} {fast * 1e6:9.1f} {(fast - predict) * 1e6:8.1f} "
+              f"{slow * 1e6:9.1f} {(slow - predict) * 1e6:8.1f}")
+
+    client = app.app.test_client()
+    if app.RECOMMENDATION_CACHE is not None:
+        client.post("/get_recommendation?explain=1", json=payloads[0])
+        cached = per_call(lambda: client.post("/get_recommendation?explain=1", json=payloads[0]), 200)
+        print(f"{'cached request':18s} {cached * 1e6:9.1f} us (whole /get_recommendation?explain=1)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Starts gunicorn, waits for the first successful /get_recommendation and
+reports cold-start time plus RSS / PSS (proportional, i.e. shared pages
+split between processes) for the master and each worker. Linux only.
+
+    python benchmarks/gunicorn_startup.py -- -w 3 app:app
+    python benchmarks/gunicorn_startup.py -- -c deployement/gunicorn_config.py app:app
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _memory_kb(pid):
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    out[key.lower()] = int(rest.split()[0])
+    except OSError:
+        pass
+    return out
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("gunicorn_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    gargs = [a for a in args.gunicorn_args if a != "--"]
+    cmd = [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{args.port}", *gargs]
+    body = json.dumps({"crop": "rice", "growthStage": "Flowering"}).encode()
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = None
+        while time.perf_counter() - start < args.timeout:
+            try:
+                req = urllib.request.Request(
+                    f"http://127.0.0.1:{args.port}/get_recommendation",
+                    data=body, headers={"Content-Type": "application/json"},
+                )
+                t = time.perf_counter()
+                with urllib.request.urlopen(req, timeout=30) as r:
+                    r.read()
+                first = time.perf_counter() - t
+                break
+            except OSError:
+                time.sleep(0.05)
+        ready = time.perf_counter() - start
+
+        # let every worker finish booting before reading memory
+        time.sleep(3)
+        workers = _children(proc.pid)
+
+        print(f"command:                 {' '.join(gargs)}")
+        print(f"time to first response:  {ready:6.2f}s  (first request itself {first * 1e3 if first else float('nan'):.1f}ms)")
+        m = _memory_kb(proc.pid)
+        print(f"master   rss {m.get('rss', 0) / 1024:7.1f} MB  pss {m.get('pss', 0) / 1024:7.1f} MB")
+        total_pss = m.get("pss", 0)
+        for pid in workers:
+            m = _memory_kb(pid)
+            total_pss += m.get("pss", 0)
+            print(f"worker   rss {m.get('rss', 0) / 1024:7.1f} MB  pss {m.get('pss', 0) / 1024:7.1f} MB")
+        print(f"total pss {total_pss / 1024:7.1f} MB over {len(workers)} workers")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
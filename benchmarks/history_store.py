@@ -0,0 +1,122 @@
+"""
+Field history store (utils/history.py) at scale: append throughput, the
+request-thread cost of record(), query latency and segment compaction.
+
+    python benchmarks/history_store.py
+    python benchmarks/history_store.py --rows 10000000 --fields 200000 --months 6
+
+`rows` records for `fields` fields are spread over the last `months` UTC
+months (a pool of real scored requests with random fields and times) and
+appended in MAX_BATCH transactions, as the writer thread does. Then:
+newest-100 history of a field, a field's trend by growth stage, a crop's
+daily trend over the whole range, and compaction of the oldest closed
+month (size before / after).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app  # noqa: E402
+from payloads import Vocabulary  # noqa: E402
+from utils.history import DAY, MAX_BATCH, HistoryStore  # noqa: E402
+
+
+def timed(fn, repeat):
+    """(median seconds, last result)."""
+    times, out = [], None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t)
+    times.sort()
+    return times[len(times) // 2], out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--fields", type=int, default=50_000)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200, help="timed queries per kind")
+    parser.add_argument("--dir", help="where to put the database (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = Vocabulary.from_app(app)
+    pool = []
+    for _ in range(256):
+        model_input = app.map_frontend_to_model(vocab.payload(rng))
+        sqi, phi = app.predict_model_input(model_input)
+        result = app.build_recommendation(model_input, sqi, phi)
+        result["model_version"] = app.models().version
+        pool.append((model_input, result))
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        store = HistoryStore(path, queue_size=args.rows, compact_interval=0)
+        now = time.time()
+        start = now - args.months * 31 * DAY
+        fields = [f"field-{i}" for i in range(args.fields)]
+
+        # request-thread cost: record() only queues
+        model_input, result = pool[0]
+        t = time.perf_counter()
+        for i in range(10000):
+            store.record(fields[i % len(fields)], "", model_input, result)
+        enqueue_us = (time.perf_counter() - t) / 10000 * 1e6
+        store.flush(timeout=120)
+        store.close()
+
+        t = time.perf_counter()
+        written = 0
+        while written < args.rows:
+            n = min(MAX_BATCH, args.rows - written)
+            batch = []
+            for _ in range(n):
+                model_input, result = pool[rng.randrange(len(pool))]
+                ts = start + rng.random() * (now - start)
+                batch.append((ts, fields[rng.randrange(len(fields))], "", model_input, result, None))
+            store.write(batch)
+            written += n
+        append = time.perf_counter() - t
+        size = os.path.getsize(path) + os.path.getsize(path + "-wal")
+
+        print(f"{args.rows} records, {args.fields} fields, {args.months} months, {size / 2 ** 20:.0f} MiB")
+        print(f"record() on the request thread  {enqueue_us:8.2f} us")
+        print(f"append (writer)                 {args.rows / append:8.0f} records/s")
+
+        picks = [fields[rng.randrange(len(fields))] for _ in range(args.queries)]
+        it = iter(picks * 3)
+        history, out = timed(lambda: store.records(next(it), limit=100), args.queries)
+        print(f"field history, newest 100       {history * 1e3:8.2f} ms  ({len(out)} records)")
+        stage, out = timed(lambda: store.field_trend(next(it), bucket="stage"), args.queries)
+        print(f"field trend by stage            {stage * 1e3:8.2f} ms  ({len(out)} buckets)")
+        crop = pool[0][0]["Crop_Name"]
+        daily, out = timed(lambda: store.crop_trend(crop, bucket="day"), 20)
+        print(f"crop trend by day ({crop})      {daily * 1e3:8.2f} ms  ({len(out)} buckets)")
+        weekly, out = timed(lambda: store.crop_trend(crop, since=now - 28 * DAY, bucket="week"), 20)
+        print(f"crop trend, last 4 weeks        {weekly * 1e3:8.2f} ms  ({len(out)} buckets)")
+
+        conn = store._conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        before = os.path.getsize(path)
+        t = time.perf_counter()
+        done = store.compact(now=now)
+        compact = time.perf_counter() - t
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = os.path.getsize(path)
+        print(f"compaction of {done['compacted']}      {compact:8.2f} s    "
+              f"file {before / 2 ** 20:.0f} -> {after / 2 ** 20:.0f} MiB")
+        history, out = timed(lambda: store.records(next(it), limit=100), args.queries)
+        print(f"field history after compaction  {history * 1e3:8.2f} ms  ({len(out)} records)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Zero-downtime model swap under load.
+
+Closed-loop clients keep a running server busy while this script points
+the registry's CURRENT at another version and, later, rolls it back.
+Every response's X-CropSense-Model-Version is recorded, so the report
+shows how long each switch took to reach all workers, whether any
+request failed, and latency before, around and after each switch.
+
+    CROPSENSE_MODEL_CHECK_SECONDS=1 CROPSENSE_CACHE_BACKEND=off \\
+        gunicorn -c deployement/gunicorn_config.py app:app
+    python benchmarks/hot_swap.py --url http://127.0.0.1:8080 --registry models
+
+The registry needs at least two versions (cropsense.py models list).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import Client, percentile  # noqa: E402
+from payloads import synthetic_payload  # noqa: E402
+from utils.model_registry import ModelRegistry  # noqa: E402
+
+HEADER = "X-CropSense-Model-Version"
+
+
+def load(url, bodies, concurrency, duration, samples):
+    """Closed-loop clients for `duration` seconds; appends (start, seconds, ok, version) to `samples`."""
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def worker(seed):
+        client = Client(url)
+        rng = random.Random(seed)
+        mine = []
+        while time.perf_counter() < stop:
+            t = time.perf_counter()
+            try:
+                ok = client.post("/get_recommendation", rng.choice(bodies)) == 200
+                version = client.headers.get(HEADER) if ok else None
+            except Exception:
+                ok, version = False, None
+            mine.append((t, time.perf_counter() - t, ok, version))
+        with lock:
+            samples.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def window(samples, start, stop):
+    lat = sorted(s[1] for s in samples if start <= s[0] < stop and s[2])
+    errors = sum(1 for s in samples if start <= s[0] < stop and not s[2])
+    return {"requests": len(lat) + errors, "errors": errors,
+            "p50_ms": percentile(lat, 0.50) * 1e3, "p99_ms": percentile(lat, 0.99) * 1e3,
+            "max_ms": (lat[-1] if lat else float("nan")) * 1e3}
+
+
+def switch_report(samples, at, version):
+    """Seconds from the switch until the first response from `version` and until the last from any other."""
+    after = [s for s in samples if s[0] >= at]
+    first = next((s[0] + s[1] for s in after if s[3] == version), None)
+    last_other = max((s[0] + s[1] for s in after if s[2] and s[3] != version), default=None)
+    return {
+        "first_new_s": None if first is None else first - at,
+        "last_old_s": None if last_other is None else max(0.0, last_other - at),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--registry", default=os.path.join(ROOT, "models"))
+    parser.add_argument("--to", default=None, help="version to activate (default: newest non-current one)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--swap-at", type=float, default=10.0)
+    parser.add_argument("--rollback-at", type=float, default=20.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    before = registry.current()
+    target = args.to or next((v for v in reversed(registry.versions()) if v != before), None)
+    if target is None:
+        parser.error(f"{args.registry} needs a second version to swap to")
+
+    rng = random.Random(3)
+    bodies = [json.dumps(synthetic_payload(rng)).encode("utf-8") for _ in range(500)]
+    samples = []
+    start = time.perf_counter()
+    threads = load(args.url, bodies, args.concurrency, args.duration, samples)
+
+    time.sleep(max(0.0, start + args.swap_at - time.perf_counter()))
+    swap_at = time.perf_counter()
+    registry.activate(target)
+    time.sleep(max(0.0, start + args.rollback_at - time.perf_counter()))
+    rollback_at = time.perf_counter()
+    back = registry.rollback()
+    for t in threads:
+        t.join()
+    end = time.perf_counter()
+
+    report = {
+        "from": before,
+        "to": target,
+        "back_to": back,
+        "before": window(samples, start, swap_at),
+        "swap_window": window(samples, swap_at, swap_at + 5),
+        "between": window(samples, swap_at + 5, rollback_at),
+        "rollback_window": window(samples, rollback_at, rollback_at + 5),
+        "after": window(samples, rollback_at + 5, end),
+        "swap": switch_report([s for s in samples if s[0] < rollback_at], swap_at, target),
+        "rollback": switch_report(samples, rollback_at, back),
+        "versions_seen": sorted({s[3] for s in samples if s[3]}),
+        "errors": sum(1 for s in samples if not s[2]),
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"swap {before} -> {target} at {args.swap_at:.0f}s, rollback -> {back} at {args.rollback_at:.0f}s; "
+          f"{report['errors']} failed requests")
+    for name in ("before", "swap_window", "between", "rollback_window", "after"):
+        w = report[name]
+        print(f"{name:16s} {w['requests']:6d} req  errors {w['errors']}  p50 {w['p50_ms']:6.1f}ms  "
+              f"p99 {w['p99_ms']:6.1f}ms  max {w['max_ms']:6.1f}ms")
+    for name in ("swap", "rollback"):
+        r = report[name]
+        print(f"{name:16s} first new-version response after {r['first_new_s']}s, "
+              f"last old-version response {r['last_old_s']}s after the switch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Closed-loop load test against a running CropSense server.
+
+Each of --concurrency client threads keeps one keep-alive connection and
+sends POST /get_recommendation back to back with synthetic payloads until
+--requests have been sent in total.
+
+    gunicorn -c deployement/gunicorn_config.py app:app
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --concurrency 32
+
+    uvicorn asgi:app --port 8080
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --concurrency 32
+
+Run servers with CROPSENSE_CACHE_BACKEND=off to measure the models and
+not the cache.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from payloads import synthetic_payload  # noqa: E402
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return float("nan")
+    idx = min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples))) - 1))
+    return sorted_samples[idx]
+
+
+def summarize(latencies, errors, elapsed):
+    """Dict with throughput, error rate and latency percentiles (ms)."""
+    lat = sorted(latencies)
+    total = len(lat) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(lat) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(lat, 0.50) * 1e3,
+        "p95_ms": percentile(lat, 0.95) * 1e3,
+        "p99_ms": percentile(lat, 0.99) * 1e3,
+    }
+
+
+def print_summary(stats):
+    print(f"requests   {stats['requests']}  errors {stats['errors']} ({stats['error_rate']:.2%})")
+    print(f"throughput {stats['throughput_rps']:.1f} req/s over {stats['elapsed_s']:.2f}s")
+    print(f"latency    p50 {stats['p50_ms']:.1f}ms  p95 {stats['p95_ms']:.1f}ms  p99 {stats['p99_ms']:.1f}ms")
+
+
+class Client:
+    """One keep-alive HTTP connection that reconnects after errors."""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.conn = None
+        self.headers = None       # of the last response
+
+    def post(self, path, body):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            resp = self.conn.getresponse()
+            resp.read()
+            self.headers = resp.headers
+            return resp.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+
+
+def run(url, payloads, concurrency, path="/get_recommendation"):
+    """Fires `payloads` with `concurrency` closed-loop clients; returns summarize()."""
+    bodies = [json.dumps(p).encode("utf-8") for p in payloads]
+    lock = threading.Lock()
+    cursor = [0]
+    latencies, errors = [], [0]
+
+    def worker():
+        client = Client(url)
+        mine = []
+        while True:
+            with lock:
+                i = cursor[0]
+                cursor[0] += 1
+            if i >= len(bodies):
+                break
+            t = time.perf_counter()
+            try:
+                ok = client.post(path, bodies[i]) == 200
+            except Exception:
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - t)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = [synthetic_payload(rng) for _ in range(args.requests)]
+    print_summary(run(args.url, payloads, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Model load time and resident memory: joblib pickles vs the model bundle.
+
+Every measurement runs in a fresh interpreter so import caches don't
+carry over; the best of --repeat runs is reported.
+
+    python cropsense.py export-bundle       # once, if models/bundle is missing
+    python benchmarks/model_load.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the child; prints one JSON line
+CHILD = r"""
+import json, os, sys, time, warnings
+warnings.filterwarnings("ignore")
+sys.path.insert(0, ROOT)
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+import numpy, pandas, xgboost          # shared by both paths, not counted
+base_rss = rss_kb()
+start = time.perf_counter()
+
+if MODE == "pickle":
+    import joblib
+    from utils.inference import compile_pipeline
+    sqi = joblib.load(os.path.join(ROOT, "models", "SQI_full_pipeline.pkl"))
+    phi = joblib.load(os.path.join(ROOT, "models", "PHI_full_pipeline.pkl"))
+    models = [compile_pipeline(sqi), compile_pipeline(phi)]
+else:
+    from utils.model_bundle import load_bundle
+    bundle = load_bundle(os.path.join(ROOT, "models", "bundle"))
+    models = [bundle["SQI"], bundle["PHI"]]
+
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": (rss_kb() - base_rss) / 1024,
+    "sklearn_imported": "sklearn" in sys.modules,
+    "compiled": all(m is not None for m in models),
+}))
+"""
+
+
+def measure(mode):
+    code = f"ROOT = {ROOT!r}\nMODE = {mode!r}\n" + CHILD
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(ROOT, "models", "bundle", "manifest.json")):
+        sys.exit("models/bundle is missing; run: python cropsense.py export-bundle")
+
+    results = {}
+    for mode in ("pickle", "bundle"):
+        runs = [measure(mode) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        results[mode] = best
+        print(f"{mode:7s} load {best['seconds'] * 1e3:7.1f}ms  +rss {best['rss_mb']:6.1f}MB  "
+              f"sklearn imported: {best['sklearn_imported']}  compiled: {best['compiled']}")
+
+    p, b = results["pickle"], results["bundle"]
+    print(f"bundle is {p['seconds'] / b['seconds']:.1f}x faster to load and uses "
+          f"{p['rss_mb'] - b['rss_mb']:.1f}MB less resident memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Model tiers: what each reduced-cost variant in the bundle costs and how
+far it is from the full models, and what load shedding does to request
+latency when the server is overloaded.
+
+    python benchmarks/model_tiers.py
+    python benchmarks/model_tiers.py --rows 2048 --threads 8 --seconds 5 --slo-ms 20
+
+Part 1, per tier the bundle carries: single-request predict time
+(predict_model_input), batch time per row (predict_model_inputs on `rows`
+payloads) and the RMSE of its SQI / PHI against the full tier on the same
+payloads, next to the curve recorded in the manifest at export time.
+
+Part 2: `threads` clients send /get_recommendation (Flask test client, no
+cache) for `seconds`, once with shedding off and once with a
+`slo_ms` SLO. Reported: requests/s, p50 / p95 latency and the share of
+requests each tier answered.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("CROPSENSE_CACHE_BACKEND", "off")
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+from payloads import Vocabulary  # noqa: E402
+from utils.load_shedding import TierController  # noqa: E402
+
+
+def per_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def tier_table(m, payloads, repeat):
+    inputs = [app.map_frontend_to_model(p) for p in payloads]
+    batch, _ = app.REQUEST_SCHEMA.decode_many(payloads)
+    full = [np.array(v) for v in app.predict_model_inputs(batch, m)]
+
+    print(f"{'tier':8s} {'single us':>10s} {'batch us/row':>13s} {'SQI rmse':>9s} {'PHI rmse':>9s}   (vs full)")
+    for tier in m.tier_names:
+        single = per_call(lambda: [app.predict_model_input(x, m, tier) for x in inputs[:200]], repeat) / 200
+        many = per_call(lambda: app.predict_model_inputs(batch, m, tier), repeat) / len(batch)
+        values = [np.array(v) for v in app.predict_model_inputs(batch, m, tier)]
+        rmse = [float(np.sqrt(np.mean((v - f) ** 2))) for v, f in zip(values, full)]
+        print(f"{tier:8s} {single * 1e6:10.1f} {many * 1e6:13.2f} {rmse[0]:9.4f} {rmse[1]:9.4f}")
+
+    for name, entry in m.bundle.manifest["models"].items():
+        curve = entry.get("curve")
+        if not curve:
+            continue
+        print(f"\n{name} curve recorded at export:")
+        for point in curve:
+            error = point.get("rmse", point["deviation_rmse"])
+            print(f"  {point['tier']:10s} rounds={point.get('rounds', '-')!s:>4s} "
+                  f"error={error:.4f} {point['predict_us_per_row']:7.1f} us/row {point['batch_us_per_row']:6.2f} us/row batched")
+
+
+def load(client_payloads, threads, seconds):
+    """(requests/s, p50 ms, p95 ms, {tier: share}) for `threads` clients over `seconds`."""
+    client = app.app.test_client()
+    latencies, tiers = [], {}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def run(k):
+        rng = random.Random(k)
+        local, counts = [], {}
+        while time.monotonic() < stop:
+            t = time.perf_counter()
+            r = client.post("/get_recommendation", json=rng.choice(client_payloads))
+            local.append(time.perf_counter() - t)
+            tier = r.headers.get(app.MODEL_TIER_HEADER)
+            counts[tier] = counts.get(tier, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for tier, n in counts.items():
+                tiers[tier] = tiers.get(tier, 0) + n
+
+    workers = [threading.Thread(target=run, args=(k,)) for k in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    latencies.sort()
+    n = len(latencies)
+    return (n / seconds, latencies[n // 2] * 1e3, latencies[int(n * 0.95)] * 1e3,
+            {t: c / n for t, c in sorted(tiers.items(), key=lambda kv: _tier_order(kv[0]))})
+
+
+def _tier_order(tier):
+    names = app.models().tier_names
+    return names.index(tier) if tier in names else len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1024, help="payloads per batch / accuracy sample")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs, best kept")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent clients in the load test")
+    parser.add_argument("--seconds", type=float, default=3.0, help="load test duration per run")
+    parser.add_argument("--slo-ms", type=float, default=None,
+                        help="SLO for the shedding run (default: 60%% of the unshed p50)")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    m = app.models()
+    if len(m.tier_names) == 1:
+        sys.exit("the model bundle carries no variants (python cropsense.py export-bundle)")
+    rng = random.Random(args.seed)
+    vocab = Vocabulary.from_app(app)
+    payloads = [vocab.payload(rng) for _ in range(args.rows)]
+    app.warm_up()
+
+    tier_table(m, payloads, args.repeat)
+
+    print(f"\n{args.threads} clients, {args.seconds:.0f}s per run")
+    print(f"{'shedding':16s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s}   tiers")
+    app.TIER_CONTROL = TierController(slo_ms=0)
+    rate, p50, p95, tiers = load(payloads, args.threads, args.seconds)
+    print(f"{'off':16s} {rate:8.0f} {p50:8.2f} {p95:8.2f}   "
+          + " ".join(f"{t}={s:.0%}" for t, s in tiers.items()))
+
+    slo = args.slo_ms or round(p50 * 0.6, 2)
+    app.TIER_CONTROL = TierController(slo_ms=slo, step_seconds=0.2)
+    rate, p50, p95, tiers = load(payloads, args.threads, args.seconds)
+    print(f"{f'slo {slo} ms':16s} {rate:8.0f} {p50:8.2f} {p95:8.2f}   "
+          + " ".join(f"{t}={s:.0%}" for t, s in tiers.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Synthetic /get_recommendation payloads for the benchmark scripts."""
+
+CROPS = ["rice", "wheat", "maize", "cotton", "onion", "mustard", "ragi", "jowar"]
+STAGES = ["Germination", "Vegetative", "Flowering", "Fruiting", "Maturity"]
+
+
+def synthetic_payload(rng):
+    return {
+        "crop": rng.choice(CROPS),
+        "previousCrop": rng.choice(CROPS),
+        "soilType": rng.choice(["alluvial", "black soil", "red soil"]),
+        "soilTexture": rng.choice(["clay", "loam", "sandy"]),
+        "growthStage": rng.choice(STAGES),
+        "irrigationType": rng.choice(["borewell", "canal", "drip", "rainfed", "sprinkler"]),
+        "irrigationStatus": rng.choice(["dry", "normal", "toowet"]),
+        "irrigationCount": rng.randint(0, 12),
+        "leafColor": rng.choice(["dark_green", "green", "yellowish"]),
+        "pests": rng.choice(["No", "low", "moderate", "high", "severe"]),
+        "leafYellowPercent": rng.randint(0, 60),
+        "rainfall": rng.randint(0, 120),
+        "temperature": rng.randint(15, 42),
+        "humidity": rng.randint(20, 95),
+        "plantHeight": rng.randint(5, 200),
+    }
+
+
+# ---------------------------------------------------------------
+# Generators built from the fitted models' own vocabularies
+# ---------------------------------------------------------------
+
+# model column -> /get_recommendation field (see app.map_frontend_to_model)
+FRONTEND_FIELDS = {
+    "Crop_Name": "crop",
+    "Previous_Crop": "previousCrop",
+    "Soil_Type": "soilType",
+    "Soil_Texture_Class": "soilTexture",
+    "Growth_Stage": "growthStage",
+    "Irrigation_Type": "irrigationType",
+    "Current_Soil_State": "irrigationStatus",
+    "Leaf_Colour": "leafColor",
+    "Pest_Incidence": "pests",
+    "No_Of_Irrigations_Since_Sowing": "irrigationCount",
+    "Irrigation_Last_7_Days": "irrigationLast7",
+    "Leaf_Yellowing_Percent": "leafYellowPercent",
+    "Rainfall_Last_7Days": "rainfall",
+    "Temperature_Avg": "temperature",
+    "Humidity_Percent": "humidity",
+    "Sunlight_Hours_Per_Day": "sunlight_hours",
+    "Plant_Height_Cm": "plantHeight",
+}
+
+
+class Vocabulary:
+    """
+    Categorical vocabularies (CATEGORICAL_FEATURES) and numeric mean/scale
+    (NUMERICAL_FEATURES) as fitted into a model's preprocessing, read from
+    inference.pipeline_spec() data so the generated values are ones the
+    models have actually seen.
+    """
+
+    def __init__(self, spec):
+        self.categories = {}
+        self.numeric = {}
+        for block in spec["blocks"]:
+            if block["kind"] == "cat":
+                self.categories.update(zip(block["columns"], block["categories"]))
+            elif block["kind"] == "num":
+                self.numeric.update(zip(block["columns"], zip(block["mean"], block["scale"])))
+
+    @classmethod
+    def from_app(cls, app):
+        """From the SQI model the app serves (bundle or pickle)."""
+        m = app.models()
+        if m.sqi_compiled is not None:
+            return cls(m.sqi_compiled.spec)
+        from utils.inference import pipeline_spec
+
+        return cls(pipeline_spec(m.sqi_pipeline))
+
+    def model_input(self, rng):
+        """One row in the models' column space (what map_frontend_to_model returns)."""
+        row = {col: rng.choice(values) for col, values in self.categories.items()}
+        for col, (mean, scale) in self.numeric.items():
+            row[col] = max(0.0, round(rng.gauss(mean, scale), 3))
+        return row
+
+    def payload(self, rng):
+        """One /get_recommendation body using the frontend field names."""
+        row = self.model_input(rng)
+        return {field: int(row[col]) if col in self.numeric else row[col]
+                for col, field in FRONTEND_FIELDS.items() if col in row}
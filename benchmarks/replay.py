@@ -0,0 +1,134 @@
+"""
+Replays captured (or synthetic) /get_recommendation payloads against a
+running CropSense server and reports latency percentiles, throughput and
+error rate.
+
+Capture traffic by starting the server with CROPSENSE_CAPTURE_DIR set
+(see utils/capture.py), then:
+
+    python benchmarks/replay.py /var/lib/cropsense/capture --concurrency 32
+    python benchmarks/replay.py requests-*.jsonl --rate 200 --requests 20000
+    python benchmarks/replay.py --synthetic 5000 --rate 100
+
+--concurrency N  closed loop: N clients send back to back (max throughput).
+--rate R         open loop: requests start on a fixed schedule of R/s no
+                 matter how slowly the server answers; latency is counted
+                 from the scheduled start, so queueing behind a saturated
+                 server shows up in p95/p99 instead of slowing the sender.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from itertools import cycle, islice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import Client, print_summary, run, summarize  # noqa: E402
+from payloads import synthetic_payload  # noqa: E402
+from utils.capture import read_captured  # noqa: E402
+
+
+def run_at_rate(url, payloads, rate, max_inflight, path="/get_recommendation"):
+    """
+    Starts request i at start + i / rate using up to `max_inflight`
+    connections; returns summarize() plus the achieved start rate and how
+    many requests started late because every connection was busy.
+    """
+    bodies = [json.dumps(p).encode("utf-8") for p in payloads]
+    lock = threading.Lock()
+    cursor = [0]
+    latencies, errors, late = [], [0], [0]
+    start = time.perf_counter() + 0.1
+
+    def worker():
+        client = Client(url)
+        mine = []
+        while True:
+            with lock:
+                i = cursor[0]
+                cursor[0] += 1
+            if i >= len(bodies):
+                break
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.001:
+                with lock:
+                    late[0] += 1
+            try:
+                ok = client.post(path, bodies[i]) == 200
+            except Exception:
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - scheduled)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(max_inflight)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = summarize(latencies, errors[0], elapsed)
+    stats["target_rps"] = rate
+    stats["late_starts"] = late[0]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("captures", nargs="*", help="capture files or directories (requests-*.jsonl*)")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="use N synthetic payloads instead of captures")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, help="total requests (payloads are cycled; default: one pass)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=16, help="closed-loop clients (default 16)")
+    mode.add_argument("--rate", type=float, help="open-loop requests per second")
+    parser.add_argument("--max-inflight", type=int, default=64,
+                        help="connections available to --rate (default 64)")
+    parser.add_argument("--shuffle", action="store_true", help="shuffle instead of the recorded order")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.synthetic:
+        payloads = [synthetic_payload(rng) for _ in range(args.synthetic)]
+    elif args.captures:
+        payloads = read_captured(args.captures)
+    else:
+        parser.error("give capture files/directories or --synthetic N")
+    if not payloads:
+        sys.exit("no payloads found")
+    if args.shuffle:
+        rng.shuffle(payloads)
+    if args.requests:
+        payloads = list(islice(cycle(payloads), args.requests))
+
+    if args.rate:
+        stats = run_at_rate(args.url, payloads, args.rate, args.max_inflight)
+    else:
+        stats = run(args.url, payloads, args.concurrency)
+
+    if args.json:
+        print(json.dumps(stats))
+        return
+    print_summary(stats)
+    if args.rate:
+        print(f"schedule   target {stats['target_rps']:.1f} req/s, "
+              f"{stats['late_starts']} requests started late (all connections busy)")
+
+
+if __name__ == "__main__":
+    main()
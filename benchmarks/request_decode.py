@@ -0,0 +1,113 @@
+"""
+Payload -> model input: the per-field get_payload_value mapping (before)
+vs the compiled REQUEST_SCHEMA decoder (now), one payload at a time and
+for a batch up to the encoded matrix.
+
+    python benchmarks/request_decode.py
+    python benchmarks/request_decode.py --rows 4096 --repeat 20
+
+"single" is one payload -> model input. "batch" is `rows` payloads ->
+float32 matrix: before, a dict per row and CompiledPipeline.encode_many;
+now, decode_many into a column buffer and encode_columns. "bytes/record"
+is the memory one decoded model input holds on to (tracemalloc).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+from payloads import Vocabulary  # noqa: E402
+
+MISSING = (None, "", "undefined")
+
+
+def get_payload_value(payload, *keys, default=None, cast=None):
+    for k in keys:
+        if k in payload and payload[k] not in MISSING:
+            v = payload[k]
+            return cast(v) if cast else v
+    return default
+
+
+def legacy_map(payload):
+    """The old map_frontend_to_model: one get_payload_value call per field, then the soil defaults."""
+    model = {}
+    for f in app.REQUEST_FIELDS:
+        if f.key is None:
+            continue
+        model[f.column] = get_payload_value(payload, f.key, default=f.default,
+                                            cast=int if f.type is int else None)
+        if f.column == "Growth_Stage":
+            model["Days_After_Sowing"] = app.convert_stage_to_days(model[f.column])
+    for k, v in app.DEFAULT_SOIL_DATA.items():
+        model.setdefault(k, v)
+    return model
+
+
+def per_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def retained_bytes(build, n=2000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1024, help="payloads per batch")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs, best kept")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = app.models().sqi_compiled
+    if encoder is None:
+        sys.exit("the SQI model could not be compiled")
+    rng = random.Random(args.seed)
+    vocab = Vocabulary.from_app(app)
+    payloads = [vocab.payload(rng) for _ in range(args.rows)]
+    assert all(legacy_map(p) == dict(app.map_frontend_to_model(p)) for p in payloads)
+
+    single_before = per_call(lambda: [legacy_map(p) for p in payloads], args.repeat) / args.rows
+    single_now = per_call(lambda: [app.map_frontend_to_model(p) for p in payloads], args.repeat) / args.rows
+
+    def batch_before():
+        return encoder.encode_many([legacy_map(p) for p in payloads])
+
+    def batch_now():
+        batch, _ = app.REQUEST_SCHEMA.decode_many(payloads)
+        return encoder.encode_columns(batch.columns, len(batch))
+
+    assert np.array_equal(batch_before(), batch_now())
+    many_before = per_call(batch_before, args.repeat)
+    many_now = per_call(batch_now, args.repeat)
+
+    bytes_before = retained_bytes(lambda i: legacy_map(payloads[i % len(payloads)]))
+    bytes_now = retained_bytes(lambda i: app.map_frontend_to_model(payloads[i % len(payloads)]))
+
+    print(f"{'':22s} {'before':>10s} {'now':>10s}")
+    print(f"{'single us/payload':22s} {single_before * 1e6:10.2f} {single_now * 1e6:10.2f}")
+    print(f"{f'batch[{args.rows}] ms':22s} {many_before * 1e3:10.2f} {many_now * 1e3:10.2f}")
+    print(f"{'bytes/record':22s} {bytes_before:10.0f} {bytes_now:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
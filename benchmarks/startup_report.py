@@ -0,0 +1,145 @@
+"""
+Startup report: per-module import time (python -X importtime) for
+`import app`, plus time to first response for a static page and for the
+first prediction, each in a fresh interpreter.
+
+    python benchmarks/startup_report.py
+    python benchmarks/startup_report.py --check            # compare with the baseline
+    python benchmarks/startup_report.py --write-baseline   # after an intended change
+
+--check exits 1 when a timing is more than --tolerance slower than the
+baseline, or when `import app` pulls in one of the heavy ML modules that
+are meant to load lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "startup.json")
+
+# must not be imported by `import app` (they load with the models)
+LAZY_MODULES = ("pandas", "numpy", "joblib", "sklearn", "xgboost")
+
+# runs in the child; prints one JSON line
+FIRST_RESPONSE = r"""
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+sys.path.insert(0, ROOT)
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+heavy = [m for m in LAZY_MODULES if m in sys.modules]
+client = app.app.test_client()
+if KIND == "static":
+    status = client.get("/").status_code
+else:
+    status = client.post("/get_recommendation", json={"crop": "rice", "growthStage": "Flowering"}).status_code
+done = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "first_response_s": done - start,
+                  "status": status, "heavy_modules": heavy}))
+"""
+
+
+def _child(code, env=None):
+    return subprocess.run(
+        [sys.executable, *code], capture_output=True, text=True, cwd=ROOT,
+        env=dict(os.environ, **(env or {})),
+    )
+
+
+def import_times():
+    """{module: (self_us, cumulative_us)} for `import app`."""
+    out = _child(["-X", "importtime", "-c", "import app"])
+    modules = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def first_response(kind):
+    code = f"ROOT = {ROOT!r}\nKIND = {kind!r}\nLAZY_MODULES = {LAZY_MODULES!r}\n" + FIRST_RESPONSE
+    out = _child(["-c", code])
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat):
+    static = min((first_response("static") for _ in range(repeat)), key=lambda r: r["first_response_s"])
+    predict = min((first_response("predict") for _ in range(repeat)), key=lambda r: r["first_response_s"])
+    modules = import_times()
+    return {
+        "import_app_s": static["import_s"],
+        "first_static_response_s": static["first_response_s"],
+        "first_prediction_response_s": predict["first_response_s"],
+        "heavy_modules_at_import": static["heavy_modules"],
+        "import_app_importtime_s": modules.get("app", (0, 0))[1] / 1e6,
+        "modules": modules,
+    }
+
+
+def report(result, top):
+    modules = result["modules"]
+    print(f"import app            {result['import_app_s'] * 1e3:8.1f} ms")
+    print(f"first static response {result['first_static_response_s'] * 1e3:8.1f} ms  (GET /, incl. import)")
+    print(f"first prediction      {result['first_prediction_response_s'] * 1e3:8.1f} ms  (POST /get_recommendation, incl. import)")
+    print(f"heavy modules at import: {', '.join(result['heavy_modules_at_import']) or 'none'}")
+    print(f"\ntop {top} modules by cumulative import time (us):")
+    for name, (self_us, cum_us) in sorted(modules.items(), key=lambda kv: -kv[1][1])[:top]:
+        print(f"  {cum_us:9d}  {self_us:8d}  {name}")
+
+
+def check(result, baseline, tolerance):
+    failures = []
+    if result["heavy_modules_at_import"]:
+        failures.append(f"`import app` imports {', '.join(result['heavy_modules_at_import'])}")
+    for key in ("import_app_s", "first_static_response_s", "first_prediction_response_s"):
+        base = baseline.get(key)
+        if base and result[key] > base * (1 + tolerance):
+            failures.append(f"{key}: {result[key] * 1e3:.1f}ms vs baseline {base * 1e3:.1f}ms "
+                            f"(+{(result[key] / base - 1):.0%}, tolerance {tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per timing (best is kept)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--write-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = parser.parse_args()
+
+    result = measure(args.repeat)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        report(result, args.top)
+
+    if args.write_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({k: v for k, v in result.items() if k != "modules"}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written to {os.path.relpath(args.baseline, ROOT)}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            failures = check(result, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+        print("\nstartup within baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Bytes a browser downloads per page with and without the static/dist build
+(`python cropsense.py build-assets`), and what a repeat visit costs.
+
+    python benchmarks/static_assets.py
+    python benchmarks/static_assets.py --viewport 1366 --dpr 1 --no-avif
+
+Every page is rendered through the Flask test client. Each stylesheet,
+script and image it references is fetched the way the browser profile
+would: with the build, the <picture> source it supports and the srcset
+candidate `sizes` picks for the viewport, with Accept-Encoding "br, gzip";
+without it, the raw /static file. All images count, including lazy ones
+further down the page. "repeat" is what a second visit sends: nothing for
+immutable files, a conditional request per no-cache /static file.
+"""
+import argparse
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cropsense  # noqa: E402
+
+PAGES = ("/", "/about", "/contact", "/recommendations")
+
+
+class _Refs(HTMLParser):
+    """Asset references of one page, as the browser would choose them."""
+
+    def __init__(self, viewport, dpr, types):
+        super().__init__()
+        self.viewport, self.dpr, self.types = viewport, dpr, types
+        self.urls = []
+        self.source = None          # chosen <source> candidate inside the current <picture>
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "link" and a.get("href", "").startswith("/static/"):
+            self.urls.append(a["href"])
+        elif tag == "script" and a.get("src", "").startswith("/static/"):
+            self.urls.append(a["src"])
+            self.urls.extend(v for k, v in attrs if k.startswith("data-") and (v or "").startswith("/static/"))
+        elif tag == "picture":
+            self.source = None
+        elif tag == "source" and self.source is None and a.get("type") in self.types and a.get("srcset"):
+            self.source = self.pick(a["srcset"], a.get("sizes", "100vw"))
+        elif tag == "img" and a.get("src", "").startswith("/static/"):
+            if self.source is not None:
+                self.urls.append(self.source)
+            else:
+                self.urls.append(self.pick(a["srcset"], a.get("sizes", "100vw")) if a.get("srcset") else a["src"])
+
+    def handle_endtag(self, tag):
+        if tag == "picture":
+            self.source = None
+
+    def slot(self, sizes):
+        for entry in sizes.split(","):
+            entry = entry.strip()
+            m = re.match(r"\(min-width:\s*(\d+)px\)\s*(.+)", entry)
+            if m and self.viewport < int(m.group(1)):
+                continue
+            length = m.group(2) if m else entry
+            if length.endswith("vw"):
+                return self.viewport * float(length[:-2]) / 100
+            return float(length.rstrip("px"))
+        return self.viewport
+
+    def pick(self, srcset, sizes):
+        need = self.slot(sizes) * self.dpr
+        candidates = sorted((int(w.rstrip("w")), url) for url, w in (c.strip().rsplit(" ", 1) for c in srcset.split(",")))
+        return next((url for w, url in candidates if w >= need), candidates[-1][1])
+
+
+def measure(client, viewport, dpr, types):
+    """{page: (files, bytes, repeat requests)} for the current asset configuration."""
+    out = {}
+    for page in PAGES:
+        refs = _Refs(viewport, dpr, types)
+        refs.feed(client.get(page).get_data(as_text=True))
+        files = size = repeat = 0
+        for url in dict.fromkeys(refs.urls):
+            r = client.get(url, headers={"Accept-Encoding": "br, gzip"})
+            if r.status_code != 200:
+                continue          # templates reference a few files that were never committed
+            files += 1
+            size += len(r.data)
+            repeat += "immutable" not in r.headers.get("Cache-Control", "")
+        out[page] = (files, size, repeat)
+    return out
+
+
+def use_build(asset_dir):
+    cropsense.ASSET_DIR = asset_dir
+    cropsense._ASSETS.clear()
+    cropsense._ASSET_URLS.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--viewport", type=int, default=360, help="CSS pixels (default 360, a phone)")
+    parser.add_argument("--dpr", type=float, default=2, help="device pixel ratio (default 2)")
+    parser.add_argument("--no-avif", action="store_true", help="browser without AVIF support")
+    parser.add_argument("--no-webp", action="store_true", help="browser without WebP (or AVIF) support")
+    args = parser.parse_args()
+
+    types = set() if args.no_webp else {"image/webp"} if args.no_avif else {"image/avif", "image/webp"}
+    client = cropsense.app.test_client()
+    built_dir = cropsense.ASSET_DIR
+    if not built_dir or cropsense.assets() is None:
+        sys.exit("no static/dist build; run `python cropsense.py build-assets` first")
+
+    use_build("")
+    raw = measure(client, args.viewport, args.dpr, types)
+    use_build(built_dir)
+    built = measure(client, args.viewport, args.dpr, types)
+
+    print(f"viewport {args.viewport}px @{args.dpr:g}x, images: {', '.join(sorted(types)) or 'jpeg/png only'}")
+    print(f"{'page':16s} {'files':>5s} {'raw KB':>9s} {'built KB':>9s} {'saved':>6s}   repeat visit requests")
+    total_raw = total_built = 0
+    for page in PAGES:
+        (n, raw_bytes, raw_repeat), (_, built_bytes, built_repeat) = raw[page], built[page]
+        total_raw += raw_bytes
+        total_built += built_bytes
+        print(f"{page:16s} {n:5d} {raw_bytes / 1024:9.0f} {built_bytes / 1024:9.0f} "
+              f"{1 - built_bytes / max(raw_bytes, 1):6.1%}   {raw_repeat} -> {built_repeat}")
+    print(f"{'all pages':16s} {'':5s} {total_raw / 1024:9.0f} {total_built / 1024:9.0f} "
+          f"{1 - total_built / max(total_raw, 1):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
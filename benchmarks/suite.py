@@ -0,0 +1,299 @@
+"""
+Benchmark suite for the request path, one case per stage:
+
+    map              app.map_frontend_to_model, one payload
+    predict[1]       app.run_predictions, one payload
+    predict[64]      app.run_batch_predictions, 64 payloads
+    predict[4096]    app.run_batch_predictions, 4096 payloads
+    treatment        treatment_engine.generate_treatment_recommendations, one row
+    treatment[form]  app.TREATMENT_PLANS.plan, one row with the default soil values
+    request          POST /get_recommendation through the Flask test client
+
+plus `reference`, a fixed pure-Python workload that touches no CropSense
+code. It is timed in the same rounds, and --check divides its drift out
+of every ratio, so a machine that is busier (or slower) than when the
+baseline was recorded doesn't read as a regression.
+
+Payloads come from payloads.Vocabulary (the fitted models' categories and
+numeric ranges) with a fixed seed. Each case is calibrated to run for
+about --min-time per repeat; the median of --repeat rounds is reported
+and the fastest round is what --check compares (noise only ever adds
+time).
+The response cache is off (CROPSENSE_CACHE_BACKEND=off) unless the
+environment says otherwise, so the models are measured and not the cache.
+
+    python benchmarks/suite.py                          # run everything
+    python benchmarks/suite.py -k predict --out run.json
+    python benchmarks/suite.py --check                  # fail on >30% slower than the baseline
+    python benchmarks/suite.py --write-baseline         # after an intended change
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from itertools import cycle
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "suite.json")
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CROPSENSE_CACHE_BACKEND", "off")
+
+import app  # noqa: E402
+from payloads import Vocabulary  # noqa: E402
+from utils.treatment_engine import generate_treatment_recommendations  # noqa: E402
+
+POOL_SIZE = 256
+
+
+# ============================================================
+# CASES
+# ============================================================
+# Each case takes (vocabulary, rng) and returns (fn, rows): fn() is the
+# timed call, rows how many records one call processes.
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@case("map")
+def _map(vocab, rng):
+    payloads = cycle([vocab.payload(rng) for _ in range(POOL_SIZE)])
+    return (lambda: app.map_frontend_to_model(next(payloads))), 1
+
+
+def _predict(size):
+    def setup(vocab, rng):
+        if size == 1:
+            payloads = cycle([vocab.payload(rng) for _ in range(POOL_SIZE)])
+            return (lambda: app.run_predictions(next(payloads))), 1
+        batch = [vocab.payload(rng) for _ in range(size)]
+        return (lambda: app.run_batch_predictions(batch)), size
+    return setup
+
+
+for _size in (1, 64, 4096):
+    case(f"predict[{_size}]")(_predict(_size))
+
+
+@case("treatment")
+def _treatment(vocab, rng):
+    rows = []
+    for _ in range(POOL_SIZE):
+        row = vocab.model_input(rng)
+        row["SQI"] = round(rng.uniform(1, 5), 2)
+        row["PHI"] = round(rng.uniform(2, 10), 2)
+        rows.append(row)
+    rows = cycle(rows)
+    return (lambda: generate_treatment_recommendations(next(rows))), 1
+
+
+@case("treatment[form]")
+def _treatment_form(vocab, rng):
+    rows = []
+    for _ in range(POOL_SIZE):
+        row = dict(app.DEFAULT_SOIL_DATA, **{k: v for k, v in vocab.model_input(rng).items()
+                                              if k in ("Crop_Name", "Growth_Stage")})
+        row["SQI"] = round(rng.uniform(1, 5), 2)
+        row["PHI"] = round(rng.uniform(2, 10), 2)
+        rows.append(row)
+    rows = cycle(rows)
+    app.models()
+    return (lambda: app.TREATMENT_PLANS.plan(next(rows))), 1
+
+
+@case("request")
+def _request(vocab, rng):
+    client = app.app.test_client()
+    payloads = cycle([vocab.payload(rng) for _ in range(POOL_SIZE)])
+
+    def call():
+        response = client.post("/get_recommendation", json=next(payloads))
+        if response.status_code != 200:
+            raise RuntimeError(f"/get_recommendation returned {response.status_code}")
+        return response.data
+    return call, 1
+
+
+@case("reference")
+def _reference(vocab, rng):
+    words = [f"{rng.random():.6f}" for _ in range(512)]
+
+    def call():
+        counts = {}
+        for w in words:
+            counts[w[:4]] = counts.get(w[:4], 0) + len(w)
+        return sorted(counts.items())
+    return call, len(words)
+
+
+# ============================================================
+# RUNNER
+# ============================================================
+
+def _calibrate(fn, min_time):
+    """Calls per repeat so one repeat takes at least min_time."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return number
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+
+
+def run_cases(names, vocab, seed, repeat, min_time):
+    """
+    Times every case `repeat` times, interleaved round by round so that a
+    slow spell on a shared machine hits all cases alike instead of all
+    repeats of one case.
+    """
+    setups = {}
+    for name in names:
+        fn, rows = CASES[name](vocab, random.Random(seed))
+        fn()                               # warm-up: first-call caches, lazy loads
+        setups[name] = (fn, rows, _calibrate(fn, min_time))
+
+    times = {name: [] for name in names}
+    for _ in range(repeat):
+        for name, (fn, _, number) in setups.items():
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times[name].append((time.perf_counter() - start) / number)
+
+    results = {}
+    for name, (_, rows, number) in setups.items():
+        median = statistics.median(times[name])
+        results[name] = {
+            "seconds_per_call": median,
+            "min_seconds_per_call": min(times[name]),
+            "stdev_seconds_per_call": statistics.stdev(times[name]) if repeat > 1 else 0.0,
+            "rows_per_call": rows,
+            "rows_per_s": rows / median,
+            "number": number,
+            "repeat": repeat,
+        }
+    return results
+
+
+def environment():
+    import numpy
+    import pandas
+    import xgboost
+
+    bundle = app.models().bundle
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "xgboost": xgboost.__version__,
+        "model_version": bundle.version if bundle is not None else None,
+        "cache_backend": os.environ.get("CROPSENSE_CACHE_BACKEND"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Lines describing each case against the baseline; (lines, regressions).
+    Ratios are of the fastest rounds, divided by the reference case's.
+    """
+    base_results = baseline.get("results", {})
+    drift = 1.0
+    if "reference" in results and "reference" in base_results:
+        drift = results["reference"]["min_seconds_per_call"] / base_results["reference"]["min_seconds_per_call"]
+
+    lines, regressions = [f"  {'machine':16s} {drift:6.2f}x baseline speed (reference case)"], []
+    for name, result in results.items():
+        base = base_results.get(name)
+        if name == "reference":
+            continue
+        if base is None:
+            lines.append(f"  {name:16s} (not in baseline)")
+            continue
+        raw = result["min_seconds_per_call"] / base["min_seconds_per_call"]
+        ratio = raw / drift
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        lines.append(f"  {name:16s} {ratio:6.2f}x baseline time (raw {raw:.2f}x){flag}")
+    return lines, regressions
+
+
+def _format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", dest="select", action="append",
+                        help="only cases whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat (default 0.2)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.30,
+                        help="allowed slowdown before --check fails (default 0.30 = 30%%)")
+    parser.add_argument("--check", action="store_true", help="compare with --baseline, exit 1 on a regression")
+    parser.add_argument("--write-baseline", action="store_true")
+    args = parser.parse_args()
+
+    names = [n for n in CASES if n != "reference" and (not args.select or any(s in n for s in args.select))]
+    if not names:
+        sys.exit(f"no case matches {args.select}; cases: {', '.join(CASES)}")
+    names.append("reference")
+
+    vocab = Vocabulary.from_app(app)
+    results = run_cases(names, vocab, args.seed, args.repeat, args.min_time)
+    for name, r in results.items():
+        print(f"{name:16s} {_format_time(r['seconds_per_call'])}/call  "
+              f"{r['rows_per_s']:10.0f} rows/s  (+-{r['stdev_seconds_per_call'] / r['seconds_per_call']:.1%}, "
+              f"{r['number']} x {r['repeat']})")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment(),
+        "results": results,
+    }
+    for path in filter(None, (args.out, args.baseline if args.write_baseline else None)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"results written to {os.path.relpath(path)}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.tolerance)
+        print(f"\nagainst {os.path.relpath(args.baseline)} (tolerance {args.tolerance:.0%}):")
+        print("\n".join(lines))
+        if baseline.get("environment", {}).get("cpu_count") != report["environment"]["cpu_count"]:
+            print("note: the baseline was recorded on a machine with a different CPU count")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
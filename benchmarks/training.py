@@ -0,0 +1,140 @@
+"""
+In-memory (utils/train_models.py) vs out-of-core (cropsense train)
+training: wall time, peak memory and validation error. Each run is a
+fresh process; peak memory is its maximum RSS.
+
+    python benchmarks/training.py --make-data /tmp/labelled.csv --rows 1000000
+    python benchmarks/training.py --data /tmp/labelled.csv
+    python benchmarks/training.py --data /tmp/history.csv --delta /tmp/new_rows.csv --skip-legacy
+
+--make-data writes a synthetic labelled survey in the training schema
+(categories and numeric ranges from models/bundle, SQI/PHI as noisy
+functions of the soil, weather and leaf columns). --delta also times
+`cropsense refresh` of the freshly trained bundle on a file of new rows,
+which should scale with the delta rather than the history.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# runs in the child: the unchanged in-memory trainer, then its validation error
+LEGACY = r"""
+import json, os, resource, sys, time, warnings
+warnings.filterwarnings("ignore")
+sys.path.insert(0, ROOT)
+import numpy as np, pandas as pd
+from sklearn.model_selection import train_test_split
+from utils.train_models import train_and_save_model
+start = time.perf_counter()
+model = train_and_save_model(DATA, TARGET)
+wall = time.perf_counter() - start
+df = pd.read_csv(DATA)
+_, X_valid, _, y_valid = train_test_split(df, df[TARGET], test_size=0.2, random_state=42)
+err = model.predict(X_valid) - y_valid.to_numpy()
+print(json.dumps({"wall_seconds": wall, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "rmse": float(np.sqrt(np.mean(err ** 2)))}))
+"""
+
+
+def make_data(path, rows, seed, chunk_rows=100000):
+    import numpy as np
+    import pandas as pd
+
+    from payloads import Vocabulary
+    from utils.model_bundle import read_manifest
+
+    spec = read_manifest(os.path.join(ROOT, "models", "bundle"))["models"]["SQI"]["preprocessor"]
+    vocab = Vocabulary(spec)
+    rng = np.random.default_rng(seed)
+    stress = {"No": 0.0, "low": 0.5, "moderate": 1.0, "high": 1.5, "severe": 2.0}
+    written = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        df = pd.DataFrame({c: rng.choice(np.asarray(v, dtype=object), n) for c, v in vocab.categories.items()})
+        z = {}
+        for c, (mean, scale) in vocab.numeric.items():
+            z[c] = rng.normal(size=n)
+            df[c] = np.round(np.maximum(0, mean + scale * z[c]), 3)
+        soil = z["Available_N_Kg_Ha"] + 0.5 * z["Organic_Carbon_Percent"] - 0.7 * np.abs(z["Soil_Ph"])
+        df["SQI"] = np.round(np.clip(3 + 0.8 * soil + rng.normal(0, 0.3, n), 1, 5), 3)
+        leaf = z["Leaf_Yellowing_Percent"] + df["Pest_Incidence"].map(stress).fillna(0).to_numpy()
+        df["PHI"] = np.round(np.clip(6 + 0.5 * df["SQI"] - 1.2 * leaf + 0.3 * z["Rainfall_Last_7Days"]
+                                     + rng.normal(0, 0.5, n), 1, 10), 3)
+        df.to_csv(path, mode="a" if written else "w", header=not written, index=False)
+        written += n
+    print(f"wrote {rows:,} rows to {path} ({os.path.getsize(path) / 2**20:.0f} MB)")
+
+
+def run_legacy(data, target):
+    with tempfile.TemporaryDirectory() as cwd:     # train_and_save_model writes its pickle into the cwd
+        code = f"ROOT = {ROOT!r}\nDATA = {os.path.abspath(data)!r}\nTARGET = {target!r}\n" + LEGACY
+        out = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_streaming(data, extra, out_dir):
+    cmd = [sys.executable, os.path.join(ROOT, "cropsense.py"), "train", data, "--out", out_dir, "--quiet", *extra]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_refresh(delta, base_dir, out_dir):
+    cmd = [sys.executable, os.path.join(ROOT, "cropsense.py"), "refresh", delta,
+           "--base", base_dir, "--out", out_dir, "--quiet"]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", help="labelled CSV/Parquet in the training schema")
+    parser.add_argument("--make-data", metavar="PATH", help="write a synthetic labelled CSV and exit")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--delta", help="labelled new rows: also time `cropsense refresh` on them")
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the out-of-core trainer")
+    parser.add_argument("train_args", nargs=argparse.REMAINDER, help="extra `cropsense train` arguments after --")
+    args = parser.parse_args()
+
+    if args.make_data:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        make_data(args.make_data, args.rows, args.seed)
+        return
+    if not args.data:
+        parser.error("--data or --make-data is required")
+
+    if not args.skip_legacy:
+        for target in ("SQI", "PHI"):
+            r = run_legacy(args.data, target)
+            print(f"in-memory   {target}  wall {r['wall_seconds']:7.1f}s  peak rss {r['peak_rss_mb']:7.0f} MB  "
+                  f"valid rmse {r['rmse']:.4f}")
+
+    extra = [a for a in args.train_args if a != "--"]
+    with tempfile.TemporaryDirectory() as out_dir:
+        summary = run_streaming(args.data, extra, os.path.join(out_dir, "bundle"))
+        for target, r in summary["models"].items():
+            v = r["validation"] or {}
+            print(f"out-of-core {target}  wall {r['wall_seconds']:7.1f}s  peak rss {r['peak_rss_mb']:7.0f} MB  "
+                  f"valid rmse {v.get('rmse', float('nan')):.4f}  r2 {v.get('r2', float('nan')):.4f}  "
+                  f"rounds {r['rounds']} (best {r['best_iteration']})")
+        print(f"out-of-core total wall {summary['wall_seconds']:.1f}s with {summary['workers']} processes x "
+              f"{summary['models'][next(iter(summary['models']))]['nthread']} threads "
+              f"(driver peak rss {summary['driver_peak_rss_mb']:.0f} MB, memory={summary['memory']})")
+
+        if args.delta:
+            refresh = run_refresh(args.delta, os.path.join(out_dir, "bundle"), os.path.join(out_dir, "refreshed"))
+            for target, r in refresh["models"].items():
+                v = r["validation"] or {}
+                print(f"refresh     {target}  wall {r['wall_seconds']:7.1f}s  +{r['added_rounds']} rounds  "
+                      f"valid rmse {v['previous']['rmse']:.4f} -> {v['rmse']:.4f}")
+            print(f"refresh total wall {refresh['wall_seconds']:.1f}s on {refresh['rows']:,} new rows "
+                  f"vs {summary['wall_seconds']:.1f}s training on {summary['rows']:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Row-wise vs columnar treatment engine: exact output parity and speed.
+
+    python benchmarks/treatment_batch_parity.py --rows 100000
+
+Two frames are checked: continuous random soil tests and symptoms with
+awkward values mixed in (None, "", unknown stages, NaN, non-numeric
+strings), and a lab-style frame with repeated values where most rows
+share a result.
+A third check runs web-form rows (the app's default soil values) through
+the precomputed TreatmentPlanTable instead of the columnar engine.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from utils.reference_data import get_reference_store  # noqa: E402
+from utils.treatment_batch import generate_treatment_recommendations_batch  # noqa: E402
+from utils.treatment_engine import (  # noqa: E402
+    TreatmentPlanTable,
+    generate_treatment_recommendations,
+)
+from app import DEFAULT_SOIL_DATA  # noqa: E402
+
+
+def random_frame(n, rng):
+    crops = np.array(["rice", "Wheat", "generic", "", None, "onion"], dtype=object)
+    stages = np.array(["Flowering", "vegetative", "maturity", "weird", None, ""], dtype=object)
+    df = pd.DataFrame({
+        "Crop_Name": rng.choice(crops, n),
+        "Growth_Stage": rng.choice(stages, n),
+        "PHI": rng.uniform(0, 11, n),
+        "Soil_Ph": rng.uniform(4.5, 9, n),
+        "Ec_Dsm": rng.uniform(0, 6, n),
+        "Organic_Carbon_Percent": rng.uniform(0.1, 1.2, n),
+        "Available_N_Kg_Ha": rng.uniform(50, 200, n),
+        "Available_P_Kg_Ha": rng.uniform(10, 90, n),
+        "Available_K_Kg_Ha": rng.uniform(50, 300, n),
+        "Available_S_Kg_Ha": rng.uniform(5, 35, n),
+        "Available_Zn_Ppm": rng.uniform(0.2, 3, n),
+        "Available_B_Ppm": rng.uniform(0.1, 1.5, n),
+        "Available_Fe_Ppm": rng.uniform(2, 12, n),
+        "Available_Mn_Ppm": rng.uniform(1, 25, n),
+        "Available_Cu_Ppm": rng.uniform(0.1, 1.5, n),
+    })
+    pests = np.array(["No", "low", "Moderate", "HIGH", "severe", "NoDamage", None, ""], dtype=object)
+    spots = np.array(["None", "Few", "many", None, "lots"], dtype=object)
+    colours = np.array(["dark_green", "green", "Yellowish", "Normal Green", None], dtype=object)
+    df["Pest_Incidence"] = rng.choice(pests, n)
+    df["Leaf_Spots"] = rng.choice(spots, n)
+    df["Leaf_Colour"] = rng.choice(colours, n)
+    df["Leaf_Yellowing_Percent"] = rng.integers(0, 70, n).astype(object)
+    df.loc[::89, "Leaf_Yellowing_Percent"] = None
+    df.loc[::83, "Leaf_Yellowing_Percent"] = "30"
+    df.loc[::79, "Leaf_Yellowing_Percent"] = "many"
+    df.loc[::97, "PHI"] = np.nan
+    df.loc[::101, "Soil_Ph"] = np.nan
+    df["Available_Zn_Ppm"] = df["Available_Zn_Ppm"].astype(object)
+    df["PHI"] = df["PHI"].astype(object)
+    if n > 10:
+        df.loc[5, "Available_Zn_Ppm"] = "abc"
+        df.loc[6, "Available_Zn_Ppm"] = "1.5"
+        df.loc[7, "Available_Zn_Ppm"] = None
+        df.loc[8, "PHI"] = None
+        df.loc[9, "PHI"] = "x"
+    return df
+
+
+def lab_frame(n, rng):
+    return pd.DataFrame({
+        "Crop_Name": rng.choice(["rice", "wheat", "onion"], n),
+        "Growth_Stage": rng.choice(["Flowering", "Vegetative", "Maturity"], n),
+        "PHI": rng.uniform(0, 10, n),
+        "Soil_Ph": rng.choice([6.5, 7.1, 5.2, 8.4], n),
+        "Ec_Dsm": 1.0,
+        "Organic_Carbon_Percent": rng.choice([0.3, 0.7], n),
+        "Available_N_Kg_Ha": rng.choice([60, 110, 150], n),
+        "Available_P_Kg_Ha": rng.choice([25, 45], n),
+        "Available_K_Kg_Ha": 40,
+        "Available_S_Kg_Ha": 18,
+        "Available_Zn_Ppm": rng.choice([0.6, 1.2], n),
+        "Available_B_Ppm": 0.5,
+        "Available_Fe_Ppm": 3.4,
+        "Available_Mn_Ppm": 2.1,
+        "Available_Cu_Ppm": 0.8,
+        "Pest_Incidence": rng.choice(["No", "high"], n),
+        "Leaf_Spots": "None",
+        "Leaf_Colour": "green",
+        "Leaf_Yellowing_Percent": rng.choice([0, 15], n),
+    })
+
+
+def default_soil_frame(n, rng):
+    df = random_frame(n, rng)[["Crop_Name", "Growth_Stage", "PHI", *get_reference_store().symptom_fields]]
+    for column, value in DEFAULT_SOIL_DATA.items():
+        df[column] = value
+    return df
+
+
+def compare(name, df, engine="batch"):
+    t = time.perf_counter()
+    expected = [generate_treatment_recommendations(r) for r in df.to_dict("records")]
+    row_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    if engine == "table":
+        table = TreatmentPlanTable(DEFAULT_SOIL_DATA)
+        got = [table.plan(r) for r in df.to_dict("records")]
+    else:
+        got = generate_treatment_recommendations_batch(df)
+    batch_s = time.perf_counter() - t
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, got)) if a != b]
+    print(f"{name:7s} rows {len(df):8d}  mismatches {len(mismatches)}  "
+          f"row-wise {row_s:6.2f}s  {engine} {batch_s:6.2f}s  ({row_s / batch_s:.1f}x)")
+    if mismatches:
+        i = mismatches[0]
+        print("  first mismatch at", i, "\n  row-wise:", expected[i], f"\n  {engine}:   ", got[i])
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    ok = compare("random", random_frame(args.rows, rng))
+    ok = compare("lab", lab_frame(args.rows, rng)) and ok
+    ok = compare("default", default_soil_frame(args.rows, rng), engine="table") and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
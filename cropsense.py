@@ -0,0 +1,382 @@
+"""
+CropSense command line.
+
+    python cropsense.py score survey.csv scored.jsonl --workers 4
+    python cropsense.py score survey.parquet scored.csv --resume
+    python cropsense.py export-bundle
+    python cropsense.py train labelled.csv --out models/bundle --early-stopping 20
+    python cropsense.py refresh new_rows.csv --publish
+    python cropsense.py models list
+    python cropsense.py models rollback
+    python cropsense.py build-assets
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+# ============================================================
+# score
+# ============================================================
+
+def _column_map(values):
+    """--map SURVEY_COLUMN=MODEL_COLUMN (repeatable) -> dict."""
+    mapping = {}
+    for item in values or []:
+        src, sep, dst = item.partition("=")
+        if not sep or not src or not dst:
+            raise argparse.ArgumentTypeError(f"--map expects SURVEY_COLUMN=MODEL_COLUMN, got {item!r}")
+        mapping[src] = dst
+    return mapping
+
+
+def cmd_score(args):
+    from utils.bulk_score import ScoringError, score_file
+
+    try:
+        summary = score_file(
+            args.input,
+            args.output,
+            chunk_rows=args.chunk_size,
+            workers=args.workers,
+            resume=args.resume,
+            column_map=_column_map(args.map),
+            log=None if args.quiet else sys.stderr,
+        )
+    except (ScoringError, argparse.ArgumentTypeError, OSError) as e:
+        print(f"cropsense score: {e}", file=sys.stderr)
+        return 2
+
+    print(json.dumps(summary))
+    return 0
+
+
+# ============================================================
+# export-bundle
+# ============================================================
+
+def cmd_export_bundle(args):
+    import joblib
+
+    from utils.model_bundle import export_bundle
+
+    pipelines = {name: joblib.load(os.path.join(args.models_dir, f"{name}_full_pipeline.pkl"))
+                 for name in ("SQI", "PHI")}
+    variants = None
+    if not args.no_variants:
+        from utils.inference import CompiledPipeline
+        from utils.model_variants import distill_variants
+
+        # no training data here: the variants are distilled from the pipelines
+        variants = {name: distill_variants(CompiledPipeline.from_pipeline(p)) for name, p in pipelines.items()}
+    manifest = export_bundle(pipelines, args.out or os.path.join(args.models_dir, "bundle"), variants=variants)
+    print(json.dumps({k: manifest[k] for k in ("version", "created_at", "trained_with", "tiers")}))
+    return 0
+
+
+# ============================================================
+# train
+# ============================================================
+
+def cmd_train(args):
+    from utils.model_bundle import BundleError
+    from utils.train_stream import TrainingError, train_file
+
+    out_dir = args.out or (_staging_dir() if args.publish else os.path.join(MODELS_DIR, "bundle"))
+    try:
+        summary = train_file(
+            args.data,
+            out_dir,
+            targets=tuple(args.targets),
+            chunk_rows=args.chunk_size,
+            valid_fraction=args.valid_fraction,
+            rounds=args.rounds,
+            early_stopping=args.early_stopping,
+            learning_rate=args.learning_rate,
+            max_depth=args.max_depth,
+            max_bin=args.max_bin,
+            threads=args.threads,
+            workers=args.workers,
+            memory=args.memory,
+            seed=args.seed,
+            cache_dir=args.cache_dir,
+            variants=not args.no_variants,
+            log=None if args.quiet else sys.stderr,
+        )
+        if args.publish:
+            summary["published"] = _publish(out_dir, args.registry, activate=not args.no_activate)
+    except (TrainingError, BundleError, OSError) as e:
+        print(f"cropsense train: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.publish and not args.out:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    print(json.dumps(summary))
+    return 0
+
+
+# ============================================================
+# refresh
+# ============================================================
+
+def cmd_refresh(args):
+    from utils.model_bundle import BundleError
+    from utils.model_registry import ModelRegistry
+    from utils.train_stream import TrainingError, refresh_file
+
+    if not args.out and not args.publish:
+        print("cropsense refresh: give --out DIR and/or --publish", file=sys.stderr)
+        return 2
+    registry = ModelRegistry(args.registry)
+    base = args.base or (registry.current() and registry.path(registry.current())) or os.path.join(MODELS_DIR, "bundle")
+    out_dir = args.out or _staging_dir()
+    try:
+        summary = refresh_file(
+            args.data,
+            base,
+            out_dir,
+            targets=tuple(args.targets),
+            chunk_rows=args.chunk_size,
+            valid_fraction=args.valid_fraction,
+            rounds=args.rounds,
+            early_stopping=args.early_stopping,
+            learning_rate=args.learning_rate,
+            max_depth=args.max_depth,
+            max_bin=args.max_bin,
+            threads=args.threads,
+            workers=args.workers,
+            memory=args.memory,
+            new_categories=args.new_categories,
+            holdout=args.holdout,
+            seed=args.seed,
+            cache_dir=args.cache_dir,
+            variants=not args.no_variants,
+            log=None if args.quiet else sys.stderr,
+        )
+        if args.publish:
+            summary["published"] = _publish(out_dir, args.registry, activate=not args.no_activate)
+    except (TrainingError, BundleError, OSError) as e:
+        print(f"cropsense refresh: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if not args.out:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    print(json.dumps(summary))
+    return 0
+
+
+# ============================================================
+# models (registry)
+# ============================================================
+
+def _staging_dir():
+    return tempfile.mkdtemp(prefix="cropsense-bundle-")
+
+
+def _publish(bundle_dir, registry_dir, activate=True):
+    from utils.model_registry import ModelRegistry
+
+    registry = ModelRegistry(registry_dir)
+    return {"version": registry.publish(bundle_dir, activate=activate), "current": registry.current()}
+
+
+def cmd_models(args):
+    from utils.model_bundle import BundleError
+    from utils.model_registry import ModelRegistry, RegistryError
+
+    registry = ModelRegistry(args.registry)
+    try:
+        if args.action == "publish":
+            registry.publish(args.target, activate=not args.no_activate)
+        elif args.action == "activate":
+            registry.activate(args.target)
+        elif args.action == "rollback":
+            registry.rollback()
+        elif args.action == "prune":
+            registry.prune(args.keep)
+        versions = registry.describe()
+    except (RegistryError, BundleError, OSError) as e:
+        print(f"cropsense models: {e}", file=sys.stderr)
+        return 2
+
+    print(json.dumps({"current": registry.current(), "versions": versions}))
+    return 0
+
+
+# ============================================================
+# build-assets
+# ============================================================
+
+def cmd_build_assets(args):
+    from utils.static_assets import IMAGE_WIDTHS, AssetError, build
+
+    try:
+        summary = build(
+            args.static_dir,
+            args.out,
+            widths=[int(w) for w in args.widths.split(",")] if args.widths else IMAGE_WIDTHS,
+            force=args.force,
+            log=sys.stderr if args.verbose else None,
+        )
+    except (AssetError, OSError, ValueError) as e:
+        print(f"cropsense build-assets: {e}", file=sys.stderr)
+        return 2
+
+    print(json.dumps(summary))
+    return 0
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def _training_options(parser, rounds, early_stopping):
+    parser.add_argument("--targets", nargs="+", default=["SQI", "PHI"])
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per chunk (default 100000)")
+    parser.add_argument("--valid-fraction", type=float, default=0.2, help="held-out share (default 0.2)")
+    parser.add_argument("--rounds", type=int, default=rounds, help=f"maximum boosting rounds (default {rounds})")
+    parser.add_argument("--early-stopping", type=int, default=early_stopping,
+                        help="stop after this many rounds without a better validation RMSE (0: off)")
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--max-depth", type=int, default=6)
+    parser.add_argument("--max-bin", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=None, help="total thread budget (default: CPU count)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="targets trained at once, each with threads/workers threads (default: all)")
+    parser.add_argument("--memory", choices=("quantile", "external"), default="quantile",
+                        help="quantile: binned matrix in RAM (default, faster); external: pages cached on disk")
+    parser.add_argument("--cache-dir", default=None, help="where external-memory pages go (default: $TMPDIR)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--publish", action="store_true",
+                        help="publish the new bundle into the model registry and make it current")
+    parser.add_argument("--no-activate", action="store_true", help="with --publish: don't make it current")
+    parser.add_argument("--registry", default=MODELS_DIR, help="model registry directory (default: models/)")
+    parser.add_argument("--no-variants", action="store_true",
+                        help="don't build the reduced-cost lite/small/linear variants")
+    parser.add_argument("--quiet", action="store_true")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cropsense")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser(
+        "score",
+        help="score a CSV/Parquet field survey offline",
+        description=(
+            "Reads the survey in chunks, predicts SQI/PHI, runs the treatment engine and "
+            "streams one result per row to a .csv or .jsonl output. Columns may use the "
+            "web form's names (crop, growthStage, ...) or the model's (Crop_Name, "
+            "Available_N_Kg_Ha, ...)."
+        ),
+    )
+    score.add_argument("input", help="survey file (.csv, .csv.gz, .parquet)")
+    score.add_argument("output", help="results file (.csv or .jsonl)")
+    score.add_argument("--chunk-size", type=int, default=10000, help="rows per chunk (default 10000)")
+    score.add_argument("--workers", type=int, default=None, help="scoring processes (default: CPU count)")
+    score.add_argument("--resume", action="store_true",
+                       help="continue after the last completed chunk of a previous run")
+    score.add_argument("--map", action="append", metavar="SURVEY_COLUMN=MODEL_COLUMN",
+                       help="rename a survey column before mapping (repeatable)")
+    score.add_argument("--quiet", action="store_true", help="no per-chunk progress on stderr")
+    score.set_defaults(func=cmd_score)
+
+    export = sub.add_parser(
+        "export-bundle",
+        help="convert the pickled pipelines into a portable model bundle",
+        description="Writes <models-dir>/bundle (XGBoost UBJSON boosters + JSON manifest), "
+                    "which app.py loads in place of the pickles.",
+    )
+    export.add_argument("--models-dir", default=MODELS_DIR)
+    export.add_argument("--out", default=None, help="bundle directory (default: <models-dir>/bundle)")
+    export.add_argument("--no-variants", action="store_true",
+                        help="don't distill the reduced-cost lite/small/linear variants")
+    export.set_defaults(func=cmd_export_bundle)
+
+    train = sub.add_parser(
+        "train",
+        help="train the SQI/PHI models out of core from a labelled CSV/Parquet",
+        description=(
+            "Streams the file in chunks (one pass for the preprocessing statistics, then "
+            "hist trees fed chunk by chunk through an XGBoost DataIter), trains the targets in parallel "
+            "processes, early-stops on a held-out split and writes a model bundle."
+        ),
+    )
+    train.add_argument("data", help="labelled survey (.csv, .csv.gz, .parquet) in the training schema")
+    train.add_argument("--out", default=None, help="bundle directory (default: models/bundle)")
+    _training_options(train, rounds=100, early_stopping=10)
+    train.set_defaults(func=cmd_train)
+
+    refresh = sub.add_parser(
+        "refresh",
+        help="update a model bundle with new labelled rows without retraining on the history",
+        description=(
+            "Keeps the bundle's preprocessing, continues boosting its SQI/PHI models on the new "
+            "rows only, reports drift and previous-vs-new validation metrics and writes the "
+            "result as a new bundle."
+        ),
+    )
+    refresh.add_argument("data", help="new labelled rows (.csv, .csv.gz, .parquet) in the training schema")
+    refresh.add_argument("--base", default=None,
+                         help="bundle to continue from (default: the registry's current version, else models/bundle)")
+    refresh.add_argument("--out", default=None, help="directory for the new bundle (required without --publish)")
+    refresh.add_argument("--new-categories", choices=("extend", "ignore"), default="extend",
+                         help="extend: add one-hot columns for unseen categories (default); "
+                              "ignore: encode them as all zeros like the original encoder")
+    refresh.add_argument("--holdout", default=None,
+                         help="labelled file of older rows to compare the previous and new version on")
+    _training_options(refresh, rounds=20, early_stopping=5)
+    refresh.set_defaults(func=cmd_refresh)
+
+    registry = sub.add_parser(
+        "models",
+        help="list, publish, activate, roll back or prune versions in the model registry",
+        description=(
+            "The registry keeps bundles in <registry>/versions/<version>/ and the served one in "
+            "<registry>/CURRENT. Running servers pick up a new CURRENT within "
+            "CROPSENSE_MODEL_CHECK_SECONDS, loading it in the background."
+        ),
+    )
+    registry.add_argument("action", choices=("list", "publish", "activate", "rollback", "prune"))
+    registry.add_argument("target", nargs="?", help="bundle directory (publish) or version (activate)")
+    registry.add_argument("--registry", default=MODELS_DIR, help="model registry directory (default: models/)")
+    registry.add_argument("--no-activate", action="store_true", help="publish without making it current")
+    registry.add_argument("--keep", type=int, default=None, help="prune: versions to keep (default 5)")
+    registry.set_defaults(func=cmd_models)
+
+    assets = sub.add_parser(
+        "build-assets",
+        help="fingerprint, resize and precompress static/ into static/dist",
+        description=(
+            "Writes content-hashed copies of static/ to static/dist: images resized to several widths "
+            "as AVIF/WebP/JPEG (PNG when transparent), CSS/JS/JSON with .gz and .br next to them, and "
+            "manifest.json, which app.py uses for template URLs and cache-forever responses. Run it "
+            "on deploy, after changing anything under static/."
+        ),
+    )
+    assets.add_argument("--static-dir", default=os.path.join(os.path.dirname(MODELS_DIR), "static"))
+    assets.add_argument("--out", default=None, help="output directory (default: <static-dir>/dist)")
+    assets.add_argument("--widths", default=None, help="comma-separated image widths (default 320,640,960,1280,1920)")
+    assets.add_argument("--force", action="store_true", help="re-encode images even if unchanged since the last build")
+    assets.add_argument("--verbose", action="store_true", help="list every asset on stderr")
+    assets.set_defaults(func=cmd_build_assets)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# ================================================================
+# CropSense gunicorn configuration
+#
+#   gunicorn -c deployement/gunicorn_config.py app:app
+#
+# The app (pandas/sklearn/xgboost + both model pipelines) is imported
+# once in the master and workers are forked from it, so model memory is
+# shared copy-on-write instead of being loaded again by every worker.
+# ================================================================
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+# ---------------- SERVER SOCKET ----------------
+bind = os.environ.get("CROPSENSE_BIND", f"0.0.0.0:{os.environ.get('PORT', '8080')}")
+backlog = 2048
+
+# ---------------- WORKERS ----------------
+# WEB_CONCURRENCY is what Render/Heroku set; default to one worker per core
+workers = _env_int("WEB_CONCURRENCY", CPU_COUNT)
+threads = _env_int("CROPSENSE_THREADS", 2)
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = _env_int("CROPSENSE_TIMEOUT", 60)
+graceful_timeout = 30
+keepalive = 5
+
+# recycle workers now and then so slow leaks can't accumulate
+max_requests = _env_int("CROPSENSE_MAX_REQUESTS", 5000)
+max_requests_jitter = max_requests // 10
+
+# ---------------- PRELOAD ----------------
+preload_app = True
+
+# XGBoost threads per prediction. Every worker thread can be inside a
+# predict at once, so keep workers * threads * nthread <= cores.
+XGB_NTHREAD = _env_int("CROPSENSE_XGB_NTHREAD", max(1, CPU_COUNT // (workers * threads)))
+
+# Must be in the environment before app.py (and OpenMP) is imported.
+os.environ["CROPSENSE_XGB_NTHREAD"] = str(XGB_NTHREAD)
+os.environ.setdefault("OMP_NUM_THREADS", str(XGB_NTHREAD))
+
+# ---------------- METRICS ----------------
+# Workers write metric snapshots here and /metrics sums them (see
+# utils/metrics.py). Must also be set before app.py is imported. A
+# configured directory is emptied so a restart doesn't add up old runs.
+if os.environ.get("CROPSENSE_METRICS_DIR"):
+    os.makedirs(os.environ["CROPSENSE_METRICS_DIR"], exist_ok=True)
+    for stale in glob.glob(os.path.join(os.environ["CROPSENSE_METRICS_DIR"], "*.json")):
+        os.unlink(stale)
+else:
+    os.environ["CROPSENSE_METRICS_DIR"] = tempfile.mkdtemp(prefix="cropsense-metrics-")
+
+# ---------------- LOGGING ----------------
+accesslog = os.environ.get("CROPSENSE_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("CROPSENSE_LOG_LEVEL", "info")
+
+
+# ================================================================
+# HOOKS
+# ================================================================
+def when_ready(server):
+    # Runs in the master after the app was preloaded. One end-to-end
+    # prediction touches every lazily initialised path, then the heap is
+    # frozen so the garbage collector doesn't write to (and un-share)
+    # pages the workers inherited.
+    from app import warm_up
+
+    elapsed = warm_up()
+    server.log.info("master warm-up prediction took %.1f ms", elapsed * 1000)
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # The worker is forked but not yet accepting connections: warm up
+    # its own OpenMP/XGBoost thread state so request #1 doesn't pay for it.
+    from app import warm_up
+
+    elapsed = warm_up()
+    worker.log.info("worker %s warm-up took %.1f ms", worker.pid, elapsed * 1000)
@@ -1,11 +1,14 @@
 
-// GeoJSON for Indian States boundaries
-const GEOJSON_URL =
-  "https://gist.githubusercontent.com/jbrobst/56c13bbbf9d97d187fea01ca62ea5112/raw/e388c4cae20aa53cb5090210a42ebb9b765c0a36/india_states.geojson";
-const DATA_FILE = "/static/data.json";
+// State boundaries are vendored in static/ (simplified, see the file's
+// "source" member); production figures come per crop from the server.
+// The page passes the fingerprinted / API URLs on the script tag.
+const script = document.currentScript;
+const GEOJSON_URL = script?.dataset.geoFile || "/static/india_states.geojson";
+const PRODUCTION_API = script?.dataset.api || "/api/crop-production";
 
 let geojsonData = null;
-let rawCropData = null;
+let currentCrop = null;        // the /api/crop-production/<crop> response shown
+const cropCache = new Map();   // crop -> response, for switching back and forth
 
 const svg = d3.select("#map");
 const width = svg.node().getBoundingClientRect().width;
@@ -26,27 +29,32 @@ const legendSvg = d3
   .attr("height", legendHeight + 25);
 
 // --- Core Logic Functions ---
+async function fetchJSON(url) {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`${url}: HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
 async function init() {
   try {
-    const [geoResponse, dataResponse] = await Promise.all([
-      fetch(GEOJSON_URL),
-      fetch(DATA_FILE),
+    const [geo, index] = await Promise.all([
+      fetchJSON(GEOJSON_URL),
+      fetchJSON(PRODUCTION_API),
     ]);
+    geojsonData = geo;
 
-    geojsonData = await geoResponse.json();
-    rawCropData = await dataResponse.json();
-
-    if (!rawCropData || rawCropData.length === 0) {
-      console.error("Failed to load or data file is empty.");
+    if (!index.crops || index.crops.length === 0) {
+      console.error("No crop production data available.");
       return;
     }
 
-    const uniqueCrops = [...new Set(rawCropData.map((d) => d.cropname))].sort();
     const select = d3.select("#crop-select");
 
     select
       .selectAll("option")
-      .data(uniqueCrops)
+      .data(index.crops)
       .enter()
       .append("option")
       .attr("value", (d) => d)
@@ -58,36 +66,38 @@ async function init() {
 
     projection.fitSize([mapWidth, mapHeight], geojsonData);
 
-    const initialCrop = uniqueCrops[0] || "";
-    updateMap(initialCrop);
+    updateMap(index.crops[0]);
 
     select.on("change", function () {
       updateMap(this.value);
     });
   } catch (error) {
-    console.error(
-      "Error loading required files. Ensure 'data.json' is in the correct path and GeoJSON URL is accessible.",
-      error
-    );
+    console.error("Error loading the state boundaries or the crop production index.", error);
   }
 }
 
-function updateMap(selectedCrop) {
-  const currentCropData = rawCropData.filter(
-    (d) => d.cropname === selectedCrop
-  );
-  const productionMap = new Map();
-  let maxProduction = 0;
-
-  currentCropData.forEach((d) => {
-    const production = parseFloat(d["Production (Lakh Tonnes)"]) || 0;
-    if (d.statename !== "Others") {
-      productionMap.set(d.statename, production);
-      if (production > maxProduction) {
-        maxProduction = production;
-      }
-    }
-  });
+async function loadCrop(crop) {
+  if (!cropCache.has(crop)) {
+    cropCache.set(crop, await fetchJSON(`${PRODUCTION_API}/${encodeURIComponent(crop)}`));
+  }
+  return cropCache.get(crop);
+}
+
+async function updateMap(selectedCrop) {
+  let data;
+  try {
+    data = await loadCrop(selectedCrop);
+  } catch (error) {
+    console.error(`Error loading production data for ${selectedCrop}.`, error);
+    return;
+  }
+  if (d3.select("#crop-select").property("value") !== selectedCrop) {
+    return;   // the user picked another crop while this one was loading
+  }
+  currentCrop = data;
+
+  const productionMap = new Map(data.states.map((d) => [d.state, d]));
+  const maxProduction = data.max || 1;
 
   const states = svg
     .selectAll(".state")
@@ -99,56 +109,34 @@ function updateMap(selectedCrop) {
     .attr("class", "state")
     .attr("d", path)
     .merge(states)
+    .style("fill", (d) => {
+      const entry = productionMap.get(d.properties.ST_NM);
+      return entry && entry.production > 0 ? colorScale(entry.production / maxProduction) : null;
+    })
     .on("mouseover", handleMouseOver)
     .on("mousemove", handleMouseMove)
     .on("mouseout", handleMouseOut);
   states.exit().remove();
-  updateTopProducers(selectedCrop, currentCropData);
+  updateTopProducers(data);
 }
 
-function updateTopProducers(selectedCrop, currentCropData) {
-  d3.select("#current-crop").text(selectedCrop);
-
-  // --- Group by state and sum production ---
-  const stateProductionMap = new Map();
-
-  currentCropData.forEach(d => {
-    if (d.statename !== "Others") {
-      const production = parseFloat(d["Production (Lakh Tonnes)"]) || 0;
-
-      if (!stateProductionMap.has(d.statename)) {
-        stateProductionMap.set(d.statename, production);
-      } else {
-        stateProductionMap.set(
-          d.statename,
-          stateProductionMap.get(d.statename) + production
-        );
-      }
-    }
-  });
-
-  // Convert map to array
-  const aggregatedData = Array.from(stateProductionMap, ([statename, Production]) => ({
-    statename,
-    Production_Lakh_Tonnes: Production,
-  }));
+function updateTopProducers(data) {
+  d3.select("#current-crop").text(data.crop);
 
-  // Sort and take top 5
-  const top5 = aggregatedData
-    .sort((a, b) => b.Production_Lakh_Tonnes - a.Production_Lakh_Tonnes)
-    .slice(0, 5);
+  // states arrive summed over the years and sorted, largest first
+  const top5 = data.states.slice(0, 5);
 
   const list = d3.select("#top-list").html("");
 
-  if (top5.length === 0 || top5[0].Production_Lakh_Tonnes === 0) {
+  if (top5.length === 0 || top5[0].production === 0) {
     list.append("li").text("No significant production data available for this crop.");
     return;
   }
 
   top5.forEach((item, index) => {
-    const formattedProduction = item.Production_Lakh_Tonnes.toFixed(2);
+    const formattedProduction = item.production.toFixed(2);
     list.append("li").text(
-      `${index + 1}. ${item.statename}: ${formattedProduction} Lakh Tonnes`
+      `${index + 1}. ${item.state}: ${formattedProduction} ${data.unit}`
     );
   });
 }
@@ -157,20 +145,15 @@ function handleMouseOver(event, d) {
   const stateName = d.properties.ST_NM;
   d3.select(this).attr("stroke", "#000").attr("stroke-width", 1.5);
 
-  const selectedCrop = d3.select("#crop-select").property("value");
-  const stateData = rawCropData.find(
-    (item) => item.cropname === selectedCrop && item.statename === stateName
-  );
+  const stateData = currentCrop && currentCrop.states.find((item) => item.state === stateName);
 
   const production = stateData
-    ? parseFloat(stateData["Production (Lakh Tonnes)"])
-        .toFixed(2)
-        .toLocaleString()
+    ? `${stateData.latest.production.toFixed(2)} Lakh Tonnes (${stateData.latest.year})`
     : "N/A";
 
   tooltip.style("opacity", 1).html(`
             <strong>${stateName}</strong><br>
-            Production: ${production} Lakh Tonnes
+            Production: ${production}
         `);
 }
 
@@ -0,0 +1,374 @@
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.reference_data import get_reference_store
+
+# ============================================================
+# OFFLINE BULK SCORING
+# ============================================================
+#
+# Scores a survey file (CSV or Parquet) chunk by chunk: each chunk is mapped
+# to the model schema, run through one batched SQI/PHI predict and the
+# columnar treatment engine, and appended to the output. At most a few
+# chunks are in flight at once, so memory stays flat whatever the input
+# size. After every chunk written, a small progress file next to the output
+# records how far we got so an interrupted run can be resumed.
+
+DEFAULT_CHUNK_ROWS = 10000
+
+OUTPUT_FIELDS = [
+    "row", "status", "error",
+    "sqi", "sqi_text", "phi", "phi_text", "final_message",
+    "deficiencies", "treatments",
+]
+
+SOIL_COLUMNS = [
+    "Soil_Ph", "Ec_Dsm", "Organic_Carbon_Percent",
+    "Available_N_Kg_Ha", "Available_P_Kg_Ha", "Available_K_Kg_Ha", "Available_S_Kg_Ha",
+    "Available_Zn_Ppm", "Available_B_Ppm", "Available_Fe_Ppm", "Available_Mn_Ppm", "Available_Cu_Ppm",
+]
+
+
+class ScoringError(Exception):
+    """Bad input/output arguments or a progress file that doesn't match the run."""
+
+
+# ============================================================
+# INPUT
+# ============================================================
+
+def input_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".csv", ".txt", ".gz", ".bz2", ".zip", ".xz"):
+        return "csv"
+    raise ScoringError(f"unsupported input format: {path}")
+
+
+def _parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ScoringError("reading Parquet needs pyarrow (pip install pyarrow)")
+    return pq.ParquetFile(path)
+
+
+def iter_chunks(path, chunk_rows, skip_chunks=0):
+    """
+    Yields (chunk_index, DataFrame) for `path`, starting at chunk
+    `skip_chunks`. Chunk boundaries only depend on the file and chunk_rows,
+    so a resumed run sees the same chunks.
+
+    CSV is read with pandas' chunked reader. Parquet is read one row group
+    at a time; row groups larger than chunk_rows are split into batches.
+    Row groups before the resume point are skipped from the footer
+    metadata without being read.
+    """
+    if input_format(path) == "csv":
+        skip_rows = skip_chunks * chunk_rows
+        reader = pd.read_csv(
+            path,
+            chunksize=chunk_rows,
+            skiprows=range(1, skip_rows + 1) if skip_rows else None,
+            dtype=object,
+            keep_default_na=True,
+        )
+        with reader:
+            for i, df in enumerate(reader, start=skip_chunks):
+                yield i, df
+        return
+
+    pf = _parquet_file(path)
+    index = 0
+    for rg in range(pf.num_row_groups):
+        n = pf.metadata.row_group(rg).num_rows
+        pieces = max(1, math.ceil(n / chunk_rows))
+        if index + pieces <= skip_chunks:
+            index += pieces
+            continue
+        for batch in pf.iter_batches(batch_size=chunk_rows, row_groups=[rg]):
+            if index >= skip_chunks:
+                yield index, batch.to_pandas()
+            index += 1
+
+
+# ============================================================
+# COLUMN MAPPING
+# ============================================================
+
+def source_columns(df):
+    """
+    Chunk -> {column: list of values} with NaN/NA as None, for
+    RequestDecoder.decode_columns. Rows may use the web form's field names
+    (crop, growthStage, ...), which go through the same schema as the API,
+    and/or model column names (Crop_Name, Available_N_Kg_Ha, ...), which
+    win over the form/default values.
+    """
+    values = df.astype(object).where(df.notna(), None)
+    return {c: values[c].tolist() for c in values.columns}
+
+
+def rename_columns(df, column_map):
+    if column_map:
+        df = df.rename(columns=column_map)
+    return df
+
+
+# ============================================================
+# SCORING (runs in worker processes)
+# ============================================================
+
+_WORKER = {}
+
+
+def init_worker(xgb_nthread=1):
+    """
+    Loads the models once per process (importing app does the loading).
+    Pool workers default to one XGBoost thread each so N workers don't
+    oversubscribe N cores; 0 leaves XGBoost's own default.
+    """
+    if "app" in _WORKER:
+        return
+    os.environ.setdefault("CROPSENSE_XGB_NTHREAD", str(xgb_nthread))
+    os.environ.setdefault("CROPSENSE_CACHE_BACKEND", "off")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app
+    from utils.treatment_batch import generate_treatment_recommendations_batch
+
+    _WORKER["app"] = app
+    model = app.SQI_COMPILED or app.SQI_PIPELINE
+    _WORKER["decoder"] = app.REQUEST_SCHEMA.with_model_columns(model.feature_names_in_)
+    _WORKER["treatments"] = generate_treatment_recommendations_batch
+
+
+def score_frame(df, first_row=0, column_map=None):
+    """
+    Scores one chunk. Returns (output records, error count); records are
+    dicts with OUTPUT_FIELDS, `row` being the 0-based row number in the file.
+    """
+    init_worker()
+    app = _WORKER["app"]
+
+    df = rename_columns(df, column_map)
+    batch, errors = _WORKER["decoder"].decode_columns(source_columns(df), len(df))
+
+    out = [None] * len(df)
+    for i, e in errors.items():
+        out[i] = {"row": first_row + i, "status": "error", "error": str(e)}
+
+    if len(batch):
+        sqi_values, phi_values = app.predict_model_inputs(batch)
+
+        columns = batch.columns
+        frame = pd.DataFrame({
+            "Crop_Name": columns["Crop_Name"],
+            "Growth_Stage": columns["Growth_Stage"],
+            "PHI": [7.0 if v is None else v for v in phi_values],
+            **{c: columns[c] for c in SOIL_COLUMNS},
+            **{c: columns[c] for c in get_reference_store().symptom_fields if c in columns},
+        })
+        plans = _WORKER["treatments"](frame)
+
+        for pos, sqi, phi, plan in zip(batch.positions, sqi_values, phi_values, plans):
+            out[pos] = {
+                "row": first_row + pos,
+                "status": "success",
+                "error": None,
+                "sqi": sqi,
+                "sqi_text": app.label_sqi(sqi),
+                "phi": phi,
+                "phi_text": app.label_phi(phi),
+                "final_message": app.final_message(sqi, phi),
+                "deficiencies": plan.get("deficiencies", []),
+                "treatments": plan.get("treatments", []),
+            }
+
+    errors = sum(1 for r in out if r["status"] == "error")
+    return out, errors
+
+
+# ============================================================
+# OUTPUT
+# ============================================================
+
+def output_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ScoringError(f"unsupported output format (use .csv or .jsonl): {path}")
+
+
+def serialize(records, fmt):
+    """Output records -> text for one chunk (CSV without header, or JSON lines)."""
+    if fmt == "jsonl":
+        return "".join(json.dumps(r) + "\n" for r in records)
+
+    # treatment-engine lists are shared between rows with the same plan,
+    # so each distinct list is dumped once
+    dumped = {}
+
+    def dump(value):
+        if value is None:
+            return None
+        text = dumped.get(id(value))
+        if text is None:
+            text = dumped[id(value)] = json.dumps(value)
+        return text
+
+    rows = []
+    for r in records:
+        row = [r.get(f) for f in OUTPUT_FIELDS]
+        row[-2] = dump(row[-2])
+        row[-1] = dump(row[-1])
+        rows.append(row)
+    return pd.DataFrame(rows, columns=OUTPUT_FIELDS).to_csv(index=False, header=False)
+
+
+def score_chunk(index, df, first_row, fmt, column_map=None):
+    """Worker entry point: (chunk index, rows, errors, serialized text)."""
+    records, errors = score_frame(df, first_row, column_map)
+    return index, len(records), errors, serialize(records, fmt)
+
+
+# ============================================================
+# PROGRESS / RESUME
+# ============================================================
+
+def progress_path(output):
+    return output + ".progress.json"
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def load_progress(output, expected):
+    """Saved progress for `output`, or None. Raises if it belongs to a different run."""
+    try:
+        with open(progress_path(output)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    for key, value in expected.items():
+        if state.get(key) != value:
+            raise ScoringError(
+                f"{progress_path(output)} was written for a different run ({key} differs); "
+                "remove it or score without --resume"
+            )
+    return state
+
+
+def save_progress(output, state):
+    tmp = progress_path(output) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, progress_path(output))
+
+
+# ============================================================
+# DRIVER
+# ============================================================
+
+def score_file(input_path, output_path, chunk_rows=DEFAULT_CHUNK_ROWS, workers=None,
+               resume=False, column_map=None, log=sys.stderr):
+    """
+    Scores `input_path` into `output_path`; returns a summary dict.
+
+    workers=1 scores in this process; otherwise a process pool loads the
+    models once per worker and at most 2 * workers chunks are in flight.
+    With resume=True, a run continues after the last chunk recorded in the
+    progress file (the output is truncated back to that point first).
+    """
+    fmt = output_format(output_path)
+    input_format(input_path)
+    if chunk_rows < 1:
+        raise ScoringError("chunk size must be at least 1")
+    workers = workers or os.cpu_count() or 1
+
+    expected = {
+        "input": _fingerprint(input_path),
+        "chunk_rows": chunk_rows,
+        "format": fmt,
+        "column_map": column_map or {},
+    }
+    state = load_progress(output_path, expected) if resume else None
+
+    if state is None:
+        state = dict(expected, chunks=0, rows=0, errors=0, output_bytes=0)
+        with open(output_path, "w", newline="") as f:
+            if fmt == "csv":
+                f.write(",".join(OUTPUT_FIELDS) + "\n")
+            state["output_bytes"] = f.tell()
+        save_progress(output_path, state)
+    else:
+        with open(output_path, "r+b") as f:
+            f.truncate(state["output_bytes"])
+        if log:
+            print(f"resuming after chunk {state['chunks']} ({state['rows']} rows)", file=log)
+
+    start = time.perf_counter()
+    scored = 0
+    out = open(output_path, "a", newline="")
+
+    def write(index, n, errors, text):
+        nonlocal scored
+        out.write(text)
+        out.flush()
+        os.fsync(out.fileno())
+        state.update(
+            chunks=index + 1,
+            rows=state["rows"] + n,
+            errors=state["errors"] + errors,
+            output_bytes=out.tell(),
+        )
+        save_progress(output_path, state)
+        scored += n
+        if log:
+            elapsed = time.perf_counter() - start
+            print(f"chunk {index}: {state['rows']} rows, {state['errors']} errors, "
+                  f"{scored / elapsed:,.0f} rows/s", file=log)
+
+    chunks = iter_chunks(input_path, chunk_rows, skip_chunks=state["chunks"])
+    first_row = state["rows"]
+
+    try:
+        if workers == 1:
+            init_worker(xgb_nthread=0)      # XGBoost may use every core
+            for index, df in chunks:
+                write(*score_chunk(index, df, first_row, fmt, column_map))
+                first_row += len(df)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                pending = deque()
+                for index, df in chunks:
+                    pending.append(pool.submit(score_chunk, index, df, first_row, fmt, column_map))
+                    first_row += len(df)
+                    # results are written in chunk order; keep the window bounded
+                    while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                        write(*pending.popleft().result())
+                while pending:
+                    write(*pending.popleft().result())
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": state["rows"],
+        "errors": state["errors"],
+        "chunks": state["chunks"],
+        "scored_this_run": scored,
+        "elapsed_s": elapsed,
+        "rows_per_s": scored / elapsed if elapsed else 0.0,
+    }
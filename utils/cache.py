@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+CACHE_BACKEND = os.environ.get("CROPSENSE_CACHE_BACKEND", "memory")   # memory | sqlite | off
+CACHE_SIZE = int(os.environ.get("CROPSENSE_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.environ.get("CROPSENSE_CACHE_TTL", "3600"))
+CACHE_PATH = os.environ.get("CROPSENSE_CACHE_PATH", "/tmp/cropsense_cache.sqlite3")
+
+# how often (seconds) the generation fingerprint is recomputed
+GENERATION_CHECK_INTERVAL = float(os.environ.get("CROPSENSE_CACHE_CHECK_SECONDS", "5"))
+
+
+# ============================================================
+# KEYS
+# ============================================================
+
+def canonical_key(model_input, generation=""):
+    """Stable hash of a mapped model input (key order and int/float spelling don't matter)."""
+    canon = {k: (float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v)
+             for k, v in model_input.items()}
+    blob = json.dumps(canon, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{generation}|{blob}".encode("utf-8")).hexdigest()
+
+
+def file_mtimes(*paths):
+    out = []
+    for p in paths:
+        try:
+            out.append(os.stat(p).st_mtime_ns)
+        except OSError:
+            out.append(None)
+    return out
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class MemoryBackend:
+    """Per-process LRU with per-entry expiry."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    File-backed LRU shared by every gunicorn worker on the host.
+    Values are stored as JSON; the generation is part of the key, so
+    stale entries simply stop matching and age out.
+    """
+
+    def __init__(self, max_size, path=CACHE_PATH):
+        self.max_size = max_size
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        self._trim_every = max(1, min(64, max_size // 8))
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires REAL NOT NULL, used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache(used)")
+
+    def _conn(self):
+        # one connection per thread, and never reuse one inherited across fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now),
+        )
+        # trimming needs a COUNT(*); only do it every so often
+        self._sets += 1
+        if self._sets % self._trim_every:
+            return 0
+        conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        extra = count - self.max_size
+        if extra <= 0:
+            return 0
+        conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used LIMIT ?)", (extra,)
+        )
+        return extra
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class RecommendationCache:
+    """
+    Memoizes full recommendation responses keyed on the mapped model input.
+
+    `generation` is a callable returning something that changes whenever
+    the models or reference data change (e.g. file mtimes); it is folded
+    into every key and a change also drops the in-process entries.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL, generation=None,
+                 check_interval=GENERATION_CHECK_INTERVAL):
+        self.backend = backend
+        self.ttl = ttl
+        self._generation_fn = generation
+        self._check_interval = check_interval
+        self._generation = ""
+        self._last_check = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self):
+        if self._generation_fn is None:
+            return ""
+        now = time.monotonic()
+        if self._last_check is None or now - self._last_check >= self._check_interval:
+            gen = hashlib.sha1(repr(self._generation_fn()).encode("utf-8")).hexdigest()[:16]
+            with self._lock:
+                if self._last_check is not None and gen != self._generation:
+                    self.invalidations += 1
+                    if isinstance(self.backend, MemoryBackend):
+                        self.backend.clear()
+                self._generation = gen
+                self._last_check = now
+        return self._generation
+
+    def key(self, model_input):
+        return canonical_key(model_input, self.generation())
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        evicted = self.backend.set(key, value, self.ttl)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def build_cache(generation=None, backend=CACHE_BACKEND, size=CACHE_SIZE, ttl=CACHE_TTL):
+    """Cache from the CROPSENSE_CACHE_* settings; None when caching is off."""
+    if backend == "off" or size <= 0:
+        return None
+    if backend == "sqlite":
+        store = SQLiteBackend(size)
+    else:
+        store = MemoryBackend(size)
+    return RecommendationCache(store, ttl=ttl, generation=generation)
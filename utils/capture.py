@@ -0,0 +1,210 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from utils.metrics import REGISTRY
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Directory for captured /get_recommendation payloads; unset = capture off.
+CAPTURE_DIR = os.environ.get("CROPSENSE_CAPTURE_DIR") or None
+CAPTURE_SAMPLE = float(os.environ.get("CROPSENSE_CAPTURE_SAMPLE", "1"))              # fraction recorded
+CAPTURE_MAX_BYTES = int(os.environ.get("CROPSENSE_CAPTURE_MAX_BYTES", str(64 << 20)))  # per file
+CAPTURE_BACKUPS = int(os.environ.get("CROPSENSE_CAPTURE_BACKUPS", "5"))               # rotated files kept
+CAPTURE_QUEUE_SIZE = int(os.environ.get("CROPSENSE_CAPTURE_QUEUE_SIZE", "10000"))
+CAPTURE_FLUSH_SECONDS = float(os.environ.get("CROPSENSE_CAPTURE_FLUSH_SECONDS", "1"))
+
+# The form fields map_frontend_to_model reads. Anything else a client
+# sends (names, phone numbers, free text) is never written.
+CAPTURE_FIELDS = (
+    "crop", "previousCrop", "soilType", "soilTexture", "growthStage",
+    "irrigationType", "irrigationStatus", "irrigationCount", "irrigationLast7",
+    "leafColor", "spots", "leafYellowPercent", "pests",
+    "rainfall", "temperature", "humidity", "sunlight_hours",
+    "usedFertilizer", "fertilizerType", "fertQty",
+    "usedPesticide", "pesticideType", "pestQty",
+    "usedFungicide", "fungSprays", "plantHeight",
+)
+MAX_STRING = 64
+
+CAPTURED = REGISTRY.counter(
+    "cropsense_capture_records_total",
+    "Captured request payloads by outcome (written, dropped when the writer queue was full).",
+    ("outcome",),
+)
+
+
+def sanitize(payload):
+    """Known form fields with scalar values only; strings are truncated."""
+    out = {}
+    if not isinstance(payload, dict):
+        return out
+    for field in CAPTURE_FIELDS:
+        value = payload.get(field)
+        if isinstance(value, str):
+            out[field] = value[:MAX_STRING]
+        elif isinstance(value, (int, float)):
+            out[field] = value
+    return out
+
+
+# ============================================================
+# RECORDER
+# ============================================================
+
+_STOP = object()
+
+
+class PayloadRecorder:
+    """
+    Appends request payloads to <directory>/requests-<pid>.jsonl, one
+    {"ts": ..., "payload": {...}} per line.
+
+    record() only puts the payload on a bounded queue (dropping it when
+    the queue is full), so the request never waits on disk. A daemon
+    thread, started on first use in each process, sanitizes and writes
+    whatever has queued up in one write per batch and rotates the file
+    RotatingFileHandler-style (requests-<pid>.jsonl.1, .2, ...) once it
+    reaches max_bytes. One file per process keeps gunicorn workers from
+    interleaving lines or rotating each other's files.
+    """
+
+    def __init__(self, directory, sample=CAPTURE_SAMPLE, max_bytes=CAPTURE_MAX_BYTES,
+                 backups=CAPTURE_BACKUPS, queue_size=CAPTURE_QUEUE_SIZE,
+                 flush_interval=CAPTURE_FLUSH_SECONDS):
+        self.directory = directory
+        self.sample = sample
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(self.queue_size)
+        self._thread = None
+        self._pid = None
+        self._dropped = CAPTURED.labels("dropped")
+        self._written = CAPTURED.labels("written")
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"requests-{os.getpid()}.jsonl")
+
+    def record(self, payload):
+        """Queues one payload; True if it was queued."""
+        if self.sample < 1 and random.random() >= self.sample:
+            return False
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), payload))
+            return True
+        except queue.Full:
+            self._dropped.inc()
+            return False
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="payload-capture", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def close(self, timeout=5):
+        """Writes out what is queued and stops the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    # ---------------- writer thread ----------------
+
+    def _run(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < 1000:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = any(item is _STOP for item in batch)
+                lines = [
+                    json.dumps({"ts": round(ts, 3), "payload": sanitize(payload)}, separators=(",", ":"))
+                    for ts, payload in (item for item in batch if item is not _STOP)
+                ]
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    self._written.inc(len(lines))
+                    if f.tell() >= self.max_bytes:
+                        f.close()
+                        self._rotate()
+                        f = open(self.path, "a", encoding="utf-8")
+                if stop:
+                    return
+        except OSError:
+            # disk full / directory gone: stop capturing rather than fail requests
+            pass
+        finally:
+            f.close()
+
+    def _rotate(self):
+        path = self.path
+        if self.backups <= 0:
+            os.unlink(path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+
+def capture_files(directory):
+    """Every capture file in `directory`, rotated ones included."""
+    return sorted(glob.glob(os.path.join(directory, "requests-*.jsonl*")))
+
+
+def read_captured(paths):
+    """Captured payloads from files and/or capture directories, oldest first."""
+    records = []
+    for path in paths:
+        for name in capture_files(path) if os.path.isdir(path) else [path]:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue          # a line cut short by a crash
+                    if isinstance(record, dict) and isinstance(record.get("payload"), dict):
+                        records.append((record.get("ts", 0), record["payload"]))
+    records.sort(key=lambda r: r[0])
+    return [payload for _, payload in records]
+
+
+def build_recorder(directory=CAPTURE_DIR):
+    """The process-wide recorder, or None when capture is off."""
+    if not directory:
+        return None
+    recorder = PayloadRecorder(directory)
+    os.register_at_fork(after_in_child=recorder._reset)
+    atexit.register(recorder.close)
+    return recorder
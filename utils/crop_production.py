@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.metrics import REGISTRY, stage_timer
+from utils.reference_data import CHECK_INTERVAL
+
+# ============================================================
+# CROP PRODUCTION INDEX
+# ============================================================
+#
+# static/data.json is one record per crop x state x year with the value
+# as a string ("29.33"). The home page map used to download all of it and
+# filter in the browser on every dropdown change; /api/crop-production now
+# answers per crop from this index instead:
+#
+#   crop (lower-cased) -> {state: {year: float}}
+#
+# built once per file version, with each crop's JSON response (and its
+# ETag) serialized on first request and kept until the file changes.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTION_FILE = os.environ.get("CROPSENSE_PRODUCTION_DATA") or os.path.join(BASE_DIR, "static", "data.json")
+
+CROP_FIELD = "cropname"
+STATE_FIELD = "statename"
+YEAR_FIELD = "cropyear"
+VALUE_FIELD = "Production (Lakh Tonnes)"
+UNIT = "Lakh Tonnes"
+
+# rows not tied to one state: in a crop's "others" total, never on the map
+OTHERS = "Others"
+
+PRODUCTION_LOADS = REGISTRY.counter(
+    "cropsense_production_loads_total",
+    "Crop production data reads (first load and reloads after the file changed).",
+)
+
+
+def _number(value):
+    """'29.33' / 29.33 -> 29.33; anything unparseable -> None."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number else None
+
+
+def _etag(body):
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+class ProductionIndex:
+    """Per-crop production figures from static/data.json, reloaded when the file changes."""
+
+    def __init__(self, path=PRODUCTION_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.load()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        with stage_timer("production_load"):
+            mtime = self._mtime()
+            with open(self.path, encoding="utf-8") as f:
+                records = json.load(f)
+
+            crops, names, years, invalid = {}, {}, set(), 0
+            for r in records:
+                crop, state, year = r.get(CROP_FIELD), r.get(STATE_FIELD), r.get(YEAR_FIELD)
+                if not crop or not state:
+                    continue
+                value = _number(r.get(VALUE_FIELD))
+                if value is None:
+                    invalid += 1
+                    value = 0.0        # what the map showed for them (parseFloat(...) || 0)
+                key = str(crop).strip().lower()
+                names.setdefault(key, str(crop).strip())
+                by_year = crops.setdefault(key, {}).setdefault(str(state).strip(), {})
+                year = str(year) if year is not None else ""
+                by_year[year] = by_year.get(year, 0.0) + value
+                years.add(year)
+        PRODUCTION_LOADS.inc()
+
+        with self._lock:
+            self.crops = crops
+            self.names = names
+            self.years = sorted(years)
+            self.invalid = invalid
+            self.mtime = mtime
+            self._responses = {}
+        self._last_check = time.monotonic()
+
+    def maybe_reload(self, interval=CHECK_INTERVAL):
+        if interval and time.monotonic() - self._last_check >= interval:
+            self._last_check = time.monotonic()
+            if self._mtime() != self.mtime:
+                self.load()
+                return True
+        return False
+
+    # --------------------------------------------------------
+    # RESPONSES
+    # --------------------------------------------------------
+
+    def crop_list(self):
+        """(JSON body, ETag) listing the crops and years."""
+        return self._response(("",), lambda: {
+            "crops": sorted(self.names.values()),
+            "years": self.years,
+            "unit": UNIT,
+        })
+
+    def crop_summary(self, crop, year=None):
+        """(JSON body, ETag) with the crop's per-state totals, or None for an unknown crop/year."""
+        key = str(crop).strip().lower()
+        if key not in self.crops or (year is not None and year not in self.years):
+            return None
+        return self._response((key, year), lambda: self._summary(key, year))
+
+    def _response(self, key, build):
+        responses = self._responses
+        cached = responses.get(key)
+        if cached is None:
+            body = json.dumps(build(), separators=(",", ":")).encode("utf-8")
+            cached = responses[key] = (body, _etag(body))
+        return cached
+
+    def _summary(self, key, year):
+        """
+        Per state: `production` summed over the years (or for `year`), and
+        the most recent year's figure, largest producer first.
+        """
+        states, others = [], 0.0
+        for state, by_year in self.crops[key].items():
+            values = by_year if year is None else {y: v for y, v in by_year.items() if y == year}
+            if not values:
+                continue
+            total = round(sum(values.values()), 2)
+            if state == OTHERS:
+                others += total
+                continue
+            latest = max(values)
+            states.append({"state": state, "production": total,
+                           "latest": {"year": latest, "production": round(values[latest], 2)}})
+        states.sort(key=lambda s: (-s["production"], s["state"]))
+        years = sorted({y for by_year in self.crops[key].values() for y in by_year})
+        return {
+            "crop": self.names[key],
+            "unit": UNIT,
+            "year": year,
+            "years": years,
+            "max": states[0]["production"] if states else 0.0,
+            "others": round(others, 2),
+            "states": states,
+        }
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_production_index():
+    """Process-wide index, created on first use and refreshed when the file changes."""
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = ProductionIndex()
+    else:
+        _INDEX.maybe_reload()
+    return _INDEX
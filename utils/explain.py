@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import xgboost as xgb
+
+# ============================================================
+# PREDICTION EXPLANATIONS
+# ============================================================
+#
+# explain mode (?explain=1) answers "why this SQI / PHI": per prediction,
+# the input features that moved it most. XGBoost computes per-feature
+# contributions natively (Booster.predict(pred_contribs=True)): one column
+# per encoded feature plus the bias, summing to the prediction. So the
+# explained prediction is the row sum and explaining replaces the predict
+# call instead of adding one.
+#
+# The encoded columns are summed back onto the model's input features
+# (every one-hot column of Crop_Name onto Crop_Name, a scaled numeric onto
+# itself) with one matrix product per batch; a row reports the EXPLAIN_TOP
+# largest by magnitude, the bias and what the remaining features add up to.
+#
+# EXPLAIN_METHOD "approx" (default) is XGBoost's path attribution: one walk
+# down each tree, crediting every split's change in node value to its
+# feature, ~15us per row batched on one core. "exact" is TreeSHAP: the
+# Shapley values, ~1.2ms per row for the 100-round depth-6 models.
+
+EXPLAIN_METHOD = os.environ.get("CROPSENSE_EXPLAIN_METHOD", "approx")   # approx | exact
+EXPLAIN_TOP = int(os.environ.get("CROPSENSE_EXPLAIN_TOP", "5"))
+
+
+def feature_groups(spec):
+    """
+    (input feature names, encoded column -> index into those names) for a
+    pipeline_spec(); a categorical's one-hot columns all map to it.
+    """
+    names, index, group = [], {}, []
+    for block in spec["blocks"]:
+        if block["kind"] == "cat":
+            widths = [len(cats) for cats in block["categories"]]
+        else:
+            widths = [1] * len(block["columns"])
+        for col, width in zip(block["columns"], widths):
+            if col not in index:
+                index[col] = len(names)
+                names.append(col)
+            group.extend([index[col]] * width)
+    return names, np.asarray(group, dtype=np.intp)
+
+
+class Explainer:
+    """Per-input-feature contributions for one CompiledPipeline."""
+
+    def __init__(self, compiled, method=EXPLAIN_METHOD, top=EXPLAIN_TOP):
+        if method not in ("approx", "exact"):
+            raise ValueError(f"unknown explain method {method!r} (expected approx or exact)")
+        self.compiled = compiled
+        self.approx = method == "approx"
+        self.top = top
+        self.features, group = feature_groups(compiled.spec)
+        # encoded column -> input feature, as a 0/1 matrix for the batch sum
+        self._onto = np.zeros((compiled.n_features, len(self.features)), dtype=np.float64)
+        self._onto[np.arange(compiled.n_features), group] = 1.0
+
+    def contributions(self, data):
+        """(n x features contributions, n biases) for a DMatrix of encoded rows."""
+        raw = self.compiled.booster.predict(
+            data,
+            pred_contribs=True,
+            approx_contribs=self.approx,
+            iteration_range=self.compiled._iteration_range,
+        ).astype(np.float64)
+        return raw[:, :-1] @ self._onto, raw[:, -1]
+
+    def ranked(self, data):
+        """
+        (predictions, biases, top feature indexes, their contributions, sum
+        of the other contributions) for a DMatrix, top features by magnitude.
+        """
+        contrib, base = self.contributions(data)
+        total = contrib.sum(axis=1)
+        k = min(self.top, contrib.shape[1])
+        order = np.argsort(-np.abs(contrib), axis=1, kind="stable")[:, :k]
+        top = np.take_along_axis(contrib, order, axis=1)
+        return total + base, base, order, top, total - top.sum(axis=1)
+
+
+class JointExplainer:
+    """
+    Explainers for models that share an encoding (see JointPredictor): one
+    DMatrix for all of them, one pass over the rows to build the output.
+    """
+
+    def __init__(self, explainers, names):
+        self.explainers = list(explainers)
+        self.names = list(names)
+        self.encoder = self.explainers[0].compiled
+
+    def explain(self, X, rows):
+        """
+        (one prediction array per model, one {name: explanation} per row) for
+        the encoded matrix X of `rows` (mappings, for the features' values).
+        An explanation is {"base", "top": [{"feature", "value",
+        "contribution"}], "other"}; base + contributions + other is the
+        prediction.
+        """
+        data = xgb.DMatrix(X, missing=np.nan)
+        ranked = [e.ranked(data) for e in self.explainers]
+        predictions = [r[0] for r in ranked]
+        per_model = [
+            (name, e.features, base.tolist(), order.tolist(), top.tolist(), other.tolist())
+            for name, e, (_, base, order, top, other) in zip(self.names, self.explainers, ranked)
+        ]
+        explanations = []
+        for i, row in enumerate(rows):
+            get = row.get
+            explanations.append({
+                name: {
+                    "base": base[i],
+                    "top": [
+                        {"feature": features[j], "value": get(features[j]), "contribution": v}
+                        for j, v in zip(order[i], top[i])
+                    ],
+                    "other": other[i],
+                }
+                for name, features, base, order, top, other in per_model
+            })
+        return predictions, explanations
+
+
+def build_joint_explainer(*compiled, names, method=EXPLAIN_METHOD, top=EXPLAIN_TOP):
+    """JointExplainer when every compiled pipeline shares the first one's encoding, else None."""
+    if not compiled or any(c is None for c in compiled):
+        return None
+    if not all(compiled[0].same_encoding(c) for c in compiled[1:]):
+        return None
+    return JointExplainer([Explainer(c, method, top) for c in compiled], names)
@@ -0,0 +1,597 @@
+import atexit
+import calendar
+import datetime
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from utils.metrics import REGISTRY
+
+# ============================================================
+# FIELD HISTORY
+# ============================================================
+#
+# Every /get_recommendation that names its field ("fieldId", optionally
+# "farmId" in the payload) is appended to a local SQLite store: the mapped
+# model input, SQI / PHI, the model version and the treatment plan. The
+# store can then answer what a field's health did over time, across
+# growth stages and seasons.
+#
+# Layout:
+#   history_YYYYMM   one segment table per UTC month. While open it is a
+#                    plain table in arrival order with a (field, ts, seq)
+#                    index, so a write batch dirties a few tail pages and
+#                    index pages, not one leaf page per field. Compaction
+#                    rebuilds it WITHOUT ROWID on (field, ts, seq): a
+#                    field's records become contiguous and a range query
+#                    is one seek per segment. Model inputs are stored as
+#                    a JSON array in schema column order (the column list
+#                    is interned in `schemas`), treatment plans are
+#                    interned in `plans`.
+#   field_rollup     count / sum / min / max of SQI and PHI and the first /
+#   crop_rollup      last timestamp per (field, day, crop, stage) and
+#                    (crop, day, stage),
+#                    upserted with every write, so trends never scan raw
+#                    records and stay fast at tens of millions of them.
+#   segments         the segment tables, their time span and whether they
+#                    have been compacted.
+#
+# Writes: record() puts the request on a bounded queue (dropping it when
+# full) and returns; a daemon thread per process writes whatever has queued
+# up in one transaction per batch, rollups included. Every
+# COMPACT_SECONDS that thread also compacts: a closed month (no more
+# writes) is rebuilt clustered by field in chunks, and segments older
+# than RETAIN_DAYS are dropped whole (their rollups stay). Several workers
+# can share the file: WAL mode, one writer
+# at a time, segment compaction claimed through `segments`.
+
+HISTORY_PATH = os.environ.get("CROPSENSE_HISTORY_PATH") or None      # unset = history off
+HISTORY_QUEUE_SIZE = int(os.environ.get("CROPSENSE_HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_FLUSH_SECONDS = float(os.environ.get("CROPSENSE_HISTORY_FLUSH_SECONDS", "1"))
+HISTORY_RETAIN_DAYS = float(os.environ.get("CROPSENSE_HISTORY_RETAIN_DAYS", "0"))  # raw records; 0 = forever
+HISTORY_COMPACT_SECONDS = float(os.environ.get("CROPSENSE_HISTORY_COMPACT_SECONDS", "3600"))
+HISTORY_CACHE_MB = int(os.environ.get("CROPSENSE_HISTORY_CACHE_MB", "64"))     # page cache per connection
+
+MAX_ID = 64                 # characters kept of a farm / field id
+MAX_BATCH = 2000            # records per write transaction
+COMPACT_CHUNK = 50000       # rows copied per transaction when compacting
+CLAIM_SECONDS = 3600        # a compaction claim older than this is taken over
+DEFAULT_LIMIT = 1000
+DAY = 86400
+BUCKETS = ("day", "week", "stage")
+# the times an ISO date can name (years 1-9999); query times outside are rejected
+MIN_TIME = datetime.datetime(1, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+MAX_TIME = datetime.datetime(9999, 12, 31, 23, 59, 59, tzinfo=datetime.timezone.utc).timestamp()
+
+RECORDED = REGISTRY.counter(
+    "cropsense_history_records_total",
+    "Field history records by outcome (written, dropped when the writer queue was full, failed).",
+    ("outcome",),
+)
+
+
+def field_key(payload):
+    """(field, farm) named by a request payload, or None when it names no field."""
+    if not isinstance(payload, dict):
+        return None
+    field = payload.get("fieldId")
+    if not isinstance(field, (str, int)) or isinstance(field, bool) or field == "":
+        return None
+    farm = payload.get("farmId")
+    farm = str(farm)[:MAX_ID] if isinstance(farm, (str, int)) and not isinstance(farm, bool) else ""
+    return str(field)[:MAX_ID], farm
+
+
+def parse_time(value):
+    """Unix seconds or an ISO date / datetime (UTC) -> seconds; None stays None."""
+    if value in (None, ""):
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        # "nan", "inf", "1e400" and "1e300" all parse; none of them is a point
+        # in time, and the day numbers of the last would overflow SQLite's INTEGER
+        if not MIN_TIME <= seconds <= MAX_TIME:
+            raise ValueError(f"expected unix seconds between {MIN_TIME:.0f} and {MAX_TIME:.0f}, got {value!r}")
+        return seconds
+    try:
+        moment = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"expected unix seconds or an ISO date, got {value!r}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def segment_name(ts):
+    t = time.gmtime(ts)
+    return f"history_{t.tm_year:04d}{t.tm_mon:02d}"
+
+
+def segment_span(name):
+    """(start, stop) seconds of the month a segment table holds."""
+    year, month = int(name[8:12]), int(name[12:14])
+    start = calendar.timegm((year, month, 1, 0, 0, 0))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return start, calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def _date(day):
+    return time.strftime("%Y-%m-%d", time.gmtime(day * DAY))
+
+
+_STOP = object()
+
+_SEGMENT_COLUMNS = (
+    "field TEXT NOT NULL, ts REAL NOT NULL, seq INTEGER NOT NULL,"
+    " farm TEXT NOT NULL, crop TEXT, stage TEXT, sqi REAL, phi REAL, model_version TEXT,"
+    " schema INTEGER NOT NULL, inputs TEXT NOT NULL, plan INTEGER"
+)
+_CLUSTERED = ", PRIMARY KEY (field, ts, seq)) WITHOUT ROWID"
+
+_ROLLUP_VALUES = (
+    "n INTEGER NOT NULL, sqi_sum REAL NOT NULL, sqi_min REAL NOT NULL, sqi_max REAL NOT NULL,"
+    " phi_sum REAL NOT NULL, phi_min REAL NOT NULL, phi_max REAL NOT NULL,"
+    " first REAL NOT NULL, last REAL NOT NULL"
+)
+
+_ROLLUP_UPDATE = (
+    " ON CONFLICT DO UPDATE SET n = n + excluded.n,"
+    " sqi_sum = sqi_sum + excluded.sqi_sum, sqi_min = min(sqi_min, excluded.sqi_min),"
+    " sqi_max = max(sqi_max, excluded.sqi_max),"
+    " phi_sum = phi_sum + excluded.phi_sum, phi_min = min(phi_min, excluded.phi_min),"
+    " phi_max = max(phi_max, excluded.phi_max),"
+    " first = min(first, excluded.first), last = max(last, excluded.last)"
+)
+
+_ROLLUP_SELECT = (
+    "SUM(n), SUM(sqi_sum), MIN(sqi_min), MAX(sqi_max), SUM(phi_sum), MIN(phi_min), MAX(phi_max),"
+    " MIN(first), MAX(last)"
+)
+
+
+class HistoryStore:
+    """Append-only field history in one SQLite file; see the banner above."""
+
+    def __init__(self, path, queue_size=HISTORY_QUEUE_SIZE, flush_interval=HISTORY_FLUSH_SECONDS,
+                 retain_days=HISTORY_RETAIN_DAYS, compact_interval=HISTORY_COMPACT_SECONDS):
+        self.path = path
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.retain_days = retain_days
+        self.compact_interval = compact_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._create()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(self.queue_size)
+        self._thread = None
+        self._pid = None
+        self._seq = 0
+        self._segments = set()         # segment tables known to exist
+        self._schemas = {}             # column tuple -> id
+        self._plans = {}               # id(treatments) -> (treatments, deficiencies, plan id)
+        self._columns = {}             # schema id -> column list (reads)
+        self._plan_bodies = {}         # plan id -> plan dict (reads)
+        self._compacted = 0.0
+        self._written = RECORDED.labels("written")
+        self._dropped = RECORDED.labels("dropped")
+        self._failed = RECORDED.labels("failed")
+
+    def _conn(self):
+        # one connection per thread, and never reuse one inherited across fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # appends land all over the (field, ts) keys: without the
+            # interior pages cached, every commit re-reads them
+            conn.execute(f"PRAGMA cache_size=-{HISTORY_CACHE_MB * 1024}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            # must precede the first table: compaction gives pages back, and
+            # the clustered segment rows (~300 bytes) want big pages
+            conn.execute("PRAGMA page_size=16384")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                " name TEXT PRIMARY KEY, start REAL NOT NULL, stop REAL NOT NULL,"
+                " compacted INTEGER NOT NULL DEFAULT 0, claimed REAL);"
+                "CREATE TABLE IF NOT EXISTS schemas (id INTEGER PRIMARY KEY, digest TEXT UNIQUE NOT NULL,"
+                " columns TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS plans (id INTEGER PRIMARY KEY, digest TEXT UNIQUE NOT NULL,"
+                " body TEXT NOT NULL);"
+                f"CREATE TABLE IF NOT EXISTS field_rollup (field TEXT NOT NULL, day INTEGER NOT NULL,"
+                f" crop TEXT NOT NULL, stage TEXT NOT NULL, {_ROLLUP_VALUES},"
+                f" PRIMARY KEY (field, day, crop, stage)) WITHOUT ROWID;"
+                f"CREATE TABLE IF NOT EXISTS crop_rollup (crop TEXT NOT NULL, day INTEGER NOT NULL,"
+                f" stage TEXT NOT NULL, {_ROLLUP_VALUES},"
+                f" PRIMARY KEY (crop, day, stage)) WITHOUT ROWID;"
+            )
+        finally:
+            conn.close()
+
+    # --------------------------------------------------------
+    # WRITES (request thread)
+    # --------------------------------------------------------
+
+    def record(self, field, farm, model_input, result, version=None, ts=None):
+        """
+        Queues one scored request: the mapped model input and the response
+        (sqi, phi, deficiencies, treatments; `version` defaults to its
+        model_version). True if it was queued.
+        """
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait((time.time() if ts is None else ts, field, farm, model_input, result, version))
+            return True
+        except queue.Full:
+            self._dropped.inc()
+            return False
+
+    def record_request(self, payload, model_input, result, version=None):
+        """record() for a request payload that names its field; False when it names none."""
+        key = field_key(payload)
+        return key is not None and self.record(key[0], key[1], model_input, result, version)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name="field-history", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def close(self, timeout=10):
+        """Writes out what is queued and stops the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def flush(self, timeout=10):
+        """Waits until everything queued so far is written (benchmarks, scripts)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    # --------------------------------------------------------
+    # WRITER THREAD
+    # --------------------------------------------------------
+
+    def _run(self):
+        self._compacted = time.time()
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(item is _STOP for item in batch)
+            records = [item for item in batch if item is not _STOP]
+            if records:
+                try:
+                    self.write(records)
+                    self._written.inc(len(records))
+                except (sqlite3.Error, OSError, TypeError, ValueError):
+                    # disk full, file locked too long, an unserializable value:
+                    # lose this batch rather than fail requests
+                    self._failed.inc(len(records))
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+            if self.compact_interval and time.time() - self._compacted >= self.compact_interval:
+                try:
+                    self.compact()
+                except sqlite3.Error:
+                    pass
+                self._compacted = time.time()
+
+    def _next_seq(self):
+        # unique per (field, ts) across the processes sharing the file
+        self._seq += 1
+        return (os.getpid() << 32) | (self._seq & 0xFFFFFFFF)
+
+    def _intern(self, conn, table, column, text):
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        conn.execute(f"INSERT OR IGNORE INTO {table} (digest, {column}) VALUES (?, ?)", (digest, text))
+        return conn.execute(f"SELECT id FROM {table} WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def _schema_id(self, conn, columns):
+        sid = self._schemas.get(columns)
+        if sid is None:
+            sid = self._schemas[columns] = self._intern(conn, "schemas", "columns", json.dumps(list(columns)))
+        return sid
+
+    def _plan_id(self, conn, result):
+        treatments, deficiencies = result.get("treatments"), result.get("deficiencies")
+        if treatments is None and deficiencies is None:
+            return None
+        # plans for the default soil are shared objects; the entry holds them so
+        # their id() can't be reused by another list
+        cached = self._plans.get(id(treatments))
+        if cached is not None and cached[0] is treatments and cached[1] is deficiencies:
+            return cached[2]
+        body = json.dumps({"deficiencies": deficiencies or [], "treatments": treatments or []},
+                          sort_keys=True, separators=(",", ":"))
+        pid = self._intern(conn, "plans", "body", body)
+        if len(self._plans) >= 4096:
+            self._plans.clear()
+        self._plans[id(treatments)] = (treatments, deficiencies, pid)
+        return pid
+
+    def _segment(self, conn, ts):
+        name = segment_name(ts)
+        if name not in self._segments:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {name} ({_SEGMENT_COLUMNS})")
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_field ON {name} (field, ts, seq)")
+            start, stop = segment_span(name)
+            conn.execute("INSERT OR IGNORE INTO segments (name, start, stop) VALUES (?, ?, ?)", (name, start, stop))
+            self._segments.add(name)
+        return name
+
+    def write(self, records):
+        """Appends (ts, field, farm, model_input, result, version) records in one transaction."""
+        conn = self._conn()
+        segments, field_rollup, crop_rollup = {}, {}, {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for ts, field, farm, model_input, result, version in records:
+                columns = tuple(model_input)
+                crop, stage = model_input.get("Crop_Name"), model_input.get("Growth_Stage")
+                sqi, phi = result.get("sqi"), result.get("phi")
+                segments.setdefault(self._segment(conn, ts), []).append((
+                    field, ts, self._next_seq(), farm, crop, stage, sqi, phi, version or result.get("model_version"),
+                    self._schema_id(conn, columns),
+                    json.dumps(model_input.values(), separators=(",", ":")),
+                    self._plan_id(conn, result),
+                ))
+                if sqi is None or phi is None:
+                    continue
+                day = int(ts // DAY)
+                crop, stage = crop or "", stage or ""
+                for rollup, key in ((field_rollup, (field, day, crop, stage)), (crop_rollup, (crop, day, stage))):
+                    acc = rollup.get(key)
+                    if acc is None:
+                        rollup[key] = [1, sqi, sqi, sqi, phi, phi, phi, ts, ts]
+                    else:
+                        acc[0] += 1
+                        acc[1] += sqi
+                        acc[2] = min(acc[2], sqi)
+                        acc[3] = max(acc[3], sqi)
+                        acc[4] += phi
+                        acc[5] = min(acc[5], phi)
+                        acc[6] = max(acc[6], phi)
+                        acc[7] = min(acc[7], ts)
+                        acc[8] = max(acc[8], ts)
+
+            for name, rows in segments.items():
+                conn.executemany(f"INSERT INTO {name} VALUES ({', '.join('?' * 12)})", rows)
+            conn.executemany(
+                f"INSERT INTO field_rollup VALUES ({', '.join('?' * 13)})" + _ROLLUP_UPDATE,
+                [(*key, *acc) for key, acc in field_rollup.items()],
+            )
+            conn.executemany(
+                f"INSERT INTO crop_rollup VALUES ({', '.join('?' * 12)})" + _ROLLUP_UPDATE,
+                [(*key, *acc) for key, acc in crop_rollup.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            # ids handed out inside the transaction are gone with it
+            self._segments.clear()
+            self._schemas.clear()
+            self._plans.clear()
+            raise
+
+    # --------------------------------------------------------
+    # COMPACTION
+    # --------------------------------------------------------
+
+    def compact(self, now=None):
+        """
+        Drops segments past retain_days and rebuilds one closed, not yet
+        compacted segment in key order. Returns {"dropped": [...],
+        "compacted": name or None}.
+        """
+        now = time.time() if now is None else now
+        conn = self._conn()
+        out = {"dropped": [], "compacted": None}
+
+        if self.retain_days:
+            cutoff = now - self.retain_days * DAY
+            for (name,) in conn.execute("SELECT name FROM segments WHERE stop <= ?", (cutoff,)).fetchall():
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+                conn.execute("DELETE FROM segments WHERE name = ?", (name,))
+                conn.execute("COMMIT")
+                self._segments.discard(name)
+                out["dropped"].append(name)
+
+        row = conn.execute(
+            "SELECT name FROM segments WHERE stop <= ? AND compacted = 0 AND (claimed IS NULL OR claimed < ?)"
+            " ORDER BY start LIMIT 1", (now, now - CLAIM_SECONDS),
+        ).fetchone()
+        if row is not None:
+            name = row[0]
+            claimed = conn.execute(
+                "UPDATE segments SET claimed = ? WHERE name = ? AND compacted = 0"
+                " AND (claimed IS NULL OR claimed < ?)", (now, name, now - CLAIM_SECONDS),
+            ).rowcount
+            if claimed:
+                self._rebuild(conn, name)
+                out["compacted"] = name
+
+        if out["dropped"] or out["compacted"]:
+            # sqlite3's execute() steps a row-less statement once, which
+            # frees one page; executescript() runs it to completion
+            conn.executescript("PRAGMA incremental_vacuum")
+        return out
+
+    def _rebuild(self, conn, name):
+        # a closed month gets no more writes; copy it in (field, ts) order
+        # into a clustered table in chunks (other writers get the lock
+        # between them), then swap it in; its index goes with the old table
+        staging = f"{name}_compact"
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.execute(f"CREATE TABLE {staging} ({_SEGMENT_COLUMNS}{_CLUSTERED}")
+        last = None
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            if last is None:
+                rows = conn.execute(
+                    f"SELECT * FROM {name} ORDER BY field, ts, seq LIMIT ?", (COMPACT_CHUNK,)).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT * FROM {name} WHERE (field, ts, seq) > (?, ?, ?) ORDER BY field, ts, seq LIMIT ?",
+                    (*last, COMPACT_CHUNK)).fetchall()
+            conn.executemany(f"INSERT INTO {staging} VALUES ({', '.join('?' * 12)})", rows)
+            conn.execute("COMMIT")
+            if len(rows) < COMPACT_CHUNK:
+                break
+            last = rows[-1][:3]
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"DROP TABLE {name}")
+        conn.execute(f"ALTER TABLE {staging} RENAME TO {name}")
+        conn.execute("UPDATE segments SET compacted = 1, claimed = NULL WHERE name = ?", (name,))
+        conn.execute("COMMIT")
+
+    # --------------------------------------------------------
+    # QUERIES
+    # --------------------------------------------------------
+
+    def _columns_of(self, conn, sid):
+        columns = self._columns.get(sid)
+        if columns is None:
+            row = conn.execute("SELECT columns FROM schemas WHERE id = ?", (sid,)).fetchone()
+            columns = self._columns[sid] = json.loads(row[0])
+        return columns
+
+    def _plan_of(self, conn, pid):
+        if pid is None:
+            return {"deficiencies": [], "treatments": []}
+        plan = self._plan_bodies.get(pid)
+        if plan is None:
+            row = conn.execute("SELECT body FROM plans WHERE id = ?", (pid,)).fetchone()
+            plan = self._plan_bodies[pid] = json.loads(row[0])
+        return plan
+
+    def records(self, field, since=None, until=None, limit=DEFAULT_LIMIT):
+        """The newest `limit` records of `field` in [since, until), oldest first."""
+        conn = self._conn()
+        lo = float("-inf") if since is None else since
+        hi = float("inf") if until is None else until
+        segments = conn.execute(
+            "SELECT name FROM segments WHERE stop > ? AND start < ? ORDER BY start DESC", (lo, hi)).fetchall()
+        rows = []
+        for (name,) in segments:
+            if len(rows) >= limit:
+                break
+            try:
+                rows.extend(conn.execute(
+                    f"SELECT ts, farm, crop, stage, sqi, phi, model_version, schema, inputs, plan FROM {name}"
+                    f" WHERE field = ? AND ts >= ? AND ts < ? ORDER BY ts DESC, seq DESC LIMIT ?",
+                    (field, lo, hi, limit - len(rows))).fetchall())
+            except sqlite3.OperationalError:
+                continue            # dropped by a compaction meanwhile
+        out = []
+        for ts, farm, crop, stage, sqi, phi, version, sid, inputs, pid in reversed(rows):
+            plan = self._plan_of(conn, pid)
+            out.append({
+                "ts": ts,
+                "farm": farm,
+                "crop": crop,
+                "stage": stage,
+                "sqi": sqi,
+                "phi": phi,
+                "model_version": version,
+                "inputs": dict(zip(self._columns_of(conn, sid), json.loads(inputs))),
+                "deficiencies": plan["deficiencies"],
+                "treatments": plan["treatments"],
+            })
+        return out
+
+    def _trend(self, table, key_column, key, since, until, bucket, extra=()):
+        if bucket not in BUCKETS:
+            raise ValueError(f"unknown bucket {bucket!r} (expected one of {', '.join(BUCKETS)})")
+        group = {"day": "day", "week": "(day + 3) / 7", "stage": "stage"}[bucket]
+        groups = [*extra, group]
+        lo = -2 ** 62 if since is None else int(since // DAY)
+        hi = 2 ** 62 if until is None else int(-(-until // DAY)) - 1
+        rows = self._conn().execute(
+            f"SELECT {', '.join(groups)}, {_ROLLUP_SELECT} FROM {table}"
+            f" WHERE {key_column} = ? AND day BETWEEN ? AND ?"
+            f" GROUP BY {', '.join(groups)} ORDER BY MIN(first)",
+            (key, lo, hi),
+        ).fetchall()
+        out = []
+        for row in rows:
+            keys, (n, sqi_sum, sqi_min, sqi_max, phi_sum, phi_min, phi_max, first, last) = \
+                row[:len(groups)], row[len(groups):]
+            item = dict(zip(extra, keys))
+            if bucket == "stage":
+                item["stage"] = keys[-1]
+            else:
+                # the day, or the Monday starting the week
+                item[bucket] = _date(keys[-1] if bucket == "day" else keys[-1] * 7 - 3)
+            item.update({
+                "first": first,
+                "last": last,
+                "count": n,
+                "sqi": {"mean": sqi_sum / n, "min": sqi_min, "max": sqi_max},
+                "phi": {"mean": phi_sum / n, "min": phi_min, "max": phi_max},
+            })
+            out.append(item)
+        return out
+
+    def field_trend(self, field, since=None, until=None, bucket="day"):
+        """SQI / PHI per day, week or growth stage (and crop) for `field`, from the rollups."""
+        return self._trend("field_rollup", "field", field, since, until, bucket, extra=("crop",))
+
+    def crop_trend(self, crop, since=None, until=None, bucket="day"):
+        """SQI / PHI per day, week or growth stage over every field growing `crop`."""
+        return self._trend("crop_rollup", "crop", crop, since, until, bucket)
+
+    def stats(self):
+        conn = self._conn()
+        segments = conn.execute("SELECT name, compacted FROM segments ORDER BY start").fetchall()
+        return {
+            "segments": [{"name": name, "compacted": bool(done)} for name, done in segments],
+            "queued": self._queue.qsize(),
+        }
+
+
+def build_history_store(path=HISTORY_PATH):
+    """The process-wide history store, or None when history is off."""
+    if not path:
+        return None
+    store = HistoryStore(path)
+    os.register_at_fork(after_in_child=store._reset)
+    atexit.register(store.close)
+    return store
@@ -0,0 +1,408 @@
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+# ============================================================
+# COMPILED PIPELINE
+# ============================================================
+#
+# The saved SQI / PHI pipelines are ColumnTransformer(StandardScaler,
+# OneHotEncoder) -> XGBRegressor. For one row, most of the time goes into
+# building a DataFrame and into sklearn's input validation. Here the fitted
+# parameters are lifted out into plain arrays/dicts once (pipeline_spec),
+# and rows are encoded straight into a float32 buffer fed to
+# Booster.inplace_predict.
+
+
+class CompileError(ValueError):
+    """The pipeline uses a step the compiled encoder does not support."""
+
+
+def _column_names(pre, cols):
+    """ColumnTransformer column spec -> list of names."""
+    if isinstance(cols, slice) or (len(cols) and not isinstance(cols[0], str)):
+        return list(np.asarray(pre.feature_names_in_)[cols])
+    return list(cols)
+
+
+def pipeline_spec(pipeline):
+    """
+    The fitted preprocessing of a create_pipeline() pipeline as plain
+    JSON-able data: input feature order plus one block per transformer
+    ("num": columns/mean/scale, "cat": columns/categories, "raw": columns),
+    in output order.
+    """
+    pre = pipeline.named_steps["preprocessor"]
+    blocks = []
+
+    for name, trans, cols in pre.transformers_:
+        cols = _column_names(pre, cols)
+        if trans == "drop" or not cols:
+            continue
+
+        if trans == "passthrough":
+            blocks.append({"kind": "raw", "columns": cols})
+
+        elif type(trans).__name__ == "StandardScaler":
+            n = len(cols)
+            blocks.append({
+                "kind": "num",
+                "columns": cols,
+                "mean": (trans.mean_ if trans.with_mean else np.zeros(n)).tolist(),
+                "scale": (trans.scale_ if trans.with_std else np.ones(n)).tolist(),
+            })
+
+        elif type(trans).__name__ == "OneHotEncoder":
+            if getattr(trans, "drop_idx_", None) is not None or getattr(trans, "_infrequent_enabled", False):
+                raise CompileError("OneHotEncoder with drop/infrequent categories is not supported")
+            blocks.append({
+                "kind": "cat",
+                "columns": cols,
+                "categories": [cats.tolist() for cats in trans.categories_],
+            })
+
+        else:
+            raise CompileError(f"unsupported transformer {name!r}: {type(trans).__name__}")
+
+    return {"feature_names_in": list(pipeline.feature_names_in_), "blocks": blocks}
+
+
+def _iteration_range(regressor):
+    return (0, regressor.best_iteration + 1) if _has_best_iteration(regressor) else (0, 0)
+
+
+class CompiledPipeline:
+    """
+    Encoder + booster built from a pipeline_spec() and an XGBoost Booster,
+    either lifted out of a fitted pipeline (from_pipeline) or loaded from a
+    model bundle (utils/model_bundle.py).
+    """
+
+    def __init__(self, spec, booster, iteration_range=(0, 0)):
+        self.spec = spec
+        self.feature_names_in_ = list(spec["feature_names_in"])
+        self.numeric_columns = []
+        self.categorical_columns = []
+        self.passthrough_columns = []
+
+        means, scales = [], []
+        self.categories = {}      # column -> categories array (for introspection)
+        self._onehot = []         # (column, {value: output index})
+
+        offset = 0
+        blocks = []               # (kind, start, stop)
+
+        for block in spec["blocks"]:
+            kind, cols = block["kind"], list(block["columns"])
+
+            if kind == "raw":
+                blocks.append(("raw", offset, offset + len(cols)))
+                self.passthrough_columns.extend(cols)
+                offset += len(cols)
+
+            elif kind == "num":
+                n = len(cols)
+                means.append(np.asarray(block["mean"], dtype=np.float64))
+                scales.append(np.asarray(block["scale"], dtype=np.float64))
+                blocks.append(("num", offset, offset + n))
+                self.numeric_columns.extend(cols)
+                offset += n
+
+            elif kind == "cat":
+                start = offset
+                for col, cats in zip(cols, block["categories"]):
+                    # a column can appear in a second block (categories added by a refresh)
+                    self.categories[col] = np.concatenate(
+                        [self.categories.get(col, np.zeros(0, dtype=object)), np.asarray(cats, dtype=object)])
+                    self._onehot.append((col, {v: offset + i for i, v in enumerate(cats)}))
+                    offset += len(cats)
+                blocks.append(("cat", start, offset))
+                self.categorical_columns.extend(cols)
+
+            else:
+                raise CompileError(f"unknown block kind {kind!r}")
+
+        self.n_features = offset
+        self.blocks = blocks
+        self.mean = np.concatenate(means) if means else np.zeros(0)
+        self.scale = np.concatenate(scales) if scales else np.ones(0)
+
+        self._num_slice = self._block_slice("num")
+        self._raw_slice = self._block_slice("raw")
+
+        self.booster = booster
+        self._iteration_range = tuple(iteration_range)
+        self._local = threading.local()
+
+        if self.booster.num_features() != self.n_features:
+            raise CompileError(
+                f"encoder produces {self.n_features} features, booster expects {self.booster.num_features()}"
+            )
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        regressor = pipeline.named_steps["regressor"]
+        return cls(pipeline_spec(pipeline), regressor.get_booster(), _iteration_range(regressor))
+
+    def _block_slice(self, kind):
+        spans = [(a, b) for k, a, b in self.blocks if k == kind]
+        if not spans:
+            return slice(0, 0)
+        if len(spans) > 1:
+            raise CompileError(f"more than one {kind} block is not supported")
+        return slice(*spans[0])
+
+    # --------------------------------------------------------
+    # ENCODING
+    # --------------------------------------------------------
+
+    def _buffer(self):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = np.empty((1, self.n_features), dtype=np.float32)
+        return buf
+
+    def encode_into(self, record, out):
+        """Encodes one mapped model input dict into the 1-D float32 array `out`."""
+        out[:] = 0
+        if self.numeric_columns:
+            values = np.array([_num(record.get(c, 0)) for c in self.numeric_columns], dtype=np.float64)
+            out[self._num_slice] = (values - self.mean) / self.scale
+        if self.passthrough_columns:
+            out[self._raw_slice] = [_num(record.get(c, 0)) for c in self.passthrough_columns]
+        for col, index in self._onehot:
+            pos = index.get(record.get(col, 0))
+            if pos is not None:
+                out[pos] = 1.0
+        return out
+
+    def encode(self, record):
+        buf = self._buffer()
+        self.encode_into(record, buf[0])
+        return buf
+
+    def encode_many(self, records):
+        out = np.zeros((len(records), self.n_features), dtype=np.float32)
+        if self.numeric_columns:
+            values = np.array(
+                [[_num(r.get(c, 0)) for c in self.numeric_columns] for r in records],
+                dtype=np.float64,
+            ).reshape(len(records), len(self.numeric_columns))
+            out[:, self._num_slice] = (values - self.mean) / self.scale
+        if self.passthrough_columns:
+            out[:, self._raw_slice] = [[_num(r.get(c, 0)) for c in self.passthrough_columns] for r in records]
+        for col, index in self._onehot:
+            for i, r in enumerate(records):
+                pos = index.get(r.get(col, 0))
+                if pos is not None:
+                    out[i, pos] = 1.0
+        return out
+
+    def encode_columns(self, columns, n):
+        """
+        Encodes `n` rows given column-major (model column -> sequence of
+        values, e.g. request_schema.FeatureColumns.columns); same matrix as
+        encode_many on the equivalent records.
+        """
+        out = np.zeros((n, self.n_features), dtype=np.float32)
+        if self.numeric_columns:
+            values = np.zeros((n, len(self.numeric_columns)), dtype=np.float64)
+            for j, c in enumerate(self.numeric_columns):
+                if c in columns:
+                    values[:, j] = np.array(columns[c], dtype=np.float64)    # None -> NaN
+            out[:, self._num_slice] = (values - self.mean) / self.scale
+        if self.passthrough_columns:
+            raw = out[:, self._raw_slice]
+            for j, c in enumerate(self.passthrough_columns):
+                if c in columns:
+                    raw[:, j] = np.array(columns[c], dtype=np.float64)
+        rows = np.arange(n)
+        for col, index in self._onehot:
+            values = columns.get(col)
+            if values is None:
+                pos = index.get(0)
+                if pos is not None:
+                    out[:, pos] = 1.0
+                continue
+            hits = np.array([index.get(v, -1) for v in values], dtype=np.intp)
+            found = hits >= 0
+            out[rows[found], hits[found]] = 1.0
+        return out
+
+    # --------------------------------------------------------
+    # PREDICTION
+    # --------------------------------------------------------
+
+    def predict_encoded(self, X):
+        return self.booster.inplace_predict(X, iteration_range=self._iteration_range)
+
+    def predict(self, record):
+        return float(self.predict_encoded(self.encode(record))[0])
+
+    def predict_many(self, records):
+        if not records:
+            return np.zeros(0, dtype=np.float32)
+        return self.predict_encoded(self.encode_many(records))
+
+    def predict_columns(self, columns, n):
+        if not n:
+            return np.zeros(0, dtype=np.float32)
+        return self.predict_encoded(self.encode_columns(columns, n))
+
+    def same_encoding(self, other):
+        """True when `other` turns a record into exactly the same feature vector."""
+        return (
+            self.feature_names_in_ == other.feature_names_in_
+            and self.blocks == other.blocks
+            and self.numeric_columns == other.numeric_columns
+            and self.passthrough_columns == other.passthrough_columns
+            and np.array_equal(self.mean, other.mean)
+            and np.array_equal(self.scale, other.scale)
+            and [(c, sorted(i.items())) for c, i in self._onehot]
+            == [(c, sorted(i.items())) for c, i in other._onehot]
+        )
+
+    # --------------------------------------------------------
+    # PARITY
+    # --------------------------------------------------------
+
+    def probe_records(self, n=16):
+        """Synthetic rows covering every category, numerics around the training mean."""
+        rng = np.random.default_rng(0)
+        cols = self.numeric_columns
+        rows = []
+        for i in range(n):
+            row = {c: float(m + s * rng.normal()) for c, m, s in zip(cols, self.mean, self.scale)}
+            row.update({c: 0.0 for c in self.passthrough_columns})
+            for col, cats in self.categories.items():
+                row[col] = cats[i % len(cats)]
+            rows.append(row)
+        return rows
+
+    def max_abs_diff(self, pipeline, records=None):
+        """Largest |compiled - sklearn| over `records` (probe rows by default)."""
+        import pandas as pd
+
+        records = records or self.probe_records()
+        frame = pd.DataFrame(records)
+        for col in self.feature_names_in_:
+            if col not in frame.columns:
+                frame[col] = 0
+        expected = pipeline.predict(frame[self.feature_names_in_])
+        return float(np.max(np.abs(self.predict_many(records) - expected)))
+
+
+# ============================================================
+# JOINT PREDICTOR
+# ============================================================
+#
+# SQI and PHI come out of the same create_pipeline() with the same feature
+# lists, so when their fitted preprocessors match, a row only needs to be
+# encoded once and the same matrix can go to both boosters.
+
+
+class JointPredictor:
+    """
+    `names` label the models for the optional hooks: `timer(stage)` returns
+    a context manager wrapped around "encode" and "<name>_predict", and
+    `on_error(name, stage, exc)` is called for every model failure that is
+    turned into None. `encoder` (default: the first pipeline) does the
+    encoding, so the pipelines may be anything with predict_encoded(X),
+    e.g. the reduced-cost variants of utils/model_variants.py.
+    """
+
+    def __init__(self, pipelines, names=None, timer=None, on_error=None, encoder=None):
+        self.pipelines = list(pipelines)
+        self.encoder = encoder or self.pipelines[0]
+        self.names = list(names) if names else [f"model{i}" for i in range(len(self.pipelines))]
+        self.timer = timer or _no_timer
+        self.on_error = on_error
+        self._stages = [f"{n}_predict" for n in self.names]
+
+    def _failed(self, name, stage, exc):
+        if self.on_error is not None:
+            self.on_error(name, stage, exc)
+
+    def _run(self, X):
+        out = []
+        for name, stage, p in zip(self.names, self._stages, self.pipelines):
+            try:
+                with self.timer(stage):
+                    out.append(p.predict_encoded(X))
+            except Exception as e:
+                self._failed(name, "predict", e)
+                out.append(None)
+        return out
+
+    def predict(self, record):
+        """One value per model (None for a model that failed)."""
+        try:
+            with self.timer("encode"):
+                X = self.encoder.encode(record)
+        except Exception as e:
+            for name in self.names:
+                self._failed(name, "encode", e)
+            return [None] * len(self.pipelines)
+        return [None if y is None else float(y[0]) for y in self._run(X)]
+
+    def predict_many(self, records):
+        """One array per model (None for a model that failed). Encoding errors raise."""
+        with self.timer("encode"):
+            X = self.encoder.encode_many(records)
+        return self._run(X)
+
+    def predict_columns(self, columns, n):
+        """predict_many for a column-major batch (see CompiledPipeline.encode_columns)."""
+        with self.timer("encode"):
+            X = self.encoder.encode_columns(columns, n)
+        return self._run(X)
+
+
+def build_joint_predictor(*compiled, names=None, timer=None, on_error=None):
+    """JointPredictor when every compiled pipeline shares the first one's encoding, else None."""
+    if not compiled or any(c is None for c in compiled):
+        return None
+    if not all(compiled[0].same_encoding(c) for c in compiled[1:]):
+        return None
+    return JointPredictor(compiled, names=names, timer=timer, on_error=on_error)
+
+
+def set_booster_threads(pipeline, nthread):
+    """Caps the threads XGBoost uses per predict call for a fitted pipeline or a CompiledPipeline."""
+    if isinstance(pipeline, CompiledPipeline):
+        pipeline.booster.set_param("nthread", nthread)
+        return
+    regressor = pipeline.named_steps["regressor"]
+    regressor.set_params(n_jobs=nthread)
+    regressor.get_booster().set_param("nthread", nthread)
+
+
+def _has_best_iteration(regressor):
+    try:
+        return regressor.best_iteration is not None
+    except AttributeError:
+        return False
+
+
+def _no_timer(stage):
+    return nullcontext()
+
+
+def _num(v):
+    return np.nan if v is None else float(v)
+
+
+def compile_pipeline(pipeline, tolerance=1e-4):
+    """
+    Compiles `pipeline` and checks it against the sklearn path on probe rows.
+    Returns None when the pipeline can't be compiled or the outputs disagree,
+    so callers can keep using the sklearn pipeline.
+    """
+    try:
+        compiled = CompiledPipeline.from_pipeline(pipeline)
+        if compiled.max_abs_diff(pipeline) > tolerance:
+            return None
+        return compiled
+    except Exception:
+        return None
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+# ============================================================
+# LATENCY TIERS AND LOAD SHEDDING
+# ============================================================
+#
+# A model bundle can carry cheaper variants of its models (see
+# utils/model_variants.py), one per tier, most accurate first. A request
+# picks its tier with the X-CropSense-Model-Tier header or ?tier= (kiosks
+# that prefer speed ask for "small" or "linear"); the rest get
+# CROPSENSE_MODEL_TIER. TierController then sheds load: it keeps a moving
+# average of /get_recommendation latency and, while that is above
+# CROPSENSE_LATENCY_SLO_MS, moves every request one tier cheaper per
+# SHED_STEP_SECONDS. Once the average is back under RECOVER_FRACTION of
+# the SLO for RECOVER_SECONDS, it steps back up one tier at a time. State
+# is per process.
+
+TIERS = ("full", "lite", "small", "linear")
+
+# 0 = never shed
+LATENCY_SLO_MS = float(os.environ.get("CROPSENSE_LATENCY_SLO_MS", "250"))
+
+SMOOTHING = 0.2             # weight of the newest request in the moving average
+SHED_STEP_SECONDS = 1.0     # at most one step down per second, so each step can take effect
+RECOVER_FRACTION = 0.5
+RECOVER_SECONDS = 5.0
+
+
+class TierError(ValueError):
+    """A tier name that isn't one of TIERS."""
+
+
+def parse_tier(value, default=None):
+    """A tier name from a header / query string / env value; `default` (DEFAULT_TIER) when empty."""
+    if not value:
+        return default or DEFAULT_TIER
+    tier = value.strip().lower()
+    if tier not in TIERS:
+        raise TierError(f"unknown model tier {value!r} (expected one of {', '.join(TIERS)})")
+    return tier
+
+
+DEFAULT_TIER = parse_tier(os.environ.get("CROPSENSE_MODEL_TIER"), "full")
+
+
+class TierController:
+
+    def __init__(self, slo_ms=LATENCY_SLO_MS, smoothing=SMOOTHING, step_seconds=SHED_STEP_SECONDS,
+                 recover_fraction=RECOVER_FRACTION, recover_seconds=RECOVER_SECONDS):
+        self.slo = slo_ms / 1000.0
+        self.smoothing = smoothing
+        self.step_seconds = step_seconds
+        self.recover_fraction = recover_fraction
+        self.recover_seconds = recover_seconds
+        self.level = 0              # tiers every request is moved down by
+        self.latency = 0.0          # moving average, seconds
+        self.steps = {"down": 0, "up": 0}
+        self._changed = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Records one request's wall time and moves the shedding level if needed."""
+        if not self.slo:
+            return
+        with self._lock:
+            self.latency += self.smoothing * (seconds - self.latency)
+            now = time.monotonic()
+            if self.latency > self.slo:
+                if self.level < len(TIERS) - 1 and now - self._changed >= self.step_seconds:
+                    self.level += 1
+                    self.steps["down"] += 1
+                    self._changed = now
+            elif self.level and self.latency < self.slo * self.recover_fraction \
+                    and now - self._changed >= self.recover_seconds:
+                self.level -= 1
+                self.steps["up"] += 1
+                self._changed = now
+
+    def choose(self, available, requested="full"):
+        """
+        The tier to serve: `requested`, moved down by the shedding level,
+        then the first of `available` (in TIERS order) at least that cheap,
+        or the cheapest available one.
+        """
+        want = min(TIERS.index(requested) + self.level, len(TIERS) - 1)
+        for tier in available:
+            if TIERS.index(tier) >= want:
+                return tier
+        return available[-1]
@@ -0,0 +1,441 @@
+import atexit
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Directory shared by every worker of one server. Each process writes its
+# own snapshot there and /metrics sums them, so the numbers are the same
+# whichever worker answers. Unset = single process, nothing is written.
+METRICS_DIR = os.environ.get("CROPSENSE_METRICS_DIR") or None
+FLUSH_INTERVAL = float(os.environ.get("CROPSENSE_METRICS_FLUSH_SECONDS", "1"))
+
+# seconds; tuned for stages that take 10us..1s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================================
+# METRIC TYPES
+# ============================================================
+#
+# Hot-path cost is one dict lookup for .labels() (callers can keep the
+# child) plus a lock-protected add; nothing is formatted or written until
+# a snapshot is taken.
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def _reset(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        return self.value
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def _reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        return [list(self.counts), self.sum]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._child())
+                self._children[values] = child
+        return child
+
+    def _reset(self):
+        # children are reset in place: callers may hold on to them
+        self._lock = threading.Lock()
+        for child in self._children.values():
+            child._reset()
+
+    def _snapshot(self):
+        seen, samples = set(), []
+        for values, child in list(self._children.items()):
+            if id(child) in seen:
+                continue
+            seen.add(id(child))
+            samples.append([[str(v) for v in values], child._sample()])
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames), "samples": samples}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _snapshot(self):
+        snap = super()._snapshot()
+        snap["buckets"] = list(self.buckets)
+        return snap
+
+
+class CounterFunc:
+    """Counter whose values are read from `fn()` ({label values tuple: value}) at snapshot time."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames, fn):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def _reset(self):
+        pass
+
+    def _snapshot(self):
+        try:
+            values = self.fn() or {}
+        except Exception:
+            values = {}
+        samples = [[[str(v) for v in labels], float(value)] for labels, value in values.items()]
+        return {"type": self.kind, "help": self.help, "labelnames": list(self.labelnames), "samples": samples}
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+
+class Registry:
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    # ---------------- definition ----------------
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def counter_func(self, name, help, labelnames, fn):
+        return self._register(CounterFunc(name, help, labelnames, fn))
+
+    # ---------------- process lifecycle ----------------
+
+    def _after_fork(self):
+        # a forked worker starts from zero; the parent reports its own numbers
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        for metric in self._metrics.values():
+            metric._reset()
+
+    def ensure_flusher(self):
+        """Starts this process's background snapshot writer (no-op without a directory)."""
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    # ---------------- snapshots ----------------
+
+    def snapshot(self):
+        return {name: m._snapshot() for name, m in list(self._metrics.items())}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self):
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Snapshot summed over every process that wrote to the directory (or just this one)."""
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        with _DirectoryLock(self.directory):
+            _archive_dead(self.directory)
+            merged = {}
+            for fname in sorted(os.listdir(self.directory)):
+                if not fname.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, fname)) as f:
+                        _merge(merged, json.load(f)["metrics"])
+                except (OSError, ValueError, KeyError):
+                    continue
+        # metrics this process defines come first, in definition order
+        ordered = {name: merged.pop(name) for name in list(self._metrics) if name in merged}
+        ordered.update(merged)
+        return ordered
+
+    def render(self):
+        return render(self.collect())
+
+
+class _DirectoryLock:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ".lock")
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+        return False
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _archive_dead(directory):
+    """Folds snapshots of exited workers into archive.json so counters never go backwards."""
+    archive_path = os.path.join(directory, "archive.json")
+    dead = []
+    for fname in os.listdir(directory):
+        stem = fname[:-5]
+        if fname.endswith(".json") and stem.isdigit() and not _alive(int(stem)):
+            dead.append(os.path.join(directory, fname))
+    if not dead:
+        return
+
+    try:
+        with open(archive_path) as f:
+            archive = json.load(f)["metrics"]
+    except (OSError, ValueError, KeyError):
+        archive = {}
+    for path in dead:
+        try:
+            with open(path) as f:
+                _merge(archive, json.load(f)["metrics"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    tmp = f"{archive_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"pid": None, "metrics": archive}, f)
+    os.replace(tmp, archive_path)
+    for path in dead:
+        os.unlink(path)
+
+
+def _merge(into, metrics):
+    """Adds one process snapshot into `into` (counters and histograms both sum)."""
+    for name, snap in metrics.items():
+        target = into.get(name)
+        if target is None:
+            target = into[name] = dict(snap, samples=[])
+            target["_index"] = {}
+        index = target.setdefault("_index", {tuple(lbl): i for i, (lbl, _) in enumerate(target["samples"])})
+        for labels, value in snap["samples"]:
+            key = tuple(labels)
+            i = index.get(key)
+            if i is None:
+                index[key] = len(target["samples"])
+                target["samples"].append([labels, value if snap["type"] != "histogram"
+                                          else [list(value[0]), value[1]]])
+                continue
+            current = target["samples"][i][1]
+            if snap["type"] == "histogram":
+                current[0] = [a + b for a, b in zip(current[0], value[0])]
+                current[1] += value[1]
+            else:
+                target["samples"][i][1] = current + value
+    for snap in into.values():
+        snap.pop("_index", None)
+
+
+# ============================================================
+# PROMETHEUS TEXT FORMAT
+# ============================================================
+
+def _fmt(v):
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render(snapshot):
+    lines = []
+    for name, snap in snapshot.items():
+        lines.append(f"# HELP {name} {snap['help']}")
+        lines.append(f"# TYPE {name} {snap['type']}")
+        names = snap["labelnames"]
+        for values, value in sorted(snap["samples"], key=lambda s: s[0]):
+            if snap["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_fmt(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for le, c in zip(list(snap["buckets"]) + [math.inf], counts):
+                cumulative += c
+                le_label = 'le="%s"' % _fmt(le)
+                lines.append(f"{name}_bucket{_labels(names, values, [le_label])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {repr(float(total))}")
+            lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# PROCESS-WIDE REGISTRY
+# ============================================================
+
+REGISTRY = Registry()
+
+os.register_at_fork(after_in_child=REGISTRY._after_fork)
+atexit.register(lambda: REGISTRY.directory and REGISTRY.flush())
+
+# shared by every module that times a piece of request handling
+STAGE_SECONDS = REGISTRY.histogram(
+    "cropsense_stage_seconds",
+    "Time spent in each stage of request handling.",
+    ("stage",),
+)
+
+
+_STAGES = {}
+
+
+def stage_timer(stage):
+    """`with stage_timer("predict"): ...` observes into cropsense_stage_seconds."""
+    child = _STAGES.get(stage)
+    if child is None:
+        child = _STAGES[stage] = STAGE_SECONDS.labels(stage)
+    return _Timer(child)
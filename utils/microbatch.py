@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+MAX_BATCH = int(os.environ.get("CROPSENSE_BATCH_MAX_ROWS", "64"))
+MAX_WAIT_MS = float(os.environ.get("CROPSENSE_BATCH_MAX_WAIT_MS", "2"))
+
+
+# ============================================================
+# MICRO-BATCHER
+# ============================================================
+
+class MicroBatcher:
+    """
+    Collects rows submitted by concurrent request handlers and scores them
+    together. A batch is flushed when it reaches `max_batch` rows or when
+    the first row in it has waited `max_wait_ms`, whichever comes first.
+
+    The wait window only applies once traffic is concurrent (the previous
+    batch had more than one row); a lone request is scored immediately.
+    Rows that arrive while a batch is being scored queue up and form the
+    next batch on their own.
+
+    `predict_fn(rows)` must return one sequence per output (e.g. SQI and
+    PHI lists); it runs in a worker thread so the event loop stays free
+    while XGBoost works.
+    """
+
+    def __init__(self, predict_fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+        self._queue = None
+        self._task = None
+
+        # simple counters for the load-test harness / metrics
+        self.batches = 0
+        self.rows = 0
+        self._last_size = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, row):
+        """Queues one row and waits for its outputs (a tuple, one value per output)."""
+        if not self.running:
+            self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, fut))
+        return await fut
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        wait = self.max_wait if self._last_size > 1 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            # take whatever is already queued without waiting
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+            try:
+                outputs = await loop.run_in_executor(self.executor, self.predict_fn, rows)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(rows)
+            self._last_size = len(rows)
+            for i, (_, fut) in enumerate(batch):
+                if not fut.done():
+                    fut.set_result(tuple(out[i] for out in outputs))
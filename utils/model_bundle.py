@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import xgboost as xgb
+
+from utils.inference import CompiledPipeline
+from utils.load_shedding import TIERS
+from utils.model_variants import variant_predictor
+
+# ============================================================
+# MODEL BUNDLE
+# ============================================================
+#
+# A portable replacement for the joblib pickles:
+#
+#   <bundle>/manifest.json   format version, model version, library versions
+#                            and, per model, the preprocessing as plain data
+#                            (feature order, scaler mean/scale, one-hot
+#                            vocabularies -- see inference.pipeline_spec)
+#   <bundle>/SQI.ubj         XGBoost booster, native UBJSON format
+#   <bundle>/PHI.ubj
+#   <bundle>/SQI.small.ubj   optional reduced-cost variants' boosters; the
+#                            manifest lists each model's variants and their
+#                            accuracy-vs-latency curve (utils/model_variants.py)
+#
+# Loading needs neither sklearn nor unpickling and doesn't depend on the
+# library versions the models were trained with (XGBoost reads its own
+# model format across versions).
+
+BUNDLE_FORMAT = "cropsense-model-bundle"
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class BundleError(ValueError):
+    """Missing, corrupt or incompatible model bundle."""
+
+
+class ModelBundle:
+
+    def __init__(self, directory, manifest, models, variants=None):
+        self.directory = directory
+        self.manifest = manifest
+        self.models = models          # name -> CompiledPipeline
+        self.variants = variants or {}  # tier -> {name: predictor}, for tiers every model has
+        self.version = manifest.get("version")
+
+    def __getitem__(self, name):
+        return self.models[name]
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def has_bundle(directory):
+    return os.path.isfile(os.path.join(directory, MANIFEST))
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"no {MANIFEST} in {directory}")
+    except ValueError as e:
+        raise BundleError(f"unreadable {MANIFEST} in {directory}: {e}")
+
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{directory} is not a {BUNDLE_FORMAT}")
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(
+            f"bundle format version {manifest.get('format_version')} is not supported "
+            f"(expected {BUNDLE_FORMAT_VERSION})"
+        )
+    return manifest
+
+
+def _load_booster(directory, fname, sha256, verify):
+    path = os.path.join(directory, fname)
+    if verify and _sha256(path) != sha256:
+        raise BundleError(f"{path} does not match the checksum in {MANIFEST}")
+    booster = xgb.Booster()
+    booster.load_model(path)
+    return booster
+
+
+def load_bundle(directory, verify=True):
+    """
+    ModelBundle with one CompiledPipeline per model in the manifest and
+    the variants of manifest["tiers"]. verify=True checks every booster
+    file against its recorded sha256.
+    """
+    manifest = read_manifest(directory)
+    models, variants = {}, {}
+    tiers = [t for t in manifest.get("tiers", ()) if t != "full"]
+    for name, entry in manifest["models"].items():
+        booster = _load_booster(directory, entry["booster"], entry["sha256"], verify)
+        try:
+            models[name] = CompiledPipeline(entry["preprocessor"], booster, entry["iteration_range"])
+            for tier in tiers:
+                variant = entry["variants"][tier]
+                small = (_load_booster(directory, variant["booster"], variant["sha256"], verify)
+                         if "booster" in variant else None)
+                variants.setdefault(tier, {})[name] = variant_predictor(models[name], variant, small)
+        except (KeyError, ValueError) as e:
+            raise BundleError(f"model {name}: {e}")
+    return ModelBundle(directory, manifest, models, variants)
+
+
+def export_bundle(pipelines, directory, tolerance=1e-4, training=None, variants=None):
+    """
+    Writes {name: fitted pipeline or CompiledPipeline} as a bundle into
+    `directory`, replacing any bundle already there only once the new one
+    has been written and reloaded with predictions within `tolerance` of
+    the originals'. `training` (JSON-able) is stored in the manifest as is.
+    `variants` is {name: (variants, curve)} from model_variants.build_variants;
+    a tier is served only if every model has it. Returns the manifest.
+    """
+    try:
+        import sklearn
+        sklearn_version = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".bundle-", dir=parent)
+
+    try:
+        entries = {}
+        version = hashlib.sha256()
+        for name, pipeline in sorted(pipelines.items()):
+            compiled = pipeline if isinstance(pipeline, CompiledPipeline) else CompiledPipeline.from_pipeline(pipeline)
+            fname = f"{name}.ubj"
+            path = os.path.join(staging, fname)
+            compiled.booster.save_model(path)
+
+            entries[name] = {
+                "booster": fname,
+                "sha256": _sha256(path),
+                "iteration_range": list(compiled._iteration_range),
+                "num_features": compiled.n_features,
+                "preprocessor": compiled.spec,
+            }
+            version.update(entries[name]["sha256"].encode())
+            version.update(json.dumps(compiled.spec, sort_keys=True).encode())
+
+            if variants and name in variants:
+                tiers, curve = variants[name]
+                stored = {}
+                for tier, variant in sorted(tiers.items()):
+                    variant = dict(variant)
+                    booster = variant.pop("booster", None)
+                    if booster is not None:
+                        variant["booster"] = f"{name}.{tier}.ubj"
+                        booster.save_model(os.path.join(staging, variant["booster"]))
+                        variant["sha256"] = _sha256(os.path.join(staging, variant["booster"]))
+                    stored[tier] = variant
+                entries[name]["variants"] = stored
+                entries[name]["curve"] = curve
+                version.update(json.dumps(stored, sort_keys=True).encode())
+
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "version": version.hexdigest()[:12],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "trained_with": {"xgboost": xgb.__version__, "scikit-learn": sklearn_version},
+            "models": entries,
+            "tiers": [t for t in TIERS if t == "full" or all(t in e.get("variants", {}) for e in entries.values())],
+        }
+        if training is not None:
+            manifest["training"] = training
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        loaded = load_bundle(staging)
+        for name, pipeline in pipelines.items():
+            if isinstance(pipeline, CompiledPipeline):
+                probe = pipeline.probe_records()
+                diff = float(np.max(np.abs(loaded[name].predict_many(probe) - pipeline.predict_many(probe))))
+            else:
+                diff = loaded[name].max_abs_diff(pipeline)
+            if diff > tolerance:
+                raise BundleError(f"{name}: bundle predictions differ from the pipeline by {diff:.2e}")
+            for tier, predictors in loaded.variants.items():
+                variant = variants[name][0][tier]
+                if "booster" in variant:
+                    X = loaded[name].encode_many(loaded[name].probe_records())
+                    expected = variant["booster"].inplace_predict(X, iteration_range=tuple(variant["iteration_range"]))
+                    diff = float(np.max(np.abs(predictors[name].predict_encoded(X) - expected)))
+                    if diff > tolerance:
+                        raise BundleError(f"{name}: {tier} variant differs from its booster by {diff:.2e}")
+
+        os.chmod(staging, 0o755)
+
+        # swap in: the old bundle is only removed once the new one is in place
+        old = None
+        if os.path.exists(directory):
+            old = tempfile.mkdtemp(prefix=".bundle-old-", dir=parent)
+            os.rmdir(old)
+            os.rename(directory, old)
+        os.rename(staging, directory)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        return manifest
+
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
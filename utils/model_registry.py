@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import time
+
+# ============================================================
+# MODEL REGISTRY
+# ============================================================
+#
+# Versioned model bundles under one directory (models/ by default):
+#
+#   <root>/versions/<version>/   one bundle per model version (the version
+#                                is the bundle's content hash)
+#   <root>/CURRENT               the version to serve, one line
+#   <root>/HISTORY               activations, oldest first, "<unix time> <version>"
+#
+# Only the standard library at import time: app.py imports this module at
+# start-up, before the models (and numpy/xgboost) are loaded.
+#
+# Every change lands with a single os.replace() (a fully copied version
+# directory, a rewritten CURRENT), so readers see the old state or the new
+# one, never half of it. app.py polls CURRENT and swaps models in the
+# background; rolling back is pointing CURRENT at a version still on disk.
+
+# versions kept on disk (the current one always is)
+KEEP_VERSIONS = int(os.environ.get("CROPSENSE_MODEL_KEEP_VERSIONS", "5"))
+
+CURRENT = "CURRENT"
+HISTORY = "HISTORY"
+
+
+class RegistryError(ValueError):
+    """Unknown version, nothing to roll back to, or an unusable registry."""
+
+
+class ModelRegistry:
+
+    def __init__(self, root, keep=KEEP_VERSIONS):
+        self.root = root
+        self.keep = keep
+        self.versions_dir = os.path.join(root, "versions")
+
+    def path(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    # --------------------------------------------------------
+    # STATE
+    # --------------------------------------------------------
+
+    def current(self):
+        """The version CURRENT points at, or None."""
+        try:
+            with open(os.path.join(self.root, CURRENT)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def history(self):
+        """(unix time, version) per activation, oldest first."""
+        try:
+            with open(os.path.join(self.root, HISTORY)) as f:
+                entries = [line.split() for line in f]
+        except FileNotFoundError:
+            return []
+        return [(int(e[0]), e[1]) for e in entries if len(e) == 2 and e[0].isdigit()]
+
+    def versions(self):
+        """Versions on disk, the most recently published or activated last."""
+        from utils.model_bundle import has_bundle
+
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = [v for v in os.listdir(self.versions_dir)
+                 if not v.startswith(".") and has_bundle(self.path(v))]
+        activated = dict((v, t) for t, v in self.history())
+        return sorted(names, key=lambda v: (max(activated.get(v, 0), os.stat(self.path(v)).st_mtime), v))
+
+    def describe(self):
+        """One dict per version on disk (manifest summary, current flag), oldest first."""
+        from utils.model_bundle import read_manifest
+
+        current = self.current()
+        out = []
+        for version in self.versions():
+            manifest = read_manifest(self.path(version))
+            training = manifest.get("training") or {}
+            out.append({
+                "version": version,
+                "current": version == current,
+                "created_at": manifest.get("created_at"),
+                "refreshed_from": training.get("refreshed_from"),
+                "source": training.get("source"),
+            })
+        return out
+
+    # --------------------------------------------------------
+    # CHANGES
+    # --------------------------------------------------------
+
+    def publish(self, bundle_dir, activate=True):
+        """Copies the bundle in `bundle_dir` into versions/ (once); returns its version."""
+        from utils.model_bundle import has_bundle, read_manifest
+
+        version = read_manifest(bundle_dir)["version"]
+        target = self.path(version)
+        if not has_bundle(target):
+            os.makedirs(self.versions_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix=f".{version}-", dir=self.versions_dir)
+            try:
+                shutil.copytree(bundle_dir, staging, dirs_exist_ok=True)
+                os.chmod(staging, 0o755)
+                os.replace(staging, target)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        os.utime(target)
+        if activate:
+            self.activate(version)
+        self.prune()
+        return version
+
+    def activate(self, version):
+        """Points CURRENT at `version`; serving processes follow within their check interval."""
+        from utils.model_bundle import has_bundle, read_manifest
+
+        if not has_bundle(self.path(version)):
+            raise RegistryError(f"no version {version} in {self.versions_dir}")
+        read_manifest(self.path(version))
+        os.makedirs(self.root, exist_ok=True)
+
+        tmp = os.path.join(self.root, f".{CURRENT}.{os.getpid()}")
+        with open(tmp, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, os.path.join(self.root, CURRENT))
+        with open(os.path.join(self.root, HISTORY), "a") as f:
+            f.write(f"{int(time.time())} {version}\n")
+        return version
+
+    def rollback(self):
+        """Re-activates the version that was current before this one; returns it."""
+        from utils.model_bundle import has_bundle
+
+        current = self.current()
+        for _, version in reversed(self.history()):
+            if version != current and has_bundle(self.path(version)):
+                return self.activate(version)
+        raise RegistryError("no earlier version on disk to roll back to")
+
+    def prune(self, keep=None):
+        """Deletes all but the `keep` most recent versions (never CURRENT); returns the deleted ones."""
+        keep = self.keep if keep is None else keep
+        current = self.current()
+        versions = self.versions()
+        stale = [v for v in versions[:max(0, len(versions) - keep)] if v != current]
+        for version in stale:
+            shutil.rmtree(self.path(version), ignore_errors=True)
+        return stale
+
@@ -0,0 +1,318 @@
+import json
+import time
+
+import numpy as np
+import xgboost as xgb
+
+from utils.inference import CompiledPipeline
+
+# ============================================================
+# REDUCED-COST MODEL VARIANTS
+# ============================================================
+#
+# Next to each full booster a bundle can carry cheaper variants of the
+# same model, one per tier, cheapest last:
+#
+#   full     the booster as trained
+#   lite     the same booster truncated to its first rounds (iteration
+#            range): the fewest rounds whose held-out RMSE is at most
+#            LITE_RMSE_INCREASE worse than the full model's or, without
+#            labels, whose predictions stay within LITE_DEVIATION of it
+#   small    a depth-limited booster (SMALL_DEPTH, SMALL_ROUNDS): retrained
+#            on the labels when training, distilled from the full model's
+#            predictions when exporting existing models. Served by
+#            TreeTable, a numpy walk over all trees at once, so a row does
+#            not pay XGBoost's per-call overhead (batches over
+#            TABLE_MAX_ROWS, where XGBoost is faster, still go to the booster)
+#   linear   ridge regression on the encoded features (LinearPredictor)
+#
+# All variants read the same encoded matrix as the full model, so one
+# encode serves every tier. build_variants() also records each model's
+# accuracy-vs-latency curve: the full model, the truncation points and
+# every variant with its error (against the labels when there are any, and
+# against the full model) and its predict time per row, single and
+# batched. The curve is stored in the bundle manifest.
+
+LITE_RMSE_INCREASE = 0.02      # lite with labels: RMSE <= full RMSE x (1 + this)
+LITE_DEVIATION = 0.2           # lite without: RMSE vs the full model <= this x std of its predictions
+SMALL_DEPTH = 3
+SMALL_ROUNDS = 60
+LINEAR_RIDGE = 1.0
+CURVE_POINTS = 10             # truncation points on the curve
+DISTILL_ROWS = 20000          # synthetic rows when distilling without training data
+LATENCY_ROWS = 256
+TABLE_MAX_ROWS = 32           # larger batches: the small booster itself, not TreeTable
+
+
+class TreeTable:
+    """
+    A booster's trees as dense arrays, padded to a full binary tree of
+    depth `depth` (a leaf above the bottom repeats its value below), so
+    prediction is `depth` vectorized steps over every tree. Split semantics
+    follow XGBoost: go left when x < threshold, missing values follow the
+    node's default direction. With `booster`, batches over TABLE_MAX_ROWS
+    are predicted by it instead.
+    """
+
+    def __init__(self, feature, threshold, default_left, leaf, base_score, booster=None, iteration_range=(0, 0)):
+        self.feature = np.asarray(feature, dtype=np.intp)           # (trees, 2^depth - 1)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.leaf = np.asarray(leaf, dtype=np.float32)              # (trees, 2^depth)
+        self.base_score = np.float32(base_score)
+        self.depth = int(np.log2(self.leaf.shape[1])) if self.leaf.size else 0
+        self.booster = booster
+        self.iteration_range = tuple(iteration_range)
+
+        # flat copies: node (t, pos) is t * internal + pos, leaf (t, i) is t * leaves + i
+        internal = self.feature.shape[1]
+        self._feature = self.feature.ravel()
+        self._threshold = self.threshold.ravel()
+        self._default_left = self.default_left.ravel()
+        self._leaf = self.leaf.ravel()
+        self._node_offset = np.arange(self.leaf.shape[0]) * internal
+        self._leaf_offset = np.arange(self.leaf.shape[0]) * self.leaf.shape[1] - internal
+
+    @classmethod
+    def from_booster(cls, booster, iteration_range=(0, 0)):
+        model = json.loads(booster.save_raw("json"))["learner"]
+        base_score = float(model["learner_model_param"]["base_score"])
+        trees = model["gradient_booster"]["model"]["trees"]
+        start, stop = iteration_range
+        trees = trees[start:stop or len(trees)]
+
+        def node_depth(tree, node=0):
+            left = tree["left_children"][node]
+            if left == -1:
+                return 0
+            return 1 + max(node_depth(tree, left), node_depth(tree, tree["right_children"][node]))
+
+        depth = max((node_depth(t) for t in trees), default=0)
+        internal, leaves = 2 ** depth - 1, 2 ** depth
+        feature = np.zeros((len(trees), internal), dtype=np.intp)
+        threshold = np.full((len(trees), internal), np.inf, dtype=np.float32)
+        default_left = np.ones((len(trees), internal), dtype=bool)
+        leaf = np.zeros((len(trees), leaves), dtype=np.float32)
+
+        for t, tree in enumerate(trees):
+            stack = [(0, 0, 0)]                     # (xgboost node, heap position, level)
+            while stack:
+                node, pos, level = stack.pop()
+                left = tree["left_children"][node]
+                if left == -1:
+                    # pad: every heap leaf under this position gets the value
+                    span = 2 ** (depth - level)
+                    first = (pos - (2 ** level - 1)) * span
+                    leaf[t, first:first + span] = tree["split_conditions"][node]
+                    continue
+                feature[t, pos] = tree["split_indices"][node]
+                threshold[t, pos] = tree["split_conditions"][node]
+                default_left[t, pos] = bool(tree["default_left"][node])
+                stack.append((left, 2 * pos + 1, level + 1))
+                stack.append((tree["right_children"][node], 2 * pos + 2, level + 1))
+        return cls(feature, threshold, default_left, leaf, base_score, booster, iteration_range)
+
+    def predict_encoded(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n, n_features = X.shape
+        if self.booster is not None and n > TABLE_MAX_ROWS:
+            return self.booster.inplace_predict(X, iteration_range=self.iteration_range)
+        if not self.leaf.size:
+            return np.full(n, self.base_score, dtype=np.float32)
+        flat = X.ravel()
+        row_offset = (np.arange(n) * n_features)[:, None]
+        missing = np.isnan(flat).any()
+        node = np.broadcast_to(self._node_offset, (n, len(self._node_offset)))
+        pos = np.zeros(node.shape, dtype=np.intp)
+        for _ in range(self.depth):
+            at = node + pos
+            x = flat.take(row_offset + self._feature.take(at))
+            left = x < self._threshold.take(at)
+            if missing:
+                left |= np.isnan(x) & self._default_left.take(at)
+            pos = 2 * pos + 2 - left
+        return self._leaf.take(self._leaf_offset + pos).sum(axis=1, dtype=np.float32) + self.base_score
+
+
+class LinearPredictor:
+    """X @ coef + intercept on the encoded features; missing numerics count as the training mean (0)."""
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.float32(intercept)
+
+    def predict_encoded(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if np.isnan(X).any():
+            X = np.where(np.isnan(X), np.float32(0), X)
+        return X @ self.coef + self.intercept
+
+    def to_spec(self):
+        return {"coef": [float(c) for c in self.coef], "intercept": float(self.intercept)}
+
+
+def fit_linear(batches, n_features, ridge=LINEAR_RIDGE):
+    """
+    Ridge regression from (X, y) batches, accumulated chunk by chunk
+    (normal equations), so the rows never have to fit in memory at once.
+    """
+    xtx = np.zeros((n_features + 1, n_features + 1))
+    xty = np.zeros(n_features + 1)
+    for X, y in batches:
+        X = np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0)
+        X = np.hstack([X, np.ones((len(X), 1))])
+        xtx += X.T @ X
+        xty += X.T @ np.asarray(y, dtype=np.float64)
+    penalty = np.full(n_features + 1, ridge)
+    penalty[-1] = 0.0                              # the intercept isn't shrunk
+    w = np.linalg.solve(xtx + np.diag(penalty), xty)
+    return LinearPredictor(w[:-1], w[-1])
+
+
+def train_small(dtrain, params, dvalid=None, depth=SMALL_DEPTH, rounds=SMALL_ROUNDS, early_stopping=10):
+    """Depth-limited booster on `dtrain` (labels or a teacher's predictions); returns (booster, iteration_range)."""
+    params = {**params, "max_depth": depth, "eval_metric": "rmse"}
+    evals = [(dvalid, "valid")] if dvalid is not None and dvalid.num_row() else []
+    booster = xgb.train(params, dtrain, num_boost_round=rounds, evals=evals,
+                        early_stopping_rounds=early_stopping if evals else None, verbose_eval=False)
+    best = getattr(booster, "best_iteration", None)
+    iteration_range = (0, best + 1) if evals and best is not None else (0, 0)
+    return booster, iteration_range
+
+
+def synthetic_matrix(spec, n, seed=0):
+    """
+    Encoded rows spread like the training data: standardized numerics
+    ~ N(0, 1), one category per categorical column. Used to distill
+    variants from a model when no training data is at hand.
+    """
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for block in spec["blocks"]:
+        if block["kind"] == "num":
+            blocks.append(rng.standard_normal((n, len(block["columns"]))))
+        elif block["kind"] == "raw":
+            blocks.append(np.zeros((n, len(block["columns"]))))
+        else:
+            for cats in block["categories"]:
+                onehot = np.zeros((n, len(cats)))
+                if len(cats):
+                    onehot[np.arange(n), rng.integers(0, len(cats), n)] = 1.0
+                blocks.append(onehot)
+    return np.hstack(blocks).astype(np.float32) if blocks else np.zeros((n, 0), dtype=np.float32)
+
+
+# ============================================================
+# ACCURACY VS LATENCY
+# ============================================================
+
+def _latency(predict, X):
+    """(single-row, batched) predict microseconds per row."""
+    rows = X[:LATENCY_ROWS]
+    if not len(rows):
+        return None, None
+    start = time.perf_counter()
+    for i in range(len(rows)):
+        predict(rows[i:i + 1])
+    single = (time.perf_counter() - start) / len(rows)
+    start = time.perf_counter()
+    predict(rows)
+    batch = (time.perf_counter() - start) / len(rows)
+    return round(single * 1e6, 2), round(batch * 1e6, 3)
+
+
+def _errors(pred, y, reference):
+    out = {"deviation_rmse": float(np.sqrt(np.mean((pred - reference) ** 2)))}
+    if y is not None:
+        out["rmse"] = float(np.sqrt(np.mean((pred - y) ** 2)))
+        out["mae"] = float(np.mean(np.abs(pred - y)))
+    return out
+
+
+def build_variants(booster, iteration_range, dtrain, fit_batches, X_eval, y_eval=None, params=None,
+                   n_features=None, dvalid=None):
+    """
+    Variants of one model and its accuracy-vs-latency curve.
+
+    `dtrain` trains the small booster (early-stopped on `dvalid` if given)
+    and `fit_batches()` yields (X, y) batches for the linear fit: the training data, or teacher-labelled
+    synthetic rows when distilling. `X_eval` / `y_eval` are held-out
+    encoded rows and labels (None: error against the full model only).
+    Returns ({tier: variant}, curve); a variant is {"kind": "truncated",
+    "iteration_range"}, {"kind": "trees", "booster", "iteration_range"}
+    or {"kind": "linear", "coef", "intercept"}.
+    """
+    params = {"objective": "reg:squarederror", "tree_method": "hist", "eta": 0.3, **(params or {})}
+    n_features = n_features or X_eval.shape[1]
+    X_eval = np.asarray(X_eval, dtype=np.float32)
+    rounds = iteration_range[1] or booster.num_boosted_rounds()
+    full = booster.inplace_predict(X_eval, iteration_range=(0, rounds)).astype(np.float64)
+    spread = float(np.std(full)) or 1.0
+
+    def point(tier, predict, **info):
+        single, batch = _latency(predict, X_eval)
+        pred = predict(X_eval).astype(np.float64)
+        return {"tier": tier, **info, **_errors(pred, y_eval, full),
+                "predict_us_per_row": single, "batch_us_per_row": batch}
+
+    curve = [point("full", lambda X: booster.inplace_predict(X, iteration_range=(0, rounds)), rounds=rounds)]
+    if y_eval is not None:
+        measure, limit = "rmse", curve[0]["rmse"] * (1 + LITE_RMSE_INCREASE)
+    else:
+        measure, limit = "deviation_rmse", LITE_DEVIATION * spread
+
+    # truncation points ("truncated"); lite is the shortest one within tolerance
+    lite = None
+    for k in sorted({max(1, round(rounds * i / CURVE_POINTS)) for i in range(1, CURVE_POINTS)}):
+        p = point("truncated", lambda X, k=k: booster.inplace_predict(X, iteration_range=(0, k)), rounds=k)
+        curve.append(p)
+        if lite is None and p[measure] <= limit:
+            lite = k
+
+    variants = {}
+    if lite is not None:
+        variants["lite"] = {"kind": "truncated", "iteration_range": [0, lite]}
+        next(p for p in curve if p["tier"] == "truncated" and p["rounds"] == lite)["tier"] = "lite"
+
+    small, small_range = train_small(dtrain, params, dvalid)
+    table = TreeTable.from_booster(small, small_range)
+    variants["small"] = {"kind": "trees", "booster": small, "iteration_range": list(small_range),
+                         "max_depth": SMALL_DEPTH}
+    curve.append(point("small", table.predict_encoded, rounds=small_range[1] or small.num_boosted_rounds(),
+                       max_depth=SMALL_DEPTH))
+
+    linear = fit_linear(fit_batches(), n_features)
+    variants["linear"] = {"kind": "linear", **linear.to_spec()}
+    curve.append(point("linear", linear.predict_encoded))
+    return variants, curve
+
+
+def distill_variants(compiled, rows=DISTILL_ROWS, seed=0, nthread=None):
+    """
+    build_variants() for a model without its training data: the small and
+    linear variants learn the full model's predictions on synthetic rows
+    (synthetic_matrix), and the curve is measured on a second sample.
+    """
+    rounds = compiled._iteration_range[1] or compiled.booster.num_boosted_rounds()
+    X = synthetic_matrix(compiled.spec, rows, seed)
+    teacher = compiled.booster.inplace_predict(X, iteration_range=(0, rounds))
+    X_eval = synthetic_matrix(compiled.spec, max(1000, rows // 5), seed + 1)
+    params = {"seed": seed}
+    if nthread:
+        params["nthread"] = nthread
+    return build_variants(
+        compiled.booster, (0, rounds), xgb.DMatrix(X, label=teacher),
+        lambda: [(X, teacher)], X_eval, params=params, n_features=compiled.n_features,
+    )
+
+
+def variant_predictor(compiled, variant, booster=None):
+    """The object that serves `variant` of `compiled`: something with predict_encoded(X)."""
+    kind = variant["kind"]
+    if kind == "truncated":
+        return CompiledPipeline(compiled.spec, compiled.booster, variant["iteration_range"])
+    if kind == "trees":
+        return TreeTable.from_booster(booster, variant["iteration_range"])
+    if kind == "linear":
+        return LinearPredictor(variant["coef"], variant["intercept"])
+    raise ValueError(f"unknown model variant kind {kind!r}")
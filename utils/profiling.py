@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+# Per-request profiling is only honoured when this is on.
+PROFILING_ENABLED = os.environ.get("CROPSENSE_PROFILING", "").lower() in ("1", "true", "on", "yes")
+PROFILE_DIR = os.environ.get("CROPSENSE_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "cropsense-profiles")
+PROFILE_INTERVAL_MS = float(os.environ.get("CROPSENSE_PROFILE_INTERVAL_MS", "0.5"))
+
+PROFILE_HEADER = "X-CropSense-Profile"
+
+
+# ============================================================
+# SAMPLING PROFILER
+# ============================================================
+
+# The switch interval is process-wide and profiled requests overlap: the
+# first profiler to start saves it, the last one to stop restores it.
+_SWITCH_LOCK = threading.Lock()
+_switch_users = 0
+_switch_saved = None
+
+
+def _lower_switch_interval(interval):
+    global _switch_users, _switch_saved
+    with _SWITCH_LOCK:
+        if _switch_users == 0:
+            _switch_saved = sys.getswitchinterval()
+        _switch_users += 1
+        sys.setswitchinterval(min(sys.getswitchinterval(), interval))
+
+
+def _restore_switch_interval():
+    global _switch_users, _switch_saved
+    with _SWITCH_LOCK:
+        _switch_users -= 1
+        if _switch_users == 0:
+            sys.setswitchinterval(_switch_saved)
+            _switch_saved = None
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread every `interval_ms` from a
+    helper thread and counts identical stacks. Output is the "folded"
+    format (`outer;inner;leaf count` per line) that flamegraph.pl and
+    speedscope read.
+
+    The sampler needs the GIL to look at the other thread, so while it
+    runs the interpreter switch interval is lowered to the sampling
+    interval (process-wide; restored when the last running profiler
+    stops). stop() may be called more than once.
+    """
+
+    def __init__(self, thread_id=None, interval_ms=PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = max(0.0001, interval_ms / 1000.0)
+        self.stacks = Counter()
+        self.samples = 0
+        self._running = False
+        self._thread = None
+        self._lowered = False
+
+    def start(self):
+        self._running = True
+        _lower_switch_interval(self.interval)
+        self._lowered = True
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._lowered:
+            self._lowered = False
+            _restore_switch_interval()
+        return self
+
+    def _loop(self):
+        me = threading.get_ident()
+        while self._running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self.thread_id != me:
+                self.stacks[_stack(frame)] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, name, directory=PROFILE_DIR):
+        """Writes the folded stacks to `directory`; returns the file path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{os.getpid()}-{time.time_ns()}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+def _stack(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def profile_requested(headers, args):
+    """True when profiling is enabled and the request asked for it (header or ?profile=1)."""
+    if not PROFILING_ENABLED:
+        return False
+    flag = headers.get(PROFILE_HEADER) or args.get("profile") or ""
+    return flag.lower() in ("1", "true", "on", "yes")
@@ -0,0 +1,268 @@
+import logging
+import os
+import threading
+import time
+
+from utils.metrics import REGISTRY, stage_timer
+
+log = logging.getLogger(__name__)
+
+# ============================================================
+# PATHS
+# ============================================================
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+REFERENCE_FILES = {
+    "thresholds": "soil_nutrient_thresholds.csv",
+    "crop_req": "crop_nutrient_requirement.csv",
+    "treatments": "treatment_recommendations.csv",
+    "pest_actions": "pest_disease_control.csv",
+    "symptom_map": "symptom_conditions.csv",
+}
+
+# Seconds between mtime checks done by get_reference_store(); 0 disables them.
+CHECK_INTERVAL = float(os.environ.get("CROPSENSE_REFERENCE_CHECK_SECONDS", "30"))
+
+REFERENCE_LOADS = REGISTRY.counter(
+    "cropsense_reference_loads_total",
+    "Reference CSV reads (first load and reloads after a file changed).",
+    ("table",),
+)
+
+
+# ============================================================
+# ALIASES
+# ============================================================
+
+# The engine names deficiencies by nutrient symbol / soil issue, while
+# treatment_recommendations.csv uses full names.
+DEFICIENCY_ALIASES = {
+    "N": "Nitrogen",
+    "P": "Phosphorus",
+    "K": "Potassium",
+    "S": "Sulphur",
+    "Zn": "Zinc",
+    "Fe": "Iron",
+    "B": "Boron",
+    "Mn": "Manganese",
+    "Cu": "Copper",
+    "High_Salinity": "EC High",
+}
+
+
+def level_key(value):
+    # symptom levels, spelled alike in symptom_conditions.csv and requests:
+    # "No Damage", "no_damage", "NoDamage" -> "nodamage"
+    return str(value).lower().replace(" ", "").replace("_", "").replace("-", "")
+
+
+# ============================================================
+# CSV LOADING
+# ============================================================
+
+def safe_read_csv(path):
+    """Reads CSV safely without errors argument."""
+    import pandas as pd
+
+    try:
+        return pd.read_csv(path, encoding="utf-8")
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="latin1")
+
+
+def _records(df):
+    """DataFrame -> list of plain dicts with NaN turned into None."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _threshold_index(thr):
+    """
+    (crop, nutrient) -> (low, opt_min, opt_max, high).
+
+    Supports the per-crop layout (Crop_Name, Low_Critical, Optimal_Min,
+    Optimal_Max, High_Critical) and the generic layout shipped in data/
+    (N_kg_ha, Ideal_Min, Ideal_Max, Mild_Deficiency_Limit, ...), which has
+    no upper critical limit.
+    """
+    index = {}
+
+    if "Low_Critical" in thr.columns:
+        for r in _records(thr):
+            crop = str(r.get("Crop_Name") or "generic").lower()
+            index.setdefault((crop, r["Nutrient"]), (
+                float(r["Low_Critical"]), float(r["Optimal_Min"]),
+                float(r["Optimal_Max"]), float(r["High_Critical"]),
+            ))
+        return index
+
+    for r in _records(thr):
+        nutrient = str(r["Nutrient"]).split("_")[0]
+        index.setdefault(("generic", nutrient), (
+            float(r["Mild_Deficiency_Limit"]), float(r["Ideal_Min"]),
+            float(r["Ideal_Max"]), float("inf"),
+        ))
+    return index
+
+
+def _treatment_index(treatments):
+    """deficiency -> first matching treatment row (as a dict)."""
+    index = {}
+    for r in _records(treatments):
+        index.setdefault(r["Deficiency"], r)
+    for short, full in DEFICIENCY_ALIASES.items():
+        if full in index:
+            index.setdefault(short, index[full])
+    return index
+
+
+def _days(value):
+    """Whole days from a CSV cell, None when missing or not a plausible day count."""
+    try:
+        days = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(days) if 0 <= days <= 365 else None
+
+
+def _control_action(r):
+    """pest_disease_control row -> the fields the treatment engine ranks and reports."""
+    control = str(r.get("Control_Type") or "")
+    return {
+        "Symptom": r["Symptom"],
+        "Condition": r["Condition"],
+        "Kind": "Disease" if "fungicide" in control.lower() else "Pest",
+        "Control_Type": control,
+        "Product": r.get("Recommended_Product"),
+        "Dose": r.get("Dose_per_Acre"),
+        "Interval_Days": _days(r.get("Interval_Days")),
+        "Interval_Max_Days": _days(r.get("Interval_Max_Days")),
+        "PHI_Days": _days(r.get("PHI_Days")),
+        # visible pest / disease damage is acted on at any stage
+        "Stage_Priority": "High",
+    }
+
+
+def _symptom_index(symptom_map, pest_actions):
+    """
+    (symptom field, level_key) -> (control action, severity), from
+    symptom_conditions.csv (Field, Level, Condition, Severity) joined to
+    the pest table's Condition column. Rows naming a condition the pest
+    table lacks are logged and left out.
+    """
+    actions = {}
+    for r in _records(pest_actions):
+        actions.setdefault(r["Condition"], r)
+    index = {}
+    for r in _records(symptom_map):
+        condition = r["Condition"]
+        if condition not in actions:
+            log.warning("symptom %s=%s maps to %r, which pest_disease_control.csv has no row for",
+                        r["Field"], r["Level"], condition)
+            continue
+        index.setdefault((r["Field"], level_key(r["Level"])), (_control_action(actions[condition]), int(r["Severity"])))
+    return index
+
+
+# ============================================================
+# STORE
+# ============================================================
+
+class ReferenceStore:
+    """
+    Reference CSVs loaded once from data/ with dict indexes built on top,
+    so the treatment engine never touches pandas per request.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.version = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _paths(self):
+        return {name: os.path.join(self.data_dir, fname) for name, fname in REFERENCE_FILES.items()}
+
+    def _mtimes(self):
+        out = {}
+        for name, path in self._paths().items():
+            try:
+                out[name] = os.stat(path).st_mtime_ns
+            except OSError:
+                out[name] = None
+        return out
+
+    def load(self):
+        with stage_timer("reference_load"):
+            mtimes = self._mtimes()
+            tables = {name: safe_read_csv(path) for name, path in self._paths().items()}
+
+            thresholds = _threshold_index(tables["thresholds"])
+            treatments = _treatment_index(tables["treatments"])
+            symptoms = _symptom_index(tables["symptom_map"], tables["pest_actions"])
+            symptom_fields = tuple(dict.fromkeys(field for field, _ in symptoms))
+        for name in tables:
+            REFERENCE_LOADS.labels(name).inc()
+
+        # indexes are fully built before anything is replaced
+        with self._lock:
+            self.tables = tables
+            self.thresholds = thresholds
+            self.treatments = treatments
+            self.symptoms = symptoms
+            self.symptom_fields = symptom_fields
+            self.mtimes = mtimes
+            self.version += 1
+        self._last_check = time.monotonic()
+
+    def changed(self):
+        return self._mtimes() != self.mtimes
+
+    def reload_if_changed(self):
+        """Reloads when any CSV mtime moved. Returns True if it reloaded."""
+        self._last_check = time.monotonic()
+        if not self.changed():
+            return False
+        self.load()
+        return True
+
+    def maybe_reload(self, interval=CHECK_INTERVAL):
+        if interval and time.monotonic() - self._last_check >= interval:
+            return self.reload_if_changed()
+        return False
+
+    # --------------------------------------------------------
+    # LOOKUPS
+    # --------------------------------------------------------
+
+    def threshold(self, crop, nutrient):
+        """(low, opt_min, opt_max, high) for the crop, else the generic row, else None."""
+        key = (str(crop).lower(), nutrient)
+        t = self.thresholds.get(key)
+        if t is None:
+            t = self.thresholds.get(("generic", nutrient))
+        return t
+
+    def treatment(self, deficiency):
+        return self.treatments.get(deficiency)
+
+    def symptom(self, field, level):
+        """(control action, severity) for a symptom field's level_key(), or None."""
+        return self.symptoms.get((field, level))
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_reference_store():
+    """Process-wide store, created on first use and refreshed when the CSVs change."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = ReferenceStore()
+    else:
+        _STORE.maybe_reload()
+    return _STORE
@@ -0,0 +1,312 @@
+import math
+from collections.abc import Mapping
+
+# ============================================================
+# REQUEST SCHEMA
+# ============================================================
+#
+# A /get_recommendation payload (or a survey row) becomes a model input
+# through a declarative list of Fields: form key, model column, type,
+# default and, optionally, the allowed values. RequestDecoder compiles the
+# list once into flat (key, position, type, cast) steps, so decoding is a
+# single pass over them that fills a value array. Every bad value is
+# collected before a SchemaError is raised, so a client sees all of them
+# at once.
+#
+# decode() returns a FeatureRecord: the value array behind a mapping
+# interface (get / [] / items) over a shared column index, no per-record
+# dict. decode_many() and decode_columns() decode a batch straight into a
+# FeatureColumns buffer, one list per model column, which
+# CompiledPipeline.encode_columns() turns into a matrix without going
+# through rows.
+
+# values that count as "not given" (what the web form sends for empty inputs)
+MISSING = (None, "", "undefined")
+
+_UNSET = object()
+
+
+class SchemaError(ValueError):
+    """One or more payload values that don't fit the schema; `errors` lists them all."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{e['field']}: {e['message']}" if e["field"] else e["message"] for e in errors))
+
+
+class Field:
+    """
+    One model column. `key` is the payload field it is read from (None for
+    columns that are never sent, e.g. the soil defaults); `derive` is
+    (source column, function) for a column computed from another one when
+    it isn't given.
+    """
+
+    __slots__ = ("key", "column", "type", "default", "choices", "derive")
+
+    def __init__(self, key, column, type=str, default=None, choices=None, derive=None):
+        if type not in (str, int, float):
+            raise ValueError(f"{column}: unsupported field type {type!r}")
+        self.key = key
+        self.column = column
+        self.type = type
+        self.default = default
+        self.choices = tuple(choices) if choices else None
+        self.derive = derive
+
+
+def _str_cast(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(f"expected a string, got {value!r}")
+
+
+def _int_cast(value):
+    # JSON 1e400 parses to inf: int() raises OverflowError for it
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"expected an integer, got {value!r}")
+
+
+def _float_cast(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"expected a number, got {value!r}")
+    if not math.isfinite(number):
+        raise ValueError(f"expected a finite number, got {value!r}")
+    return number
+
+
+def _text_int_cast(value):
+    # survey files arrive as text: "28.5" is read the way the JSON number
+    # 28.5 would be, not rejected by int()
+    if isinstance(value, str):
+        value = _float_cast(value)
+    return _int_cast(value)
+
+
+def _choice_cast(choices):
+    # case-insensitive, normalized to the schema's spelling
+    allowed = {c.lower(): c for c in choices}
+    message = "expected one of " + ", ".join(choices)
+
+    def cast(value):
+        choice = allowed.get(str(value).lower()) if isinstance(value, str) else None
+        if choice is None:
+            raise ValueError(f"{message}, got {value!r}")
+        return choice
+    return cast
+
+
+_CASTS = {str: _str_cast, int: _int_cast, float: _float_cast}
+
+# form fields read from files (see with_model_columns), where every value is text
+_TEXT_CASTS = {str: _str_cast, int: _text_int_cast, float: _float_cast}
+
+# survey columns named after the model column: categoricals as text, the rest as floats
+_COLUMN_CASTS = {str: str, int: _float_cast, float: _float_cast}
+
+
+class FeatureRecord(Mapping):
+    """One decoded model input: the values in schema column order plus the shared column index."""
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, column):
+        return self._values[self._index[column]]
+
+    def get(self, column, default=None):
+        pos = self._index.get(column)
+        return default if pos is None else self._values[pos]
+
+    def __setitem__(self, column, value):
+        self._values[self._index[column]] = value
+
+    def __contains__(self, column):
+        return column in self._index
+
+    # the Mapping defaults go through __getitem__ per column
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return tuple(self._values)
+
+    def items(self):
+        return dict(zip(self._index, self._values)).items()
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"FeatureRecord({dict(self.items())!r})"
+
+
+class FeatureColumns:
+    """
+    A decoded batch, column-major: `columns` maps each model column to a
+    list of values, `positions` gives each row's index in the input.
+    Iterating yields FeatureRecords.
+    """
+
+    __slots__ = ("_index", "columns", "positions")
+
+    def __init__(self, index, columns, positions):
+        self._index = index
+        self.columns = columns
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        index = self._index
+        for values in zip(*self.columns.values()):
+            yield FeatureRecord(index, list(values))
+
+    def record(self, i):
+        return FeatureRecord(self._index, [values[i] for values in self.columns.values()])
+
+
+class RequestDecoder:
+    """
+    Compiled form of a Field list. With `model_columns`, payloads may also
+    carry those model columns under their own names (Crop_Name,
+    Available_N_Kg_Ha, ...); those win over the form fields and defaults.
+    """
+
+    def __init__(self, fields, model_columns=(), casts=_CASTS):
+        self.fields = list(fields)
+        self.columns = [f.column for f in self.fields]
+        self.index = {c: i for i, c in enumerate(self.columns)}
+        if len(self.index) != len(self.columns):
+            raise ValueError("duplicate model column in schema")
+
+        self._defaults = []
+        self._steps = []           # (payload key, position, type, cast, form field name)
+        self._derived = []         # (position, source position, function)
+        overrides = []
+        for pos, f in enumerate(self.fields):
+            self._defaults.append(_UNSET if f.derive else f.default)
+            if f.key is not None:
+                if f.choices:
+                    self._steps.append((f.key, pos, None, _choice_cast(f.choices), f.key))
+                else:
+                    # a float is only taken as is after the finiteness check
+                    kind = None if f.type is float else f.type
+                    self._steps.append((f.key, pos, kind, casts[f.type], f.key))
+            if f.column in model_columns:
+                overrides.append((f.column, pos, None, _COLUMN_CASTS[f.type], f.column))
+            if f.derive:
+                source, fn = f.derive
+                self._derived.append((pos, self.index[source], fn))
+        self._steps.extend(overrides)
+
+    def with_model_columns(self, columns):
+        """
+        Decoder for sources that may also name model columns directly (e.g.
+        survey files). Numbers may come as text, "28.5" included.
+        """
+        return RequestDecoder(self.fields, set(columns), casts=_TEXT_CASTS)
+
+    # --------------------------------------------------------
+    # ONE PAYLOAD
+    # --------------------------------------------------------
+
+    def _values(self, payload):
+        """Value array for one payload; raises SchemaError listing every bad field."""
+        if not isinstance(payload, Mapping):
+            raise SchemaError([{"field": None, "message": "record must be a JSON object"}])
+        values = self._defaults[:]
+        errors = None
+        get = payload.get
+        for key, pos, kind, cast, name in self._steps:
+            value = get(key)
+            if value in MISSING:
+                continue
+            if type(value) is not kind:
+                try:
+                    value = cast(value)
+                except (TypeError, ValueError) as e:
+                    if errors is None:
+                        errors = []
+                    errors.append({"field": name, "message": str(e)})
+                    continue
+            values[pos] = value
+        if errors:
+            raise SchemaError(errors)
+        for pos, source, fn in self._derived:
+            if values[pos] is _UNSET:
+                values[pos] = fn(values[source])
+        return values
+
+    def decode(self, payload):
+        """payload dict -> FeatureRecord."""
+        return FeatureRecord(self.index, self._values(payload))
+
+    # --------------------------------------------------------
+    # BATCHES
+    # --------------------------------------------------------
+
+    def decode_many(self, payloads):
+        """
+        A list of payload dicts -> (FeatureColumns of the rows that decoded,
+        {input index: SchemaError} for the ones that didn't).
+        """
+        rows, positions, errors = [], [], {}
+        for i, payload in enumerate(payloads):
+            try:
+                rows.append(self._values(payload))
+                positions.append(i)
+            except SchemaError as e:
+                errors[i] = e
+        if rows:
+            columns = dict(zip(self.columns, map(list, zip(*rows))))
+        else:
+            columns = {c: [] for c in self.columns}
+        return FeatureColumns(self.index, columns, positions), errors
+
+    def decode_columns(self, source, n):
+        """
+        Column-major decode of `n` rows: `source` maps payload keys (and
+        model columns, see with_model_columns) to lists of values. Same
+        result shape as decode_many.
+        """
+        values = [[d] * n for d in self._defaults]
+        bad = {}
+        for key, pos, kind, cast, name in self._steps:
+            column = source.get(key)
+            if column is None:
+                continue
+            out = values[pos]
+            for i, value in enumerate(column):
+                if value in MISSING:
+                    continue
+                if type(value) is not kind:
+                    try:
+                        value = cast(value)
+                    except (TypeError, ValueError) as e:
+                        bad.setdefault(i, []).append({"field": name, "message": str(e)})
+                        continue
+                out[i] = value
+        for pos, source_pos, fn in self._derived:
+            out, source_values = values[pos], values[source_pos]
+            for i, value in enumerate(out):
+                if value is _UNSET:
+                    out[i] = fn(source_values[i])
+
+        positions = range(n)
+        if bad:
+            positions = [i for i in positions if i not in bad]
+            values = [[column[i] for i in positions] for column in values]
+        errors = {i: SchemaError(e) for i, e in bad.items()}
+        return FeatureColumns(self.index, dict(zip(self.columns, values)), list(positions)), errors
@@ -0,0 +1,405 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import time
+
+# ============================================================
+# STATIC ASSET PIPELINE
+# ============================================================
+#
+# `python cropsense.py build-assets` turns static/ into static/dist/:
+#
+#   images       resized to IMAGE_WIDTHS (never upscaled), each width as
+#                AVIF, WebP and a JPEG/PNG fallback
+#   css/js/json  gzip (.gz) and brotli (.br) copies next to the file
+#   every file   content-hashed name, e.g. style.3f2c9a0d41b7.css, so it
+#                can be cached forever
+#   manifest.json  source name -> hashed path (+ per image type, best
+#                  first and the fallback last, its [width, path] candidates),
+#                  and per hashed file its type, ETag and encodings
+#
+# app.py resolves template asset URLs through the manifest and serves
+# static/dist with immutable Cache-Control, ETag/304 and the precompressed
+# copy the client accepts. Without a build it falls back to raw /static.
+#
+# Pillow (images) and brotli are optional: without Pillow images are only
+# fingerprinted, without brotli only gzip is written, and AVIF is skipped
+# when Pillow was built without it. Both are imported by build() only, so
+# app.py can read manifests without them.
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+HASH_LENGTH = 12
+
+# ============================================================
+# CONFIG
+# ============================================================
+
+IMAGE_WIDTHS = tuple(int(w) for w in os.environ.get("CROPSENSE_ASSET_WIDTHS", "320,640,960,1280,1920").split(","))
+JPEG_QUALITY = int(os.environ.get("CROPSENSE_ASSET_JPEG_QUALITY", "80"))
+WEBP_QUALITY = int(os.environ.get("CROPSENSE_ASSET_WEBP_QUALITY", "75"))
+AVIF_QUALITY = int(os.environ.get("CROPSENSE_ASSET_AVIF_QUALITY", "50"))
+AVIF_SPEED = 6                     # 0 (smallest, slowest) .. 10
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".json", ".geojson", ".svg", ".txt", ".html")
+MIN_COMPRESS_BYTES = 256
+
+# encoding -> file suffix, in server preference order
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# image formats: Pillow name -> (extension, content type); the fallback
+# (jpeg, or png for images with transparency) is listed last in srcsets
+IMAGE_FORMATS = {
+    "avif": (".avif", "image/avif"),
+    "webp": (".webp", "image/webp"),
+    "jpeg": (".jpg", "image/jpeg"),
+    "png": (".png", "image/png"),
+}
+
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".json": "application/json",
+    ".geojson": "application/geo+json",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain",
+    ".html": "text/html",
+    ".ico": "image/x-icon",
+    ".mp4": "video/mp4",
+    ".woff2": "font/woff2",
+    **{ext: content_type for ext, content_type in IMAGE_FORMATS.values()},
+    ".jpeg": "image/jpeg",
+}
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+?)\1\s*\)""")
+
+
+class AssetError(ValueError):
+    """Missing static directory or an asset that cannot be processed."""
+
+
+# ============================================================
+# MANIFEST (read side, used by app.py)
+# ============================================================
+
+class AssetManifest:
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.assets = manifest["assets"]      # source name -> entry
+        self.files = manifest["files"]        # hashed path -> {type, etag, bytes, encodings}
+
+    def path(self, name):
+        """Hashed path (relative to the dist directory) for a static/ name, or None."""
+        entry = self.assets.get(name)
+        return entry["path"] if entry else None
+
+    def image(self, name):
+        """The manifest entry of a resized image, or None (not an image, or not built)."""
+        entry = self.assets.get(name)
+        return entry if entry and entry.get("srcset") else None
+
+    def file(self, path):
+        return self.files.get(path)
+
+
+def load_manifest(directory):
+    """AssetManifest for a built dist directory; None if there is no usable build."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return None
+    return AssetManifest(directory, manifest)
+
+
+# ============================================================
+# BUILD
+# ============================================================
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hashed_name(name, data, suffix="", ext=None):
+    """assets/about2 .jpg -> assets/about2.<hash>.jpg (whitespace in the stem becomes '-')."""
+    head, tail = posixpath.split(name)
+    stem, original_ext = posixpath.splitext(tail)
+    stem = re.sub(r"\s+", "-", stem.strip()) or "asset"
+    return posixpath.join(head, f"{stem}{suffix}.{_digest(data)[:HASH_LENGTH]}{ext or original_ext.lower()}")
+
+
+def _content_type(path):
+    return CONTENT_TYPES.get(posixpath.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def _optional_modules():
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        Image = ImageOps = features = None
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    formats = []
+    if Image is not None:
+        if features.check("avif"):
+            formats.append("avif")
+        if features.check("webp"):
+            formats.append("webp")
+    return Image, ImageOps, brotli, formats
+
+
+class _Build:
+
+    def __init__(self, static_dir, out_dir, widths, previous, force):
+        self.static_dir = static_dir
+        self.out_dir = out_dir
+        self.widths = tuple(sorted(set(widths)))
+        self.previous = previous
+        self.force = force
+        self.Image, self.ImageOps, self.brotli, self.image_formats = _optional_modules()
+        self.assets = {}
+        self.files = {}
+        self.reused = 0
+
+    # --------------------------------------------------------
+    # OUTPUT
+    # --------------------------------------------------------
+
+    def _write(self, path, data):
+        """Writes a hashed file (content-addressed: an existing one is already right)."""
+        target = os.path.join(self.out_dir, *path.split("/"))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+
+    def _emit(self, path, data, compress=False):
+        encodings = {}
+        if compress and len(data) >= MIN_COMPRESS_BYTES:
+            compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if self.brotli is not None:
+                compressed["br"] = self.brotli.compress(data, quality=11)
+            for encoding, suffix in ENCODINGS:
+                body = compressed.get(encoding)
+                if body is not None and len(body) < len(data):
+                    self._write(path + suffix, body)
+                    encodings[encoding] = len(body)
+        self._write(path, data)
+        self.files[path] = {
+            "type": _content_type(path),
+            "etag": _digest(data)[:HASH_LENGTH],
+            "bytes": len(data),
+            "encodings": encodings,
+        }
+
+    # --------------------------------------------------------
+    # SOURCES
+    # --------------------------------------------------------
+
+    def _settings(self, name):
+        if posixpath.splitext(name)[1].lower() in IMAGE_EXTENSIONS and self.Image is not None:
+            return {"widths": list(self.widths), "formats": self.image_formats,
+                    "quality": {"jpeg": JPEG_QUALITY, "webp": WEBP_QUALITY, "avif": AVIF_QUALITY}}
+        return {"brotli": self.brotli is not None}
+
+    def _reuse(self, name, sha256, settings):
+        """Takes over the previous build's images when the source and settings are unchanged.
+
+        Everything else is cheap to redo (and CSS must pick up new image names).
+        """
+        if self.force or self.previous is None:
+            return False
+        entry = self.previous.image(name)
+        if not entry or entry.get("sha256") != sha256 or entry.get("settings") != settings:
+            return False
+        paths = [entry["path"]] + [p for _, candidates in entry["srcset"] for _, p in candidates]
+        files = {p: self.previous.file(p) for p in paths}
+        for path, info in files.items():
+            if info is None:
+                return False
+            for suffix in [""] + [s for e, s in ENCODINGS if e in info["encodings"]]:
+                if not os.path.isfile(os.path.join(self.out_dir, *(path + suffix).split("/"))):
+                    return False
+        self.assets[name] = entry
+        self.files.update(files)
+        self.reused += 1
+        return True
+
+    def add(self, name, data):
+        sha256, size = _digest(data), len(data)
+        settings = self._settings(name)
+        if self._reuse(name, sha256, settings):
+            return
+        ext = posixpath.splitext(name)[1].lower()
+        if ext in IMAGE_EXTENSIONS and self.Image is not None:
+            entry = self._image(name, data)
+        else:
+            if ext == ".css":
+                data = self._rewrite_css(name, data)
+            path = _hashed_name(name, data)
+            self._emit(path, data, compress=ext in COMPRESSIBLE_EXTENSIONS)
+            entry = {"path": path}
+        entry.update(sha256=sha256, bytes=size, settings=settings)
+        self.assets[name] = entry
+
+    def _rewrite_css(self, name, data):
+        """Points url(...) references at other assets' hashed names (relative, like the source)."""
+        base = posixpath.dirname(name)
+
+        def replace(match):
+            ref = match.group(2).strip()
+            if re.match(r"^(?:[a-z]+:|//|#|/)", ref, re.I):
+                return match.group(0)
+            target = posixpath.normpath(posixpath.join(base, ref.split("#")[0].split("?")[0]))
+            entry = self.assets.get(target)
+            if entry is None:
+                return match.group(0)
+            return f"url('{posixpath.relpath(entry['path'], base or '.')}')"
+
+        return CSS_URL.sub(replace, data.decode("utf-8")).encode("utf-8")
+
+    # --------------------------------------------------------
+    # IMAGES
+    # --------------------------------------------------------
+
+    def _image(self, name, data):
+        Image = self.Image
+        try:
+            with Image.open(io.BytesIO(data)) as source:
+                # decode big JPEGs at a reduced scale that still covers the widest variant
+                source.draft("RGB", (max(self.widths), max(self.widths)))
+                image = self.ImageOps.exif_transpose(source)
+                alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if alpha else "RGB")
+        except (OSError, ValueError) as e:
+            raise AssetError(f"cannot read image {name}: {e}")
+
+        fallback = "png" if alpha else "jpeg"
+        formats = self.image_formats + [fallback]
+        widths = sorted({w for w in self.widths if w < image.width} | {min(image.width, max(self.widths))})
+        srcset = [(IMAGE_FORMATS[f][1], []) for f in formats]
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt, (_, candidates) in zip(formats, srcset):
+                body = self._encode(resized, fmt)
+                path = _hashed_name(name, body, suffix=f"-{width}w", ext=IMAGE_FORMATS[fmt][0])
+                self._emit(path, body)
+                candidates.append([width, path])
+        largest = srcset[-1][1][-1]
+        return {"path": largest[1], "width": largest[0],
+                "height": max(1, round(image.height * largest[0] / image.width)), "srcset": srcset}
+
+    @staticmethod
+    def _encode(image, fmt):
+        out = io.BytesIO()
+        if fmt == "jpeg":
+            image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        elif fmt == "png":
+            image.save(out, "PNG", optimize=True)
+        elif fmt == "webp":
+            image.save(out, "WEBP", quality=WEBP_QUALITY, method=5)
+        else:
+            image.save(out, "AVIF", quality=AVIF_QUALITY, speed=AVIF_SPEED)
+        return out.getvalue()
+
+
+def _sources(static_dir, out_dir):
+    """static/ files as (name, absolute path), CSS last so it can point at hashed images."""
+    out_dir = os.path.abspath(out_dir)
+    found = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and os.path.abspath(os.path.join(root, d)) != out_dir)
+        for filename in sorted(files):
+            if filename.startswith("."):
+                continue
+            path = os.path.join(root, filename)
+            found.append((os.path.relpath(path, static_dir).replace(os.sep, "/"), path))
+    return sorted(found, key=lambda item: (item[0].endswith(".css"), item[0]))
+
+
+def _prune(out_dir, keep):
+    removed = 0
+    for root, _, files in os.walk(out_dir):
+        for filename in files:
+            rel = os.path.relpath(os.path.join(root, filename), out_dir).replace(os.sep, "/")
+            if rel == MANIFEST or rel in keep:
+                continue
+            os.remove(os.path.join(root, filename))
+            removed += 1
+    return removed
+
+
+def build(static_dir=STATIC_DIR, out_dir=None, widths=IMAGE_WIDTHS, force=False, log=None):
+    """Builds static/dist and its manifest; returns a summary dict.
+
+    Unchanged sources are taken over from the previous manifest unless
+    `force`. Files of the previous build stay on disk (pages rendered just
+    before a deploy still reference them); anything older is deleted.
+    """
+    if not os.path.isdir(static_dir):
+        raise AssetError(f"no static directory {static_dir}")
+    out_dir = out_dir or os.path.join(static_dir, DIST)
+    start = time.perf_counter()
+    previous = load_manifest(out_dir)
+    job = _Build(static_dir, out_dir, widths, previous, force)
+    os.makedirs(out_dir, exist_ok=True)
+
+    source_bytes = 0
+    for name, path in _sources(static_dir, out_dir):
+        with open(path, "rb") as f:
+            data = f.read()
+        source_bytes += len(data)
+        job.add(name, data)
+        if log is not None:
+            entry = job.assets[name]
+            print(f"  {name} -> {entry['path']}", file=log)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "image_formats": job.image_formats if job.Image is not None else [],
+        "encodings": [e for e, _ in ENCODINGS if e == "gzip" or job.brotli is not None],
+        "assets": job.assets,
+        "files": job.files,
+    }
+    tmp = os.path.join(out_dir, f".{MANIFEST}.{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+
+    keep = set()
+    for files in (job.files, previous.files if previous is not None else {}):
+        for path, info in files.items():
+            keep.add(path)
+            keep.update(path + s for e, s in ENCODINGS if e in info["encodings"])
+    removed = _prune(out_dir, keep)
+
+    return {
+        "out": out_dir,
+        "assets": len(job.assets),
+        "files": len(job.files),
+        "reused": job.reused,
+        "removed": removed,
+        "source_bytes": source_bytes,
+        "image_formats": manifest["image_formats"],
+        "encodings": manifest["encodings"],
+        "skipped": ([] if job.Image is not None else ["images (install Pillow)"])
+                   + ([] if job.brotli is not None else ["brotli (pip install brotli)"]),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
@@ -4,9 +4,6 @@ import joblib
 import os
 import sys
 
-# Ensure the compatible Python 3.10 environment is being used
-print(f"[ENV CHECK] Using Python: {sys.version.split()[0]} from {sys.executable}")
-
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -93,12 +90,26 @@ def train_and_save_model(data_path, target_name):
     
     print(f"SUCCESS: {target_name} model saved as {model_filename}")
     print("--------------------------------")
+    return model
 
 
 if __name__ == '__main__':
+    # Ensure the compatible Python 3.10 environment is being used
+    print(f"[ENV CHECK] Using Python: {sys.version.split()[0]} from {sys.executable}")
+
     base_dir = os.path.dirname(os.path.abspath(__file__))
     data_file = os.path.join(base_dir, 'data_validated.csv')
 
     # Train and save both models
-    train_and_save_model(data_file, 'SQI')
-    train_and_save_model(data_file, 'PHI')
\ No newline at end of file
+    models = {name: train_and_save_model(data_file, name) for name in ('SQI', 'PHI')}
+
+    # Portable bundle next to the pickles (copy it to models/bundle to deploy)
+    if all(m is not None for m in models.values()):
+        sys.path.insert(0, os.path.dirname(base_dir))
+        from utils.inference import CompiledPipeline
+        from utils.model_bundle import export_bundle
+        from utils.model_variants import distill_variants
+
+        variants = {name: distill_variants(CompiledPipeline.from_pipeline(m)) for name, m in models.items()}
+        manifest = export_bundle(models, 'bundle', variants=variants)
+        print(f"SUCCESS: model bundle {manifest['version']} saved in bundle/")
\ No newline at end of file
@@ -0,0 +1,720 @@
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from utils.bulk_score import ScoringError, iter_chunks
+from utils.inference import CompiledPipeline
+from utils.model_variants import build_variants, distill_variants
+from utils.train_models import CATEGORICAL_FEATURES, NUMERICAL_FEATURES
+
+# ============================================================
+# OUT-OF-CORE TRAINING
+# ============================================================
+#
+# Trains the SQI/PHI boosters from a CSV/Parquet file that doesn't fit in
+# memory. Nothing ever holds the whole file:
+#
+#   1. scan()   one chunked pass for the preprocessing: numeric mean/std
+#               (StandardScaler semantics) and the sorted category
+#               vocabularies (OneHotEncoder semantics) -> a pipeline_spec
+#   2. train    per target, a ChunkIter (xgboost.DataIter) streams the file
+#               again, encodes each chunk with FrameEncoder and feeds it to
+#               a QuantileDMatrix (binned in memory, ~1 byte per feature
+#               per row) or an external-memory DMatrix (pages cached on
+#               disk); hist trees, early stopping on a held-out split
+#   3. export   a model bundle (utils/model_bundle.py), which app.py loads
+#               in place of the pickles
+#
+# Targets train in parallel processes; the thread budget is split between
+# them. Rows go to the validation split by a per-chunk seeded draw, so
+# every pass over the file sees the same split.
+
+DEFAULT_CHUNK_ROWS = 100000
+TARGETS = ("SQI", "PHI")
+
+# held-out rows the variants' accuracy-vs-latency curve is measured on
+VARIANT_EVAL_ROWS = 20000
+
+# same placeholder ranges as train_models.train_and_save_model
+DUMMY_TARGET_RANGES = {"SQI": (1.0, 5.0), "PHI": (1.0, 10.0)}
+
+
+class TrainingError(Exception):
+    """Unusable training data or arguments."""
+
+
+def _chunks(path, chunk_rows):
+    try:
+        for _, df in iter_chunks(path, chunk_rows):
+            yield df
+    except ScoringError as e:
+        raise TrainingError(str(e))
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ============================================================
+# PASS 1: PREPROCESSING STATISTICS
+# ============================================================
+
+def scan(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    One pass over `path`; returns (spec, info). `spec` is the
+    inference.pipeline_spec() that create_pipeline() would have fitted on
+    the same data: feature order from the file header, numeric mean and
+    population std (NaN ignored, zero std -> 1), sorted vocabularies of
+    the values as strings (missing values are not a category; they encode
+    as all zeros). `info` has the row count, the header, the number of
+    unparseable numeric values and the rows per category.
+    """
+    features = set(NUMERICAL_FEATURES) | set(CATEGORICAL_FEATURES)
+    n = np.zeros(len(NUMERICAL_FEATURES))
+    mean = np.zeros(len(NUMERICAL_FEATURES))
+    m2 = np.zeros(len(NUMERICAL_FEATURES))
+    counts = {c: Counter() for c in CATEGORICAL_FEATURES}
+    header, rows, bad_numeric = None, 0, 0
+
+    for df in _chunks(path, chunk_rows):
+        if header is None:
+            header = list(df.columns)
+            missing = sorted(features - set(header))
+            if missing:
+                raise TrainingError(f"{path} is missing feature columns: {', '.join(missing)}")
+        rows += len(df)
+
+        values = numeric_block(df)
+        bad_numeric += int((values.isna() & df[NUMERICAL_FEATURES].notna()).to_numpy().sum())
+        # Chan et al. pairwise update of count / mean / M2 per column
+        cn = values.count().to_numpy(dtype=np.float64)
+        cmean = values.mean().fillna(0).to_numpy()
+        cm2 = ((values - cmean) ** 2).sum().to_numpy()
+        total = n + cn
+        delta = cmean - mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(total > 0, mean + delta * cn / total, 0.0)
+            m2 = m2 + cm2 + np.where(total > 0, delta ** 2 * n * cn / total, 0.0)
+        n = total
+
+        for col in CATEGORICAL_FEATURES:
+            counts[col].update(df[col].dropna().astype(str).value_counts().to_dict())
+
+    if not rows:
+        raise TrainingError(f"{path} has no rows")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(np.where(n > 0, m2 / n, 0.0))
+    scale = np.where(std < 10 * np.finfo(np.float64).eps, 1.0, std)
+
+    spec = {
+        "feature_names_in": [c for c in header if c in features],
+        "blocks": [
+            {"kind": "num", "columns": list(NUMERICAL_FEATURES), "mean": mean.tolist(), "scale": scale.tolist()},
+            {"kind": "cat", "columns": list(CATEGORICAL_FEATURES),
+             "categories": [sorted(counts[c]) for c in CATEGORICAL_FEATURES]},
+        ],
+    }
+    info = {"rows": rows, "columns": header, "bad_numeric_values": bad_numeric,
+            "category_counts": {c: dict(counts[c]) for c in CATEGORICAL_FEATURES}}
+    return spec, info
+
+
+def numeric_block(df, columns=NUMERICAL_FEATURES):
+    """`columns` as float64; unparseable values become NaN (missing)."""
+    return df[columns].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+
+
+# ============================================================
+# ENCODING
+# ============================================================
+
+class FrameEncoder:
+    """
+    Columnar version of CompiledPipeline.encode_many: DataFrame chunk ->
+    float32 matrix, block by block in spec order (a refreshed bundle can
+    have a second categorical block for categories added after the first
+    training). train_target() checks it against CompiledPipeline before
+    export, so training and serving can't drift apart.
+    """
+
+    def __init__(self, spec):
+        self.numeric = []              # (columns, mean, scale, first output index)
+        self.passthrough = []          # (columns, first output index)
+        self.categorical = []          # (column, categories, first output index)
+        offset = 0
+        for block in spec["blocks"]:
+            cols = list(block["columns"])
+            if block["kind"] == "num":
+                self.numeric.append((cols, np.asarray(block["mean"], dtype=np.float64),
+                                     np.asarray(block["scale"], dtype=np.float64), offset))
+                offset += len(cols)
+            elif block["kind"] == "raw":
+                self.passthrough.append((cols, offset))
+                offset += len(cols)
+            else:
+                for col, cats in zip(cols, block["categories"]):
+                    self.categorical.append((col, pd.Index(cats), offset))
+                    offset += len(cats)
+        self.n_features = offset
+
+    def encode(self, df):
+        out = np.zeros((len(df), self.n_features), dtype=np.float32)
+        for cols, mean, scale, offset in self.numeric:
+            out[:, offset:offset + len(cols)] = (numeric_block(df, cols).to_numpy() - mean) / scale
+        for cols, offset in self.passthrough:
+            out[:, offset:offset + len(cols)] = numeric_block(df, cols).to_numpy()
+        for col, cats, offset in self.categorical:
+            values = df[col]
+            present = values.notna().to_numpy()
+            codes = np.full(len(df), -1)
+            codes[present] = cats.get_indexer(values[present].astype(str))
+            hit = np.flatnonzero(codes >= 0)
+            out[hit, offset + codes[hit]] = 1.0
+        return out
+
+
+def _target(df, target, rng):
+    if target in df.columns:
+        return pd.to_numeric(df[target], errors="coerce").to_numpy(dtype=np.float64)
+    low, high = DUMMY_TARGET_RANGES.get(target, (0.0, 5.0))
+    return rng.uniform(low, high, len(df))
+
+
+class ChunkIter(xgb.DataIter):
+    """
+    Streams one split ("train" or "valid") of `path` into XGBoost, one
+    encoded chunk per next() call. Rows without a target are skipped.
+    """
+
+    def __init__(self, path, chunk_rows, encoder, target, split, valid_fraction, seed, cache_prefix=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.encoder = encoder
+        self.target = target
+        self.split = split
+        self.valid_fraction = valid_fraction
+        self.seed = seed
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def batches(self):
+        """(X, y) per chunk for this split; also used for evaluation."""
+        for i, df in enumerate(_chunks(self.path, self.chunk_rows)):
+            rng = np.random.default_rng([self.seed, i])
+            in_valid = rng.random(len(df)) < self.valid_fraction
+            y = _target(df, self.target, rng)
+            keep = (in_valid if self.split == "valid" else ~in_valid) & ~np.isnan(y)
+            if keep.any():
+                part = df[keep]
+                yield self.encoder.encode(part), y[keep]
+
+    def next(self, input_data):
+        if self._it is None:
+            self._it = self.batches()
+        batch = next(self._it, None)
+        if batch is None:
+            return 0
+        X, y = batch
+        input_data(data=X, label=y)
+        return 1
+
+    def reset(self):
+        if self._it is not None:
+            self._it.close()
+        self._it = None
+
+
+# ============================================================
+# PASS 2: TRAINING (one process per target)
+# ============================================================
+
+def _evaluate(booster, batches, iteration_range, baseline=None):
+    """
+    rmse / mae / r2 of `booster` over `batches`. With `baseline` (booster,
+    iteration_range), the same metrics for it under "previous" and how far
+    the predictions moved under "prediction_shift".
+    """
+    models = [(booster, iteration_range)] + ([baseline] if baseline else [])
+    stats = np.zeros((len(models), 2))         # per model: sse, sae
+    n = sy = syy = shift = abs_shift = 0.0
+    for X, y in batches:
+        preds = [b.inplace_predict(X, iteration_range=r).astype(np.float64) for b, r in models]
+        for i, pred in enumerate(preds):
+            err = pred - y
+            stats[i] += (float(err @ err), float(np.abs(err).sum()))
+        if baseline:
+            delta = preds[0] - preds[1]
+            shift += float(delta.sum())
+            abs_shift += float(np.abs(delta).sum())
+        n += len(y)
+        sy += float(y.sum())
+        syy += float(y @ y)
+    if not n:
+        return {"rows": 0}
+
+    sst = syy - sy * sy / n
+
+    def metrics(sse, sae):
+        return {"rmse": (sse / n) ** 0.5, "mae": sae / n, "r2": 1 - sse / sst if sst > 0 else float("nan")}
+
+    out = {"rows": int(n), **metrics(*stats[0])}
+    if baseline:
+        out["previous"] = metrics(*stats[1])
+        out["prediction_shift"] = {"mean": shift / n, "mean_abs": abs_shift / n}
+    return out
+
+
+def train_target(job):
+    """Trains one target; runs in a worker process. Returns (booster_raw, result dict)."""
+    cache_dir = tempfile.mkdtemp(prefix=f"cropsense-train-{job['target']}-", dir=job["opts"]["cache_dir"])
+    try:
+        # every XGBoost object lives in _train's frame, so the external-memory
+        # pages are released before their directory is removed
+        return _train(job, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _train(job, cache_dir):
+    start = time.perf_counter()
+    target, path, spec, opts = job["target"], job["path"], job["spec"], job["opts"]
+    encoder = FrameEncoder(spec)
+
+    def iterator(split, source=path, valid_fraction=opts["valid_fraction"]):
+        prefix = os.path.join(cache_dir, split) if opts["memory"] == "external" else None
+        return ChunkIter(source, opts["chunk_rows"], encoder, target, split,
+                         valid_fraction, opts["seed"], cache_prefix=prefix)
+
+    train_it, valid_it = iterator("train"), iterator("valid")
+    if opts["memory"] == "external":
+        dtrain = xgb.DMatrix(train_it, missing=np.nan)
+        dvalid = xgb.DMatrix(valid_it, missing=np.nan) if opts["valid_fraction"] > 0 else None
+    else:
+        dtrain = xgb.QuantileDMatrix(train_it, max_bin=opts["max_bin"], missing=np.nan)
+        dvalid = (xgb.QuantileDMatrix(valid_it, ref=dtrain, max_bin=opts["max_bin"], missing=np.nan)
+                  if opts["valid_fraction"] > 0 else None)
+    if dtrain.num_row() == 0:
+        raise TrainingError(f"no training rows with a {target} value")
+    loaded = time.perf_counter()
+
+    # incremental refresh: keep boosting the previous version's trees
+    base = baseline = None
+    if job.get("base") is not None:
+        base = xgb.Booster(model_file=bytearray(job["base"]))
+        baseline = (base, (0, 0))
+    base_rounds = base.num_boosted_rounds() if base is not None else 0
+
+    params = {
+        "objective": "reg:squarederror",
+        "tree_method": "hist",
+        "max_bin": opts["max_bin"],
+        "eta": opts["learning_rate"],
+        "max_depth": opts["max_depth"],
+        "nthread": opts["nthread"],
+        "seed": opts["seed"],
+        "eval_metric": ["mae", "rmse"],       # the last one drives early stopping
+    }
+    evals = [(dvalid, "valid")] if dvalid is not None and dvalid.num_row() else []
+    booster = xgb.train(
+        params, dtrain,
+        num_boost_round=opts["rounds"],
+        evals=evals,
+        early_stopping_rounds=opts["early_stopping"] if evals and opts["early_stopping"] else None,
+        verbose_eval=False,
+        xgb_model=base.copy() if base is not None else None,
+    )
+    best = getattr(booster, "best_iteration", None)
+    iteration_range = (0, best + 1) if evals and opts["early_stopping"] and best is not None else (0, 0)
+    trained = time.perf_counter()
+
+    # the serving encoder must turn rows into exactly what we trained on
+    compiled = CompiledPipeline(spec, booster, iteration_range)
+    sample = next(_chunks(path, 256))
+    categorical = sample[CATEGORICAL_FEATURES]
+    records = numeric_block(sample).join(categorical.where(categorical.isna(), categorical.astype(str)))
+    records = records.astype(object).where(records.notna(), None).to_dict("records")
+    diff = np.max(np.abs(compiled.predict_many(records) -
+                         booster.inplace_predict(encoder.encode(sample), iteration_range=iteration_range)))
+    if diff > 1e-5:
+        raise TrainingError(f"{target}: training and serving encodings differ ({diff:.2e})")
+
+    # reduced-cost variants for latency tiers (utils/model_variants.py)
+    variants = None
+    if opts.get("variants"):
+        if base is None:
+            variants = _train_variants(booster, iteration_range, params, dtrain, dvalid if evals else None,
+                                       train_it, valid_it if evals else train_it)
+        else:
+            # a refresh only sees the new rows: distill from the refreshed model instead
+            variants = distill_variants(compiled, seed=opts["seed"], nthread=opts["nthread"])
+    varied = time.perf_counter()
+
+    result = {
+        "target": target,
+        "train_rows": int(dtrain.num_row()),
+        "rounds": booster.num_boosted_rounds(),
+        "best_iteration": best if iteration_range != (0, 0) else None,
+        "iteration_range": list(iteration_range),
+        "validation": _evaluate(booster, valid_it.batches(), iteration_range, baseline) if evals else None,
+    }
+    if base is not None:
+        used = iteration_range[1] or booster.num_boosted_rounds()
+        result["base_rounds"] = base_rounds
+        result["added_rounds"] = used - base_rounds
+        if job.get("holdout"):
+            holdout = iterator("holdout", job["holdout"], 0.0)
+            result["holdout"] = _evaluate(booster, holdout.batches(), iteration_range, baseline)
+    result.update({
+        "nthread": opts["nthread"],
+        "load_seconds": round(loaded - start, 3),
+        "train_seconds": round(trained - loaded, 3),
+        "variants_seconds": round(varied - trained, 3),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    if variants is not None:
+        # boosters cross the process boundary as raw bytes
+        tiers, curve = variants
+        tiers = {t: {**v, "booster": bytes(v["booster"].save_raw("ubj"))} if "booster" in v else v
+                 for t, v in tiers.items()}
+        variants = (tiers, curve)
+    return bytes(booster.save_raw("ubj")), result, variants
+
+
+def _train_variants(booster, iteration_range, params, dtrain, dvalid, train_it, eval_it):
+    """
+    build_variants() from the training data itself: the small booster is a
+    depth-limited retrain on the labels, the linear model is fitted over
+    the training chunks, and the curve is measured on up to
+    VARIANT_EVAL_ROWS validation rows.
+    """
+    X_eval, y_eval, n = [], [], 0
+    for X, y in eval_it.batches():
+        X_eval.append(X[:VARIANT_EVAL_ROWS - n])
+        y_eval.append(y[:VARIANT_EVAL_ROWS - n])
+        n += len(X_eval[-1])
+        if n >= VARIANT_EVAL_ROWS:
+            break
+    params = {k: params[k] for k in ("objective", "tree_method", "max_bin", "nthread", "seed")}
+    return build_variants(
+        booster, iteration_range, dtrain, train_it.batches,
+        np.concatenate(X_eval), np.concatenate(y_eval).astype(np.float64),
+        params={**params, "eta": 0.3}, dvalid=dvalid,
+    )
+
+
+# ============================================================
+# DRIVER
+# ============================================================
+
+def _check_options(memory, valid_fraction, early_stopping):
+    if memory not in ("external", "quantile"):
+        raise TrainingError(f"memory must be 'external' or 'quantile', not {memory!r}")
+    if not 0 <= valid_fraction < 1:
+        raise TrainingError("valid_fraction must be in [0, 1)")
+    if early_stopping and not valid_fraction:
+        raise TrainingError("early stopping needs a validation split")
+
+
+def _run_jobs(jobs, workers, log):
+    """
+    Runs train_target() over `jobs`; returns ({target: CompiledPipeline},
+    {target: result}, {target: (variants, curve)} for export_bundle).
+    """
+    specs = {job["target"]: job["spec"] for job in jobs}
+    if workers == 1:
+        outputs = [train_target(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(train_target, jobs))
+
+    models, results, variants = {}, {}, {}
+    for raw, result, varied in outputs:
+        booster = xgb.Booster(model_file=bytearray(raw))
+        models[result["target"]] = CompiledPipeline(specs[result["target"]], booster, result["iteration_range"])
+        results[result["target"]] = result
+        if varied is not None:
+            tiers, curve = varied
+            tiers = {t: {**v, "booster": xgb.Booster(model_file=bytearray(v["booster"]))} if "booster" in v else v
+                     for t, v in tiers.items()}
+            variants[result["target"]] = (tiers, curve)
+            if log:
+                print(f"{result['target']} variants: " + ", ".join(
+                    f"{p['tier']} {p['predict_us_per_row']:.0f}us/row rmse-vs-full {p['deviation_rmse']:.4f}"
+                    for p in curve if p["tier"] != "truncated"), file=log)
+        if log:
+            v = result["validation"] or {}
+            print(f"{result['target']}: {result['train_rows']:,} rows, {result['rounds']} rounds "
+                  f"(best {result['best_iteration']}), {result['wall_seconds']:.1f}s, "
+                  f"peak {result['peak_rss_mb']:.0f}MB, valid rmse {v.get('rmse', float('nan')):.4f} "
+                  f"r2 {v.get('r2', float('nan')):.4f}", file=log)
+    return models, results, variants
+
+
+def train_file(path, out_dir, targets=TARGETS, chunk_rows=DEFAULT_CHUNK_ROWS, valid_fraction=0.2,
+               rounds=100, early_stopping=10, learning_rate=0.1, max_depth=6, max_bin=256,
+               threads=None, workers=None, memory="quantile", seed=42, cache_dir=None, variants=True,
+               log=sys.stderr):
+    """
+    Trains every target in `targets` from `path` and writes a model bundle
+    to `out_dir`, with the reduced-cost variants unless variants=False.
+    Returns a summary dict (per-model wall time, peak memory and
+    validation metrics).
+    """
+    from utils.model_bundle import export_bundle
+
+    _check_options(memory, valid_fraction, early_stopping)
+    start = time.perf_counter()
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(workers or len(targets), len(targets), threads))
+
+    spec, info = scan(path, chunk_rows)
+    if log:
+        print(f"scanned {info['rows']:,} rows in {time.perf_counter() - start:.1f}s "
+              f"({info['bad_numeric_values']} unparseable numeric values treated as missing)", file=log)
+        for target in targets:
+            if target not in info["columns"]:
+                print(f"[DUMMY TARGET] Column '{target}' missing. Creating random placeholder values.", file=log)
+
+    opts = {
+        "chunk_rows": chunk_rows, "valid_fraction": valid_fraction, "rounds": rounds,
+        "early_stopping": early_stopping, "learning_rate": learning_rate, "max_depth": max_depth,
+        "max_bin": max_bin, "nthread": max(1, threads // workers), "memory": memory, "seed": seed,
+        "cache_dir": cache_dir, "variants": variants,
+    }
+    jobs = [{"target": t, "path": path, "spec": spec, "opts": opts} for t in targets]
+
+    models, results, tiers = _run_jobs(jobs, workers, log)
+
+    manifest = export_bundle(models, out_dir, variants=tiers, training={
+        "source": os.path.basename(path),
+        "rows": info["rows"],
+        "valid_fraction": valid_fraction,
+        "models": {t: {k: r[k] for k in ("train_rows", "rounds", "best_iteration", "validation")}
+                   for t, r in results.items()},
+    })
+
+    return {
+        "bundle": out_dir,
+        "version": manifest["version"],
+        "rows": info["rows"],
+        "memory": memory,
+        "workers": workers,
+        "threads": threads,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "driver_peak_rss_mb": round(peak_rss_mb(), 1),
+        "models": results,
+    }
+
+
+# ============================================================
+# INCREMENTAL REFRESH
+# ============================================================
+#
+# refresh_file() updates a bundle with new field data without going back
+# to the history: it keeps the bundle's preprocessing (scaler statistics
+# and vocabularies) and continues boosting each booster on the new rows
+# only (xgb_model warm start), so the cost scales with the delta.
+#
+# The trees index encoded columns, so the existing encoding can't change.
+# Categories the bundle has never seen are either appended as a trailing
+# one-hot block ("extend": the old trees never split on those columns,
+# so the previous version's predictions are unchanged until new rounds
+# use them) or encoded as all zeros, like OneHotEncoder(handle_unknown=
+# "ignore") ("ignore").
+
+NEW_CATEGORY_MODES = ("extend", "ignore")
+
+
+def unseen_categories(spec, counts):
+    """{column: {value: rows}} for values in `counts` that `spec` doesn't encode."""
+    known = {}
+    for block in spec["blocks"]:
+        if block["kind"] == "cat":
+            for col, cats in zip(block["columns"], block["categories"]):
+                known.setdefault(col, set()).update(str(c) for c in cats)
+    unseen = {}
+    for col, values in counts.items():
+        if col in known:
+            new = {v: n for v, n in values.items() if v not in known[col]}
+            if new:
+                unseen[col] = new
+    return unseen
+
+
+def extend_spec(spec, unseen):
+    """`spec` with one more "cat" block holding the `unseen` values, sorted."""
+    if not unseen:
+        return spec
+    columns = [c for c in CATEGORICAL_FEATURES if c in unseen]
+    block = {"kind": "cat", "columns": columns, "categories": [sorted(unseen[c]) for c in columns]}
+    return dict(spec, blocks=list(spec["blocks"]) + [block])
+
+
+def widen_booster(booster, n_features):
+    """
+    Copy of `booster` that accepts `n_features` columns (XGBoost refuses to
+    keep training on a wider matrix otherwise). The trees are untouched, so
+    the extra trailing columns don't change any prediction.
+    """
+    if booster.num_features() == n_features:
+        return booster.copy()
+    model = json.loads(booster.save_raw("json"))
+    model["learner"]["learner_model_param"]["num_feature"] = str(n_features)
+    return xgb.Booster(model_file=bytearray(json.dumps(model).encode()))
+
+
+def drift_report(base_spec, spec, info, unseen):
+    """
+    How the new rows differ from what the bundle was fitted on: per numeric
+    column the mean shift and the spread, both in units of the bundle's
+    scale, and per categorical column the rows with unseen values.
+    """
+    base = next(b for b in base_spec["blocks"] if b["kind"] == "num")
+    new = next(b for b in spec["blocks"] if b["kind"] == "num")
+    base_stats = dict(zip(base["columns"], zip(base["mean"], base["scale"])))
+    numeric = {}
+    for col, mean, scale in zip(new["columns"], new["mean"], new["scale"]):
+        if col in base_stats:
+            base_mean, base_scale = base_stats[col]
+            numeric[col] = {"mean_shift": (mean - base_mean) / base_scale, "scale_ratio": scale / base_scale}
+    categorical = {
+        col: {"rows": sum(values.values()), "share": sum(values.values()) / info["rows"],
+              "values": sorted(values, key=values.get, reverse=True)[:20]}
+        for col, values in unseen.items()
+    }
+    return {"rows": info["rows"], "numeric": numeric, "unseen_categories": categorical}
+
+
+def _log_drift(drift, log, threshold=0.5):
+    shifted = sorted(((abs(d["mean_shift"]), col, d) for col, d in drift["numeric"].items()
+                      if abs(d["mean_shift"]) >= threshold or not 0.5 <= d["scale_ratio"] <= 2), reverse=True)
+    for _, col, d in shifted:
+        print(f"drift: {col} mean moved {d['mean_shift']:+.2f} sd, spread x{d['scale_ratio']:.2f}", file=log)
+    for col, d in drift["unseen_categories"].items():
+        print(f"drift: {col} has {len(d['values'])} unseen value(s) in {d['rows']:,} rows "
+              f"({d['share']:.1%}): {', '.join(d['values'][:5])}", file=log)
+    if not shifted and not drift["unseen_categories"]:
+        print("drift: no numeric shift over "
+              f"{threshold} sd and no unseen categories", file=log)
+
+
+def refresh_file(path, base_dir, out_dir, targets=TARGETS, chunk_rows=DEFAULT_CHUNK_ROWS, valid_fraction=0.2,
+                 rounds=20, early_stopping=5, learning_rate=0.1, max_depth=6, max_bin=256,
+                 threads=None, workers=None, memory="quantile", new_categories="extend", holdout=None,
+                 seed=42, cache_dir=None, variants=True, log=sys.stderr):
+    """
+    Continues boosting the models of the bundle in `base_dir` on the rows
+    of `path` and writes the result as a new bundle to `out_dir`. Returns
+    a summary with the drift report and, per model, validation metrics of
+    the new and the previous version on the held-out new rows (and on
+    `holdout`, a labelled file of older data, when given).
+    """
+    from utils.model_bundle import export_bundle, load_bundle
+
+    _check_options(memory, valid_fraction, early_stopping)
+    if new_categories not in NEW_CATEGORY_MODES:
+        raise TrainingError(f"new_categories must be one of {', '.join(NEW_CATEGORY_MODES)}")
+    start = time.perf_counter()
+    threads = threads or os.cpu_count() or 1
+    workers = max(1, min(workers or len(targets), len(targets), threads))
+
+    base = load_bundle(base_dir)
+    missing = [t for t in targets if t not in base.models]
+    if missing:
+        raise TrainingError(f"{base_dir} has no model for {', '.join(missing)}")
+
+    delta_spec, info = scan(path, chunk_rows)
+    labelled = {path: info["columns"]}
+    if holdout:
+        labelled[holdout] = list(next(_chunks(holdout, 1)).columns)
+    for source, columns in labelled.items():
+        missing = [t for t in targets if t not in columns]
+        if missing:
+            raise TrainingError(f"{source} has no {', '.join(missing)} column")
+
+    opts = {
+        "chunk_rows": chunk_rows, "valid_fraction": valid_fraction, "rounds": rounds,
+        "early_stopping": early_stopping, "learning_rate": learning_rate, "max_depth": max_depth,
+        "max_bin": max_bin, "nthread": max(1, threads // workers), "memory": memory, "seed": seed,
+        "cache_dir": cache_dir, "variants": variants,
+    }
+    jobs, drift, added = [], None, {}
+    for target in targets:
+        compiled = base[target]
+        entry = base.manifest["models"][target]
+        unseen = unseen_categories(compiled.spec, info["category_counts"])
+        spec = extend_spec(compiled.spec, unseen) if new_categories == "extend" else compiled.spec
+        if drift is None:
+            drift = drift_report(compiled.spec, delta_spec, info, unseen)
+            if log:
+                print(f"scanned {info['rows']:,} new rows in {time.perf_counter() - start:.1f}s", file=log)
+                _log_drift(drift, log)
+        added[target] = {c: sorted(v) for c, v in unseen.items()} if spec is not compiled.spec else {}
+
+        # the previous version as served: cut at its early-stopping point, widened for new columns
+        booster = compiled.booster
+        stop = entry["iteration_range"][1]
+        if stop and stop < booster.num_boosted_rounds():
+            booster = booster[:stop]
+        booster = widen_booster(booster, FrameEncoder(spec).n_features)
+        probe = compiled.probe_records()
+        diff = np.max(np.abs(CompiledPipeline(spec, booster).predict_many(probe) - compiled.predict_many(probe)))
+        if diff > 1e-6:
+            raise TrainingError(f"{target}: widened model no longer reproduces {base.version} ({diff:.2e})")
+        jobs.append({"target": target, "path": path, "spec": spec, "opts": opts,
+                     "base": bytes(booster.save_raw("ubj")), "holdout": holdout})
+
+    models, results, tiers = _run_jobs(jobs, workers, log)
+    if log:
+        for target, r in results.items():
+            v = r["validation"] or {}
+            if "previous" in v:
+                print(f"{target}: +{r['added_rounds']} rounds on {r['train_rows']:,} rows, valid rmse "
+                      f"{v['previous']['rmse']:.4f} -> {v['rmse']:.4f}, predictions moved "
+                      f"{v['prediction_shift']['mean_abs']:.4f} on average", file=log)
+            h = r.get("holdout") or {}
+            if "previous" in h:
+                print(f"{target}: holdout ({h['rows']:,} rows) rmse {h['previous']['rmse']:.4f} -> {h['rmse']:.4f}",
+                      file=log)
+
+    lineage = base.manifest.get("training", {}).get("lineage", []) + [base.version]
+    manifest = export_bundle(models, out_dir, variants=tiers, training={
+        "source": os.path.basename(path),
+        "rows": info["rows"],
+        "valid_fraction": valid_fraction,
+        "refreshed_from": base.version,
+        "lineage": lineage,
+        "added_categories": added,
+        "drift": drift,
+        "models": {t: {k: r.get(k) for k in ("train_rows", "rounds", "base_rounds", "added_rounds",
+                                              "best_iteration", "validation", "holdout")}
+                   for t, r in results.items()},
+    })
+
+    return {
+        "bundle": out_dir,
+        "version": manifest["version"],
+        "previous_version": base.version,
+        "rows": info["rows"],
+        "new_categories": new_categories,
+        "drift": drift,
+        "memory": memory,
+        "workers": workers,
+        "threads": threads,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "driver_peak_rss_mb": round(peak_rss_mb(), 1),
+        "models": results,
+    }
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+
+from utils.reference_data import get_reference_store, level_key
+from utils.treatment_engine import (
+    NUTRIENTS,
+    PHI_WEIGHTS,
+    STAGE_RELEVANCE,
+    classify_phi,
+    control_entry,
+    generate_treatment_recommendations,
+)
+
+# ============================================================
+# COLUMNAR TREATMENT ENGINE
+# ============================================================
+#
+# Same rules as generate_treatment_recommendations, evaluated over a whole
+# frame of fields at once: nutrient status via np.select against per-row
+# threshold columns, soil rules as masks, symptom levels once per distinct
+# value, and PriorityScore via broadcast stage / PHI weight lookups. Rows
+# whose inputs would make the row-wise engine raise (non-numeric values,
+# None PHI in a float column, ...) are handed to the row-wise engine so the
+# output stays identical.
+
+NUTRIENT_COLUMNS = {
+    "N": "Available_N_Kg_Ha",
+    "P": "Available_P_Kg_Ha",
+    "K": "Available_K_Kg_Ha",
+    "S": "Available_S_Kg_Ha",
+    "Zn": "Available_Zn_Ppm",
+    "B": "Available_B_Ppm",
+    "Fe": "Available_Fe_Ppm",
+    "Mn": "Available_Mn_Ppm",
+    "Cu": "Available_Cu_Ppm",
+}
+
+# (column, default when the column is missing)
+SOIL_COLUMNS = (("Soil_Ph", 7), ("Ec_Dsm", 1.0), ("Organic_Carbon_Percent", 0.5))
+
+STATUS_SEVERITY = np.array([7, 4, 0, 3, 7])
+
+
+def _numeric(df, column, default, bad):
+    """float64 column (default if absent); marks values float() would reject in `bad`."""
+    if column not in df.columns:
+        return np.full(len(df), float(default))
+    s = df[column]
+    if s.dtype.kind in "biuf":
+        return s.to_numpy(dtype=np.float64)
+    converted = pd.to_numeric(s, errors="coerce")
+    bad |= (s.notna() & converted.isna()).to_numpy() | s.map(lambda v: v is None or isinstance(v, bool)).to_numpy()
+    return converted.to_numpy(dtype=np.float64)
+
+
+def _coalesce_codes(df, columns, default, normalize, bad):
+    """
+    Per row normalize(a or b or default) -- the row-wise engine's
+    `d.get(a) or d.get(b) or default` -- as integer codes into a list of
+    keys. Truthiness and normalisation run once per distinct value.
+    """
+    keys = [normalize(default)]
+    index = {keys[0]: 0}
+
+    def code_of(value):
+        k = normalize(value)
+        if k not in index:
+            index[k] = len(keys)
+            keys.append(k)
+        return index[k]
+
+    n = len(df)
+    codes = np.zeros(n, dtype=np.intp)
+    resolved = np.zeros(n, dtype=bool)
+
+    for col in columns:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        value_codes, uniques = pd.factorize(s)
+        truthy = np.array([bool(u) for u in uniques] + [False], dtype=bool)[value_codes]
+        mapped = np.array([code_of(u) for u in uniques] + [0], dtype=np.intp)[value_codes]
+
+        # NA: None is falsy, float NaN is truthy ("nan"), pd.NA can't be tested
+        na_rows = np.flatnonzero(value_codes == -1)
+        for i in na_rows:
+            v = s.iat[i]
+            if v is None:
+                continue
+            if v is pd.NA:
+                bad[i] = True
+                continue
+            truthy[i] = True
+            mapped[i] = code_of(v)
+
+        take = truthy & ~resolved
+        codes[take] = mapped[take]
+        resolved |= truthy
+
+    return codes, keys
+
+
+def _crop_key(value):
+    return str(value).lower()
+
+
+def _stage_key(value):
+    stage = str(value).lower()
+    return stage if stage in STAGE_RELEVANCE else "vegetative"
+
+
+def _phi_values(df, bad):
+    col = "phi" if "phi" in df.columns else "PHI" if "PHI" in df.columns else None
+    if col is None:
+        return np.full(len(df), 7.0)
+    s = df[col]
+    if s.dtype.kind in "biuf":
+        return s.to_numpy(dtype=np.float64)
+    is_none = s.map(lambda v: v is None).to_numpy()
+    converted = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64)
+    bad |= (~is_none & s.notna().to_numpy() & np.isnan(converted)) | s.map(lambda v: isinstance(v, bool)).to_numpy()
+    return np.where(is_none, 7.0, converted)
+
+
+def _symptom_matches(df, column, store):
+    """{condition: (control action, severity per row)} for one symptom column, matched once per distinct value."""
+    if column not in df.columns:
+        return {}
+    # None and NaN share a code; neither names a condition
+    codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+    matches = [store.symptom(column, level_key(u)) for u in uniques]
+    out = {}
+    for match in matches:
+        if match is None or match[0]["Condition"] in out:
+            continue
+        action = match[0]
+        sev = [m[1] if m is not None and m[0]["Condition"] == action["Condition"] else 0 for m in matches]
+        out[action["Condition"]] = action, np.array(sev, dtype=np.int64)[codes]
+    return out
+
+
+def _as_frame(data):
+    if isinstance(data, pd.DataFrame):
+        return data.reset_index(drop=True)
+    if hasattr(data, "to_pandas"):           # pyarrow.Table / RecordBatch
+        return data.to_pandas()
+    return pd.DataFrame(data)
+
+
+def generate_treatment_recommendations_batch(data, top_n=5):
+    """
+    Columnar generate_treatment_recommendations over a DataFrame (or
+    anything with .to_pandas(), e.g. a pyarrow Table). Returns one result
+    dict per row, in row order, equal to what the row-wise engine returns
+    for that row's dict.
+
+    Rows that end up with the same deficiencies, stage and PHI band share
+    one result object (and entries are shared across results), so treat the
+    output as read-only.
+    """
+    df = _as_frame(data)
+    n = len(df)
+    if n == 0:
+        return []
+
+    store = get_reference_store()
+    bad = np.zeros(n, dtype=bool)
+
+    crop_codes, crop_keys = _coalesce_codes(df, ("Crop_Name", "crop_name"), "generic", _crop_key, bad)
+    stage_codes, stage_keys = _coalesce_codes(df, ("Growth_Stage", "growthStage"), "vegetative", _stage_key, bad)
+
+    # ---------------- nutrient status ----------------
+    # columns of the deficiency matrix, in the order the row-wise engine emits them
+    issue_names, issue_types, severities = [], [], []
+
+    for nut in NUTRIENTS:
+        value = _numeric(df, NUTRIENT_COLUMNS[nut], 0, bad)
+
+        limits = [store.threshold(c, nut) for c in crop_keys]
+        known = np.array([t is not None for t in limits], dtype=bool)[crop_codes]
+        table = np.array([t if t is not None else (np.nan,) * 4 for t in limits], dtype=np.float64)
+        low, opt_min, opt_max, high = table[crop_codes].T
+
+        status = np.select(
+            [value < low, value < opt_min, value <= opt_max, value < high],
+            [0, 1, 2, 3],
+            default=4,
+        )
+        sev = STATUS_SEVERITY[status]
+        flagged = known & (status != 2)
+
+        issue_names.append(nut)
+        issue_types.append("Nutrient")
+        severities.append(np.where(flagged, sev, -1))
+
+    # ---------------- soil rules ----------------
+    ph, ec, oc = (_numeric(df, col, default, bad) for col, default in SOIL_COLUMNS)
+    for name, mask, sev in (
+        ("Soil_Acidic", ph < 5.5, 6),
+        ("Soil_Alkaline", ~(ph < 5.5) & (ph > 8.2), 6),
+        ("High_Salinity", ec >= 4, 5),
+        ("Low_Organic_Carbon", oc < 0.4, 4),
+    ):
+        issue_names.append(name)
+        issue_types.append("Soil")
+        severities.append(np.where(mask, sev, -1))
+
+    # ---------------- pest / disease symptoms ----------------
+    worst = {}
+    for column in store.symptom_fields:
+        for condition, (action, sev) in _symptom_matches(df, column, store).items():
+            if condition in worst:
+                sev = np.maximum(worst[condition][1], sev)
+            worst[condition] = action, sev
+    controls = {}
+    for action, sev in worst.values():
+        controls[len(issue_names)] = action
+        issue_names.append(action["Condition"])
+        issue_types.append(action["Kind"])
+        severities.append(np.where(sev > 0, sev, -1))
+
+    sev_matrix = np.stack(severities, axis=1)            # (n, issues); -1 = not an issue
+    present = sev_matrix >= 0
+
+    # ---------------- scoring ----------------
+    phi = _phi_values(df, bad)
+    # classify_phi() bands as masks (NaN falls through to "Very Healthy")
+    phi_band = np.select([phi <= 3.0, phi <= 5.0, phi <= 7.5, phi <= 9.0], [0, 1, 2, 3], default=4)
+    band_weight = np.array([PHI_WEIGHTS[classify_phi(v)] for v in (3.0, 5.0, 7.5, 9.0, float("nan"))])
+    phi_weight = band_weight[phi_band]
+
+    score = np.full(sev_matrix.shape, np.nan)
+    recs = []
+    for j, name in enumerate(issue_names):
+        rec = controls[j] if j in controls else store.treatment(name)
+        recs.append(rec)
+        if rec is None:
+            continue
+        priority = rec["Stage_Priority"]
+        stage_weight = np.array([STAGE_RELEVANCE[s].get(priority, 0.7) for s in stage_keys])[stage_codes]
+        score[:, j] = np.where(present[:, j], (sev_matrix[:, j] / 10) * stage_weight * phi_weight, np.nan)
+
+    # ---------------- assemble ----------------
+    # A result only depends on (severities, stage, PHI band). Every distinct
+    # combination is built once and shared by the rows that have it; the
+    # deficiency / treatment entries inside are shared as well, since they
+    # only depend on (issue, severity) and (issue, rounded score).
+    # severities fit 4 bits; re-coding after every column keeps the code
+    # below n however many issue columns there are
+    sev_code = np.zeros(n, dtype=np.int64)
+    for j in range(sev_matrix.shape[1]):
+        sev_code, _ = pd.factorize(sev_code * 16 + (sev_matrix[:, j] + 1))
+    key = (sev_code * len(stage_keys) + stage_codes) * len(band_weight) + phi_band
+    inverse, uniques = pd.factorize(key)
+    representative = np.empty(len(uniques), dtype=np.intp)
+    representative[inverse] = np.arange(n)
+
+    deficiency_entries = {}
+    action_entries = {}
+
+    def deficiency_entry(j, sev):
+        entry = deficiency_entries.get((j, sev))
+        if entry is None:
+            entry = deficiency_entries[(j, sev)] = {
+                "type": issue_types[j], "deficiency": issue_names[j], "severity": sev,
+            }
+        return entry
+
+    def action_entry(j, value):
+        entry = action_entries.get((j, value))
+        if entry is None and j in controls:
+            entry = action_entries[(j, value)] = control_entry(controls[j], value)
+        elif entry is None:
+            rec = recs[j]
+            entry = action_entries[(j, value)] = {
+                "Issue": issue_names[j],
+                "Fertilizer": rec["Fertilizer"],
+                "Dose": rec["Soil_Loam_Dose"],
+                "PriorityScore": round(value, 3),
+                "Notes": rec["Notes"],
+            }
+        return entry
+
+    templates = []
+    for i, sev, scores in zip(representative.tolist(),
+                              sev_matrix[representative].tolist(),
+                              score[representative].tolist()):
+        deficiencies = [deficiency_entry(j, s) for j, s in enumerate(sev) if s >= 0]
+        if not deficiencies:
+            templates.append({"message": "No major deficiencies detected."})
+            continue
+
+        # NaN (v != v): not an issue for this row, or no treatment row for it
+        actions = [action_entry(j, v) for j, v in enumerate(scores) if v == v]
+        actions = sorted(actions, key=lambda x: x["PriorityScore"], reverse=True)
+        templates.append({"deficiencies": deficiencies, "treatments": actions[:top_n]})
+
+    results = [templates[k] for k in inverse.tolist()]
+
+    bad_rows = np.flatnonzero(bad)
+    if len(bad_rows):
+        records = df.iloc[bad_rows].to_dict("records")
+        for i, record in zip(bad_rows.tolist(), records):
+            results[i] = generate_treatment_recommendations(record)
+
+    return results
@@ -1,5 +1,7 @@
-import pandas as pd
-import numpy as np
+import operator
+import threading
+
+from utils.reference_data import get_reference_store, level_key
 
 # ============================================================
 # CONSTANTS
@@ -50,39 +52,24 @@ STAGE_RELEVANCE = {
 
 
 # ============================================================
-# LOAD CSV FILES
+# REFERENCE TABLES
 # ============================================================
 
-def safe_read_csv(path):
-    """Reads CSV safely without errors argument."""
-    try:
-        return pd.read_csv(path, encoding="utf-8")
-    except:
-        return pd.read_csv(path, encoding="latin1")
-
-
 def load_reference_tables():
-    nutrient_thresholds = safe_read_csv("soil_nutrient_thresholds.csv")
-    crop_req = safe_read_csv("crop_nutrient_requirement.csv")
-    treatment_recs = safe_read_csv("treatment_recommendations.csv")
-    pest_actions = safe_read_csv("pest_disease_control.csv")
-    return nutrient_thresholds, crop_req, treatment_recs, pest_actions
+    tables = get_reference_store().tables
+    return (
+        tables["thresholds"],
+        tables["crop_req"],
+        tables["treatments"],
+        tables["pest_actions"],
+    )
 
 
 # ============================================================
 # NUTRIENT ASSESSMENT
 # ============================================================
 
-def _threshold_row(thr, crop, nutrient):
-    row = thr[(thr["Crop_Name"].str.lower() == crop.lower()) &
-              (thr["Nutrient"] == nutrient)]
-    if row.empty:
-        row = thr[(thr["Crop_Name"].str.lower() == "generic") &
-                  (thr["Nutrient"] == nutrient)]
-    return row.iloc[0] if not row.empty else None
-
-
-def assess_nutrient_status(row, thr):
+def assess_nutrient_status(row, store):
     results = []
 
     nutrient_map = {
@@ -103,14 +90,12 @@ def assess_nutrient_status(row, thr):
         col = nutrient_map[nut]
         value = float(row.get(col, 0))
 
-        t = _threshold_row(thr, crop, nut)
+        t = store.threshold(crop, nut)
         if t is None:
             results.append({"nutrient": nut, "value": value, "status": "Unknown", "severity_score": 0})
             continue
 
-        low, opt_min, opt_max, high = (
-            t["Low_Critical"], t["Optimal_Min"], t["Optimal_Max"], t["High_Critical"]
-        )
+        low, opt_min, opt_max, high = t
 
         if value < low:
             status, sev = "Deficient", 7
@@ -158,14 +143,83 @@ def assess_soil_condition(row):
     return issues
 
 
+# ============================================================
+# PEST / DISEASE SYMPTOMS
+# ============================================================
+#
+# The pest and leaf spot fields of a request are symptoms. Each (field,
+# level) pair listed in data/symptom_conditions.csv names a
+# pest_disease_control.csv condition with a severity; the reference store
+# resolves those to control actions once per load, so matching a request
+# is a few dict lookups, and a matched condition brings its control
+# product / dose / interval, ranked with the fertilizer actions.
+
+# (store version, raw symptom values) -> signature; form requests repeat a
+# few dozen combinations, so this is one tuple and one dict lookup per request
+_SIGNATURES = {}
+MAX_SIGNATURES = 4096
+
+
+def _signature(values, store):
+    keys = ((field, level_key(value)) for field, value in zip(store.symptom_fields, values))
+    return tuple(key for key in keys if key in store.symptoms)
+
+
+def symptom_signature(row, store):
+    """((field, level), ...) for the row's symptom values the store maps, in store.symptom_fields order."""
+    values = (store.version, *map(row.get, store.symptom_fields))
+    try:
+        return _SIGNATURES[values]
+    except KeyError:
+        pass
+    except TypeError:                 # unhashable value
+        return _signature(values[1:], store)
+    out = _signature(values[1:], store)
+    if len(_SIGNATURES) >= MAX_SIGNATURES:
+        _SIGNATURES.clear()
+    _SIGNATURES[values] = out
+    return out
+
+
+def match_symptoms(row, store):
+    """[(control action, severity)] for the row's symptoms the pest table has an action for."""
+    worst = {}
+    for field, level in symptom_signature(row, store):
+        match = store.symptom(field, level)
+        if match is None:
+            continue
+        action, sev = match
+        if sev > worst.get(action["Condition"], (None, 0))[1]:
+            worst[action["Condition"]] = (action, sev)
+    return list(worst.values())
+
+
+def control_entry(action, score):
+    """A pest / disease control action as a `treatments` entry."""
+    notes = action["Control_Type"]
+    if action["PHI_Days"]:
+        notes += f"; harvest no sooner than {action['PHI_Days']} days after spraying"
+    return {
+        "Issue": action["Condition"],
+        "Fertilizer": action["Product"],
+        "Dose": action["Dose"],
+        "PriorityScore": round(score, 3),
+        "Notes": notes,
+        "Control_Type": action["Control_Type"],
+        "Interval_Days": action["Interval_Days"],
+        "Interval_Max_Days": action["Interval_Max_Days"],
+        "PHI_Days": action["PHI_Days"],
+    }
+
+
 # ============================================================
 # COMBINE DEFICIENCIES
 # ============================================================
 
-def build_deficiency_list(row, thr):
+def build_deficiency_list(row, store):
     out = []
 
-    for n in assess_nutrient_status(row, thr):
+    for n in assess_nutrient_status(row, store):
         if n["status"] not in ["Optimal", "Unknown"]:
             out.append({
                 "type": "Nutrient",
@@ -187,6 +241,15 @@ def build_deficiency_list(row, thr):
 # SCORING SYSTEM
 # ============================================================
 
+PHI_WEIGHTS = {
+    "Very Healthy": 0.6,
+    "Healthy": 0.8,
+    "At Risk but Recoverable": 1.0,
+    "Moderate Stress": 1.2,
+    "Severe Stress": 1.4
+}
+
+
 def score_treatment(rec, stage, phi_class, severity):
 
     stage = str(stage).lower()
@@ -195,13 +258,7 @@ def score_treatment(rec, stage, phi_class, severity):
 
     weight = STAGE_RELEVANCE[stage].get(rec["Stage_Priority"], 0.7)
 
-    phi_weight = {
-        "Very Healthy": 0.6,
-        "Healthy": 0.8,
-        "At Risk but Recoverable": 1.0,
-        "Moderate Stress": 1.2,
-        "Severe Stress": 1.4
-    }.get(phi_class, 1.0)
+    phi_weight = PHI_WEIGHTS.get(phi_class, 1.0)
 
     return (severity / 10) * weight * phi_weight
 
@@ -212,34 +269,34 @@ def score_treatment(rec, stage, phi_class, severity):
 
 def generate_treatment_recommendations(input_data):
     try:
-        thr, crop_req, treatment_recs, pest_actions = load_reference_tables()
+        store = get_reference_store()
 
-        row = pd.Series(input_data)
+        row = dict(input_data)
 
         # required input fallbacks
-        row["Crop_Name"] = row.get("crop_name", "generic")
-        row["Growth_Stage"] = row.get("growthStage", "vegetative")
+        row["Crop_Name"] = input_data.get("Crop_Name") or input_data.get("crop_name") or "generic"
+        row["Growth_Stage"] = input_data.get("Growth_Stage") or input_data.get("growthStage") or "vegetative"
         row["Soil_Ph"] = row.get("Soil_Ph", 7)
         row["Ec_Dsm"] = row.get("Ec_Dsm", 1.0)
         row["Organic_Carbon_Percent"] = row.get("Organic_Carbon_Percent", 0.5)
 
         # Build deficiencies
-        deficiencies = build_deficiency_list(row, thr)
+        deficiencies = build_deficiency_list(row, store)
+        symptoms = match_symptoms(row, store)
 
-        if not deficiencies:
+        if not deficiencies and not symptoms:
             return {"message": "No major deficiencies detected."}
 
         # PHI class (fallback)
-        phi_value = float(input_data.get("phi", 7))
-        phi_class = classify_phi(phi_value)
+        phi_value = input_data.get("phi", input_data.get("PHI"))
+        phi_class = classify_phi(float(phi_value) if phi_value is not None else 7)
 
         actions = []
         for d in deficiencies:
-            rec = treatment_recs[treatment_recs["Deficiency"] == d["deficiency"]]
-            if rec.empty:
+            rec = store.treatment(d["deficiency"])
+            if rec is None:
                 continue
 
-            rec = rec.iloc[0]
             score = score_treatment(rec, row["Growth_Stage"], phi_class, d["severity"])
 
             actions.append({
@@ -250,8 +307,120 @@ def generate_treatment_recommendations(input_data):
                 "Notes": rec["Notes"]
             })
 
+        for action, severity in symptoms:
+            deficiencies.append({"type": action["Kind"], "deficiency": action["Condition"], "severity": severity})
+            score = score_treatment(action, row["Growth_Stage"], phi_class, severity)
+            actions.append(control_entry(action, score))
+
         actions = sorted(actions, key=lambda x: x["PriorityScore"], reverse=True)
         return {"deficiencies": deficiencies, "treatments": actions[:5]}
 
     except Exception as e:
         return {"error": "treatment engine failed", "message": str(e)}
+
+
+# ============================================================
+# PRECOMPUTED PLANS (fixed soil profile)
+# ============================================================
+
+PHI_CLASS_VALUES = {
+    # one representative PHI per classify_phi() class
+    "Severe Stress": 2.0,
+    "Moderate Stress": 4.0,
+    "At Risk but Recoverable": 7.0,
+    "Healthy": 8.0,
+    "Very Healthy": 9.5,
+}
+
+
+class TreatmentPlanTable:
+    """
+    generate_treatment_recommendations() results for one fixed soil
+    profile (the web form's default soil values), precomputed for every
+    (crop, stage, PHI class).
+
+    With the soil fixed, the deficiency list only depends on the crop's
+    threshold rows and the ranking only on the stage weight and PHI
+    class, so every crop without its own thresholds shares the "generic"
+    entry and every unknown stage the "vegetative" one. The table is
+    rebuilt whenever the reference store reloads its CSVs.
+
+    Symptoms (see symptom_signature) add their (field, level) signature
+    to the key. Those plans are computed on first use and kept: there are
+    only a handful of signatures, so the table stays small.
+
+    plan(row) serves rows whose soil values equal the profile from the
+    table and computes everything else live. Plans are shared between
+    callers: treat them as read-only.
+    """
+
+    def __init__(self, soil):
+        self.soil = dict(soil)
+        self._soil_of = operator.itemgetter(*self.soil)
+        self._soil_values = self._soil_of(self.soil)
+        self.version = None
+        self._plans = {}
+        self._symptom_plans = {}
+        self._crops = frozenset()
+        self._lock = threading.Lock()
+
+    def build(self, store=None):
+        store = store or get_reference_store()
+        version = store.version
+        crops = {crop for crop, _ in store.thresholds} | {"generic"}
+
+        plans = {}
+        for crop in crops:
+            for stage in STAGE_RELEVANCE:
+                for phi_class, phi in PHI_CLASS_VALUES.items():
+                    row = dict(self.soil, Crop_Name=crop, Growth_Stage=stage, PHI=phi)
+                    plan = generate_treatment_recommendations(row)
+                    if "error" not in plan:
+                        plans[(crop, stage, phi_class)] = plan
+
+        with self._lock:
+            self._plans = plans
+            self._symptom_plans = {}
+            self._crops = frozenset(crops)
+            self.version = version
+        return len(plans)
+
+    def _key(self, row):
+        crop = str(row.get("Crop_Name") or row.get("crop_name") or "generic").lower()
+        if crop not in self._crops:
+            crop = "generic"
+        stage = str(row.get("Growth_Stage") or row.get("growthStage") or "vegetative").lower()
+        if stage not in STAGE_RELEVANCE:
+            stage = "vegetative"
+        phi = row.get("phi", row.get("PHI"))
+        return crop, stage, classify_phi(float(phi) if phi is not None else 7)
+
+    def plan(self, row):
+        try:
+            profile = self._soil_of(row) == self._soil_values
+        except KeyError:
+            profile = False
+        if not profile:
+            return generate_treatment_recommendations(row)
+
+        store = get_reference_store()
+        if store.version != self.version:
+            self.build(store)
+
+        try:
+            key = self._key(row)
+        except (TypeError, ValueError):
+            return generate_treatment_recommendations(row)
+        symptoms = symptom_signature(row, store)
+        if not symptoms:
+            plan = self._plans.get(key)
+        else:
+            key += (symptoms,)
+            plan = self._symptom_plans.get(key)
+            if plan is None:
+                plan = generate_treatment_recommendations(row)
+                if "error" not in plan:
+                    self._symptom_plans[key] = plan
+        if plan is None:
+            return generate_treatment_recommendations(row)
+        return dict(plan)